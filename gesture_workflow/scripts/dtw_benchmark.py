@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+DTW Microbenchmarks
+
+Times the hot paths of the DTW classifier on synthetic recordings shaped
+like gestures/<class>/sequence_XXX.json (frames of 21 [x, y, z]
+landmarks per detected hand), so the numbers do not depend on the
+recorded dataset:
+
+- sequence_to_features   per sequence length
+- dtw_distance           per sequence length
+- dtw_distance_fast      per sequence length and band window
+- classify               per template count and downsample_frames,
+                         k-NN over all templates and centroid mode
+
+Every case reports p50 / p95 / p99 latency and throughput. Results are
+written as JSON and compared against a stored baseline; a case whose p50
+grew by more than the tolerance is flagged and the exit code is 1.
+Baselines are per machine and not committed: without one the run says
+so in its output ("comparison": {"missing": true}), and a --baseline
+file that does not exist is an error (exit code 2).
+
+    python dtw_benchmark.py --output bench.json
+    python dtw_benchmark.py --save-baseline        # after an intended change
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+from datetime import datetime
+
+import numpy as np
+
+from dtw_gesture import (
+    WORKFLOW_DIR, DTWGestureClassifier, sequence_to_features,
+    dtw_distance, dtw_distance_fast, log_progress
+)
+
+BASELINE_PATH = os.path.join(WORKFLOW_DIR, 'benchmarks', 'dtw_baseline.json')
+
+# A case is flagged when its p50 exceeds the baseline by this share
+TOLERANCE = 0.25
+
+# Sweeps (--quick runs the first two values of each)
+SEQUENCE_LENGTHS = [30, 60, 90]      # frames, ~1-3 s at 30 fps
+WINDOWS = [None, 3, 10]              # dtw_distance_fast bands, None = default
+TEMPLATE_COUNTS = [20, 100, 500]
+DOWNSAMPLE_FRAMES = [20, 10, 40]
+CLASSIFY_CLASSES = 10
+
+# Timed calls per case, after WARMUP untimed ones
+CALLS = 50
+WARMUP = 3
+
+# Synthetic hand: finger base directions (radians) and bone lengths,
+# roughly the proportions of a MediaPipe hand with the palm size as unit
+FINGER_ANGLES = [-1.0, -0.45, -0.1, 0.25, 0.6]
+BONE_LENGTHS = [0.45, 0.35, 0.28, 0.22]
+
+
+def hand_pose(rng):
+    """
+    A random open-hand pose: (21, 3) landmarks in MediaPipe order, wrist
+    first, then 4 joints per finger from thumb to pinky.
+    """
+    landmarks = np.zeros((21, 3))
+    for f, angle in enumerate(FINGER_ANGLES):
+        angle += rng.normal(scale=0.1)
+        curl = rng.uniform(0.0, 0.6)
+        point = np.zeros(3)
+        for b, length in enumerate(BONE_LENGTHS):
+            bend = angle + curl * b * 0.5
+            point = point + length * np.array([np.sin(bend), -np.cos(bend), rng.normal(scale=0.02)])
+            landmarks[1 + f * 4 + b] = point
+    return landmarks
+
+
+def gesture_motion(rng):
+    """Class-specific motion: frequencies, amplitudes and phases of a wave-like path"""
+    return {
+        "frequency": rng.uniform(0.5, 2.0, size=3),
+        "amplitude": rng.uniform(0.05, 0.4, size=3),
+        "phase": rng.uniform(0, 2 * np.pi, size=3),
+        "rotation": rng.uniform(-0.6, 0.6)
+    }
+
+
+def synthetic_frames(rng, pose, motion, num_frames, hands=1, noise=0.01, fps=30):
+    """
+    One recording's frame list, as stored in a sequence file.
+
+    pose, motion: from hand_pose / gesture_motion (the class)
+    hands:        1 (left hand only, like the sample data) or 2
+    noise:        landmark jitter, in palm-size units
+    """
+    frames = []
+    # Each recording runs the motion at a slightly different speed
+    t = np.linspace(0, 1, num_frames) * rng.uniform(0.85, 1.15)
+    for i, phase in enumerate(t):
+        offset = motion["amplitude"] * np.sin(2 * np.pi * motion["frequency"] * phase + motion["phase"])
+        angle = motion["rotation"] * np.sin(2 * np.pi * phase)
+        rotation = np.array([[np.cos(angle), -np.sin(angle), 0],
+                             [np.sin(angle), np.cos(angle), 0],
+                             [0, 0, 1]])
+        frame = {"timestamp": int(i * 1000 / fps), "left_hand": None, "right_hand": None}
+        for h, key in enumerate(('left_hand', 'right_hand')[:hands]):
+            mirror = np.array([1 - 2 * h, 1, 1])  # right hand mirrors the left
+            landmarks = (pose * mirror) @ rotation.T + offset
+            landmarks = landmarks + rng.normal(scale=noise, size=landmarks.shape)
+            frame[key] = {"landmarks": landmarks.round(6).tolist()}
+        frames.append(frame)
+    return frames
+
+
+def synthetic_dataset(num_classes, per_class, num_frames, hands=1, noise=0.01, seed=0):
+    """
+    Synthetic recordings of num_classes gestures.
+    Returns: list of (class_name, frames)
+    """
+    rng = np.random.default_rng(seed)
+    recordings = []
+    for c in range(num_classes):
+        pose, motion = hand_pose(rng), gesture_motion(rng)
+        for _ in range(per_class):
+            length = max(2, int(num_frames * rng.uniform(0.85, 1.15)))
+            recordings.append((f"gesture_{c}", synthetic_frames(rng, pose, motion, length, hands, noise)))
+    return recordings
+
+
+def time_calls(fn, inputs, calls=CALLS, warmup=WARMUP):
+    """
+    Run fn(*args) for args cycling over inputs.
+    Returns: per-call latencies in seconds
+    """
+    for i in range(warmup):
+        fn(*inputs[i % len(inputs)])
+    latencies = np.empty(calls)
+    for i in range(calls):
+        args = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        fn(*args)
+        latencies[i] = time.perf_counter() - start
+    return latencies
+
+
+def summarize(latencies):
+    """Latency percentiles (ms) and calls per second"""
+    ms = latencies * 1000
+    return {
+        "calls": len(ms),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+        "throughput_per_s": float(len(ms) / latencies.sum()) if latencies.sum() > 0 else 0.0
+    }
+
+
+def case_name(benchmark, **params):
+    """'classify/templates=100/downsample=20' style keys, stable across runs"""
+    return '/'.join([benchmark] + [f"{key}={value}" for key, value in params.items()])
+
+
+def run_benchmarks(quick=False, hands=1, noise=0.01, calls=CALLS, seed=0):
+    """
+    Run every sweep.
+    Returns: {case name: summarize(...) plus the case parameters}
+    """
+    pick = (lambda values: values[:2]) if quick else (lambda values: values)
+    results = {}
+
+    def record(name, latencies, **params):
+        results[name] = dict(summarize(latencies), **params)
+        log_progress(name, {"p50_ms": round(results[name]["p50_ms"], 4)})
+
+    for length in pick(SEQUENCE_LENGTHS):
+        recordings = synthetic_dataset(2, 4, length, hands, noise, seed)
+        frames = [(frames,) for _, frames in recordings]
+        record(case_name('sequence_to_features', frames=length, hands=hands),
+               time_calls(sequence_to_features, frames, calls), frames=length, hands=hands)
+
+        features = [sequence_to_features(f) for _, f in recordings]
+        pairs = [(features[i], features[-1 - i]) for i in range(len(features) // 2)]
+        record(case_name('dtw_distance', frames=length),
+               time_calls(dtw_distance, pairs, max(calls // 5, 5)), frames=length)
+        for window in pick(WINDOWS):
+            record(case_name('dtw_distance_fast', frames=length, window=window),
+                   time_calls(lambda a, b: dtw_distance_fast(a, b, window), pairs, calls),
+                   frames=length, window=window)
+
+    length = SEQUENCE_LENGTHS[0] * 2  # ~2 s, the default class duration
+    for count in pick(TEMPLATE_COUNTS):
+        per_class = max(1, count // CLASSIFY_CLASSES)
+        recordings = synthetic_dataset(CLASSIFY_CLASSES, per_class + 2, length, hands, noise, seed)
+        features = [(class_name, sequence_to_features(frames)) for class_name, frames in recordings]
+        train = [pair for i, pair in enumerate(features) if i % (per_class + 2) < per_class]
+        queries = [(seq,) for i, (_, seq) in enumerate(features) if i % (per_class + 2) >= per_class]
+
+        for downsample in pick(DOWNSAMPLE_FRAMES):
+            classifier = DTWGestureClassifier(k=3, use_centroids=False, downsample_frames=downsample)
+            for class_name, seq in train:
+                classifier.add_template(class_name, seq)
+            params = {"templates": len(train), "downsample": downsample}
+            record(case_name('classify', mode='knn', **params),
+                   time_calls(classifier.classify, queries, calls), mode='knn', **params)
+
+            classifier.build_centroids()
+            classifier.use_centroids = True
+            record(case_name('classify', mode='centroids', **params),
+                   time_calls(classifier.classify, queries, calls), mode='centroids', **params)
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    p50 of every case against the baseline run.
+    Returns: {"cases": {name: {...}}, "regressions": [names]}
+    """
+    cases = {}
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or previous["p50_ms"] <= 0:
+            continue
+        ratio = result["p50_ms"] / previous["p50_ms"]
+        cases[name] = {
+            "baseline_p50_ms": previous["p50_ms"],
+            "p50_ms": result["p50_ms"],
+            "ratio": ratio
+        }
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return {"cases": cases, "regressions": regressions}
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='DTW classifier microbenchmarks')
+    parser.add_argument('--output', type=str, metavar='FILE', help='Write the results JSON here')
+    parser.add_argument('--baseline', type=str, metavar='FILE',
+                        help=f'Baseline results to compare against (default {BASELINE_PATH})')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help=f'Flag cases whose p50 grew by more than this share (default {TOLERANCE})')
+    parser.add_argument('--quick', action='store_true', help='Smaller sweep')
+    parser.add_argument('--calls', type=int, default=CALLS, help='Timed calls per case')
+    parser.add_argument('--hands', type=int, choices=[1, 2], default=1,
+                        help='Hands in the synthetic recordings')
+    parser.add_argument('--noise', type=float, default=0.01,
+                        help='Landmark jitter of the synthetic recordings')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    baseline_path = args.baseline or BASELINE_PATH
+    if args.baseline and not args.save_baseline and not os.path.exists(args.baseline):
+        print(json.dumps({"error": f"Baseline not found: {args.baseline}"}))
+        return 2
+
+    results = run_benchmarks(args.quick, args.hands, args.noise, args.calls, args.seed)
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "environment": environment(),
+        "config": {"quick": args.quick, "calls": args.calls, "hands": args.hands,
+                   "noise": args.noise, "seed": args.seed},
+        "results": results
+    }
+
+    if args.save_baseline:
+        pass  # the new baseline is not compared against the old one
+    elif not os.path.exists(baseline_path):
+        report["comparison"] = {"baseline": baseline_path, "missing": True}
+        log_progress(f"No baseline at {baseline_path}, nothing compared (record one with --save-baseline)")
+    else:
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+        report["comparison"] = dict(compare(results, baseline, args.tolerance),
+                                    baseline=baseline_path, tolerance=args.tolerance)
+        for name in report["comparison"]["regressions"]:
+            case = report["comparison"]["cases"][name]
+            log_progress(f"Slower than baseline: {name}", {"ratio": round(case["ratio"], 2)})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        log_progress(f"Baseline saved to {baseline_path}")
+
+    print(json.dumps(report))
+    return 1 if report.get("comparison", {}).get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Content-addressed Training Cache
+
+Lets --train skip work that did not change since the last run. Lives
+in gesture_workflow/models/cache/:
+
+- features/<sha256>.npy   feature matrix of one sequence file, keyed by
+                          the hash of the file's bytes
+- distances.npz           pairwise DTW matrix between the templates of
+                          the last run, keyed by their hashes plus the
+                          DTW parameters (window, downsample_frames)
+
+Entries for sequences no longer in the dataset are evicted after every
+run; a CACHE_VERSION or parameter change invalidates what it covers.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+# Bump when feature extraction or the DTW distance changes
+CACHE_VERSION = 1
+
+
+def atomic_save(path, save):
+    """Write through a temporary file so readers never see partial data"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        save(f)
+    os.replace(tmp_path, path)
+
+
+class TrainingCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.features_dir = os.path.join(cache_dir, 'features')
+        self.distances_path = os.path.join(cache_dir, 'distances.npz')
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self.feature_hits = 0
+        self.feature_misses = 0
+
+        manifest = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                pass
+        if manifest.get('version') != CACHE_VERSION:
+            self.clear()
+
+    def clear(self):
+        """Drop every entry and start a cache of the current version"""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.features_dir, exist_ok=True)
+        atomic_save(self.manifest_path,
+                    lambda f: f.write(json.dumps({"version": CACHE_VERSION}).encode()))
+
+    @staticmethod
+    def digest(content):
+        """Cache key of a sequence file's bytes"""
+        return hashlib.sha256(content).hexdigest()
+
+    def feature_path(self, digest):
+        return os.path.join(self.features_dir, f"{digest}.npy")
+
+    def load_features(self, digest):
+        """Cached feature matrix, or None"""
+        try:
+            features = np.load(self.feature_path(digest))
+        except (OSError, ValueError):
+            self.feature_misses += 1
+            return None
+        self.feature_hits += 1
+        return features
+
+    def save_features(self, digest, features):
+        atomic_save(self.feature_path(digest), lambda f: np.save(f, features))
+
+    def load_distances(self, digests, params):
+        """
+        Cached distances between the given sequences.
+        Returns: (n, n) float64 matrix, NaN where unknown
+        """
+        n = len(digests)
+        known = np.full((n, n), np.nan)
+        try:
+            with np.load(self.distances_path) as cached:
+                if json.loads(str(cached['params'])) != params:
+                    return known
+                old_digests = cached['digests'].tolist()
+                old_distances = cached['distances']
+        except (OSError, KeyError, ValueError):
+            return known
+
+        old_index = {}
+        for i, digest in enumerate(old_digests):
+            old_index.setdefault(digest, i)
+        new_rows = np.array([i for i, digest in enumerate(digests) if digest in old_index], dtype=np.int64)
+        old_rows = np.array([old_index[digests[i]] for i in new_rows], dtype=np.int64)
+        known[np.ix_(new_rows, new_rows)] = old_distances[np.ix_(old_rows, old_rows)]
+        return known
+
+    def save_distances(self, digests, distances, params):
+        """Replace the cached matrix; pairs of removed sequences go with it"""
+        atomic_save(self.distances_path, lambda f: np.savez(
+            f,
+            digests=np.array(digests, dtype=str),
+            distances=distances,
+            params=json.dumps(params, sort_keys=True)
+        ))
+
+    def evict(self, digests):
+        """Delete cached features of sequences no longer in the dataset"""
+        keep = set(digests)
+        evicted = 0
+        for name in os.listdir(self.features_dir):
+            digest, ext = os.path.splitext(name)
+            if ext != '.npy' or digest not in keep:
+                os.remove(os.path.join(self.features_dir, name))
+                evicted += 1
+        return evicted
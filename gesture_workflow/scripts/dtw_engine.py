@@ -0,0 +1,674 @@
+#!/usr/bin/env python3
+"""
+Vectorized DTW Engine
+
+NumPy kernels behind the DTW + k-NN gesture classifier.
+- Frame-to-frame costs computed in one broadcast
+- DTW recurrence evaluated one anti-diagonal (wavefront) at a time
+- Sakoe-Chiba band stored as a band: arrays are indexed by the offset
+  k = i - j, never as a full (n+1) x (m+1) matrix
+
+Batched kernels optionally use a hand-presence-aware frame cost (pass
+`penalty`): frame features are HANDS equal blocks, a block of zeros is
+an undetected hand, and
+  cost(a, b)^2 = sum over hands in both frames of |a_h - b_h|^2
+               + penalty^2 per hand present in only one of them
+A hand the query never shows never enters the matrix product, so
+one-handed queries only pay for one block.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+# Feature blocks of the presence-aware cost (left hand, right hand)
+HANDS = 2
+
+
+def default_window(n, m, window=None):
+    """
+    Resolve the Sakoe-Chiba band half-width used by dtw_distance_fast.
+
+    Defaults to a quarter of the longer sequence and is always wide enough
+    to reach the (n, m) corner.
+    """
+    if window is None:
+        window = max(n, m) // 4 + 1
+    return max(window, abs(n - m) + 1)
+
+
+def band_limits(n, m, window=None):
+    """
+    Range [lo, hi] of offsets k = i - j covered by the band.
+
+    window=None covers the whole (n, m) grid.
+    """
+    lo, hi = -m, n
+    if window is not None:
+        lo, hi = max(lo, -window), min(hi, window)
+    return lo, hi
+
+
+@lru_cache(maxsize=256)
+def band_cells(n, m, lo, hi):
+    """
+    Index arrays for the grid cells with offset lo <= i - j <= hi.
+
+    Returns (rows, cols, diag, slot): 0-based frame indices into seq1/seq2,
+    plus the anti-diagonal d = i + j and band slot k - lo of the 1-based
+    DTW cell they fill. Cached because template lengths repeat.
+    """
+    i, j = np.meshgrid(np.arange(1, n + 1), np.arange(1, m + 1), indexing='ij')
+    inside = (i - j >= lo) & (i - j <= hi)
+    i, j = i[inside], j[inside]
+    return i - 1, j - 1, i + j, i - j - lo
+
+
+def frame_costs(seq1, seq2, rows, cols):
+    """
+    Euclidean distance between the frame pairs (seq1[rows], seq2[cols]).
+
+    Row-wise dot products reduce exactly like np.linalg.norm on a single
+    frame pair, so results match the per-cell loop bit for bit. seq2 may
+    carry leading batch axes, e.g. a (T, m, features) template tensor.
+    """
+    diff = seq1[rows] - seq2[..., cols, :]
+    sq = np.matmul(diff[..., None, :], diff[..., :, None])[..., 0, 0]
+    return np.sqrt(sq)
+
+
+def frame_cost_matrix(seq1, seq2):
+    """
+    Euclidean distance between every pair of frames.
+
+    seq1: (n, features)
+    seq2: (m, features)
+
+    Returns: (n, m) cost matrix in the dtype of the inputs
+    """
+    n, m = len(seq1), len(seq2)
+    rows, cols = np.meshgrid(np.arange(n), np.arange(m), indexing='ij')
+    return frame_costs(seq1, seq2, rows, cols)
+
+
+def band_costs(seq1, seq2, window=None):
+    """
+    Frame costs of the band cells laid out by anti-diagonal and slot.
+
+    Returns: (n + m + 1, hi - lo + 1) float64 array, inf where no cell exists
+    """
+    n, m = len(seq1), len(seq2)
+    lo, hi = band_limits(n, m, window)
+    rows, cols, diag, slot = band_cells(n, m, lo, hi)
+
+    costs = np.full((n + m + 1, hi - lo + 1), np.inf)
+    costs[diag, slot] = frame_costs(seq1, seq2, rows, cols)
+    return costs
+
+
+def dtw_wavefront(costs, n, m, lo):
+    """
+    Accumulated DTW cost of the (n, m) corner, without path normalization.
+
+    costs: output of band_costs
+    lo:    lowest band offset, from band_limits
+
+    The recurrence D[i, j] = cost + min(D[i-1, j], D[i, j-1], D[i-1, j-1])
+    only depends on the two previous anti-diagonals. Indexed by k = i - j
+    the three predecessors sit at fixed slots k - 1, k + 1 and k, so each
+    diagonal is one shifted-slice update across the band. Cells outside
+    the band or the grid have inf cost and never become reachable.
+    """
+    num_diags, width = costs.shape
+    if not 0 <= n - m - lo < width:
+        return np.float64(np.inf)
+
+    # Diagonal buffers carry one inf guard slot on each side of the band
+    prev2 = np.full(width + 2, np.inf)
+    prev1 = np.full(width + 2, np.inf)
+    cur = np.full(width + 2, np.inf)
+    best = np.empty(width)
+
+    # D[0, 0] = 0 sits on diagonal 0; diagonal 1 only holds boundary cells
+    prev2[1 - lo] = 0.0
+    if num_diags == 1:
+        return prev2[1 - lo]
+
+    for d in range(2, num_diags):
+        np.minimum(prev1[:-2], prev1[2:], out=best)   # insertion, deletion
+        np.minimum(best, prev2[1:-1], out=best)       # match
+        np.add(costs[d], best, out=cur[1:-1])
+        prev2, prev1, cur = prev1, cur, prev2
+
+    # Corner (n, m) sits at offset k = n - m on the last diagonal
+    return prev1[n - m - lo + 1]
+
+
+def dtw(seq1, seq2, window=None):
+    """
+    DTW distance normalized by path length (n + m).
+
+    window=None runs the unconstrained recurrence; an integer restricts it
+    to the Sakoe-Chiba band |i - j| <= window.
+    """
+    n, m = len(seq1), len(seq2)
+    lo, _ = band_limits(n, m, window)
+    return dtw_wavefront(band_costs(seq1, seq2, window), n, m, lo) / (n + m)
+
+
+def dtw_path(seq1, seq2, window=None):
+    """
+    DTW distance plus the optimal warping path.
+
+    Runs the same banded wavefront as dtw() but keeps every diagonal,
+    then walks back from the (n, m) corner, preferring the match step
+    on ties.
+
+    Returns: (path, distance) with path a list of 0-based (i, j) frame
+    pairs from (0, 0) to (n - 1, m - 1), distance normalized by n + m
+    """
+    n, m = len(seq1), len(seq2)
+    lo, _ = band_limits(n, m, window)
+    costs = band_costs(seq1, seq2, window)
+    num_diags, width = costs.shape
+    if not 0 <= n - m - lo < width:
+        raise ValueError(f"Band of width {window} cannot reach the ({n}, {m}) corner")
+
+    # One row per diagonal, with the inf guard slots of dtw_wavefront
+    acc = np.full((num_diags, width + 2), np.inf)
+    acc[0, 1 - lo] = 0.0
+    for d in range(2, num_diags):
+        best = np.minimum(acc[d - 1, :-2], acc[d - 1, 2:])
+        np.minimum(best, acc[d - 2, 1:-1], out=best)
+        np.add(costs[d], best, out=acc[d, 1:-1])
+
+    i, j = n, m
+    path = [(n - 1, m - 1)]
+    while (i, j) != (1, 1):
+        d, s = i + j, i - j - lo + 1
+        steps = ((acc[d - 2, s], i - 1, j - 1),
+                 (acc[d - 1, s - 1], i - 1, j),
+                 (acc[d - 1, s + 1], i, j - 1))
+        _, i, j = min(steps, key=lambda step: step[0])
+        path.append((i - 1, j - 1))
+    path.reverse()
+    return path, acc[n + m, n - m - lo + 1] / (n + m)
+
+
+def stack_templates(sequences):
+    """
+    Pack template sequences into one zero-padded float32 tensor.
+
+    Returns: (templates, lengths) with shapes (T, max_len, features) and (T,)
+    """
+    lengths = np.array([len(s) for s in sequences], dtype=np.int64)
+    max_len = int(lengths.max()) if len(sequences) else 0
+    features = sequences[0].shape[1] if len(sequences) else 0
+
+    templates = np.zeros((len(sequences), max_len, features), dtype=np.float32)
+    for t, seq in enumerate(sequences):
+        templates[t, :len(seq)] = seq
+    return templates, lengths
+
+
+def hand_presence(frames):
+    """
+    Hands detected in each frame: a hand's feature block is all zeros
+    when it is absent.
+
+    Returns: (..., HANDS) bool for frames of shape (..., features)
+    """
+    blocks = frames.reshape(*frames.shape[:-1], HANDS, frames.shape[-1] // HANDS)
+    return (blocks != 0).any(axis=-1)
+
+
+def frame_pair_costs(a, b, penalty=None):
+    """
+    Cost between corresponding (broadcast) frames of a and b: Euclidean,
+    or presence-aware when a penalty is given.
+    """
+    diff = (a - b).astype(np.float64)
+    if penalty is None:
+        return np.sqrt(np.einsum('...f,...f->...', diff, diff))
+    blocks = diff.reshape(*diff.shape[:-1], HANDS, diff.shape[-1] // HANDS)
+    sq = np.einsum('...hf,...hf->...h', blocks, blocks)
+    present_a, present_b = hand_presence(a), hand_presence(b)
+    sq = np.where(present_a & present_b, sq, 0.0) + np.where(present_a ^ present_b, penalty ** 2, 0.0)
+    return np.sqrt(sq.sum(axis=-1))
+
+
+def presence_sq_costs(query, templates, penalty, template_presence=None):
+    """
+    Squared presence-aware costs, (T * max_len, n) float64, as one matrix
+    product of augmented frames.
+
+    With p_h the presence of hand h, the squared cost of a frame pair is
+      sum_h  p_h(b) |a_h|^2 + p_h(a) (|b_h|^2 + penalty^2 (1 - 2 p_h(b)))
+             - 2 a_h.b_h + penalty^2 p_h(b)
+    (absent blocks are zeros), i.e. the dot product of
+      a' = [a_h..., |a_h|^2..., p_h(a)..., 1]
+      b' = [-2 b_h..., p_h(b)..., |b_h|^2 + penalty^2 (1 - 2 p_h(b))...,
+            penalty^2 sum_h p_h(b)]
+    Blocks and norms of a hand the query never shows drop out, so a
+    one-handed query costs a product over one block.
+    """
+    num_templates, max_len, features = templates.shape
+    if template_presence is None:
+        template_presence = hand_presence(templates)
+    t_present = template_presence.reshape(-1, HANDS)
+    q_present = hand_presence(query).astype(np.float64)
+    block = features // HANDS
+    used = np.flatnonzero(q_present.any(axis=0))
+    width = len(used) * (block + 1) + HANDS + 1
+
+    penalty_sq = np.float64(penalty) ** 2
+    q_norms = np.zeros((len(query), HANDS))
+    a = np.empty((len(t_present), width))
+    b = np.empty((len(query), width))
+    for i, h in enumerate(used):
+        cols = slice(h * block, (h + 1) * block)
+        t = a[:, i * block:(i + 1) * block]
+        t[...] = templates[:, :, cols].reshape(-1, block)
+        q = query[:, cols].astype(np.float64)
+        b[:, i * block:(i + 1) * block] = -2.0 * q
+        a[:, len(used) * block + i] = np.einsum('mf,mf->m', t, t)
+        b[:, len(used) * block + i] = q_present[:, h]
+        q_norms[:, h] = np.einsum('nf,nf->n', q, q)
+
+    start = len(used) * (block + 1)
+    a[:, start:start + HANDS] = t_present
+    b[:, start:start + HANDS] = q_norms + penalty_sq * (1.0 - 2.0 * q_present)
+    a[:, -1] = 1.0
+    b[:, -1] = penalty_sq * q_present.sum(axis=1)
+    return a @ b.T
+
+
+def batch_frame_costs(query, templates, penalty=None, template_presence=None):
+    """
+    Euclidean distance from every query frame to every template frame.
+
+    Uses |a - b|^2 = |a|^2 + |b|^2 - 2 a.b so the whole batch is a single
+    matrix product instead of materializing (T, n, m, features) differences.
+    Accumulated in float64 to keep cancellation error far below float32
+    rounding.
+
+    penalty: use the presence-aware cost (presence_sq_costs);
+    template_presence optionally supplies hand_presence(templates)
+
+    Returns: (T, max_len, n) float64 costs
+    """
+    num_templates, max_len, features = templates.shape
+    if penalty is None:
+        q = query.astype(np.float64)
+        t = templates.reshape(-1, features).astype(np.float64)
+        sq = (np.einsum('mf,mf->m', t, t)[:, None]
+              + np.einsum('nf,nf->n', q, q)[None, :]
+              - 2.0 * (t @ q.T))
+    else:
+        sq = presence_sq_costs(query, templates, penalty, template_presence)
+    np.maximum(sq, 0.0, out=sq)
+    return np.sqrt(sq, out=sq).reshape(num_templates, max_len, -1)
+
+
+def batch_band_costs(query, templates, lengths, window=None, penalty=None, template_presence=None):
+    """
+    Frame costs of the union of every template's band, by anti-diagonal.
+
+    Each template gets the band of dtw_distance_fast(query, template,
+    window); cells outside it or past the template's length are inf.
+    penalty / template_presence: see batch_frame_costs
+
+    Returns: (costs, lo) with costs (T, n + max_len + 1, hi - lo + 1)
+    float64 and lo the lowest offset of the union
+    """
+    n = len(query)
+    num_templates, max_len = templates.shape[:2]
+
+    # Vectorized default_window(n, m, window) for every template length
+    if window is None:
+        windows = np.maximum(n, lengths) // 4 + 1
+    else:
+        windows = np.full(num_templates, window)
+    windows = np.maximum(windows, np.abs(n - lengths) + 1)
+
+    # Per-template band limits and their union
+    lo_t = np.maximum(-lengths, -windows)
+    hi_t = np.minimum(n, windows)
+    lo, hi = int(lo_t.min()), int(hi_t.max())
+    width = hi - lo + 1
+
+    rows, cols, diag, slot = band_cells(n, max_len, lo, hi)
+    offset = rows - cols
+    valid = ((cols < lengths[:, None])
+             & (offset >= lo_t[:, None])
+             & (offset <= hi_t[:, None]))
+    cell_costs = batch_frame_costs(query, templates, penalty, template_presence)[:, cols, rows]
+
+    costs = np.full((num_templates, n + max_len + 1, width), np.inf)
+    costs[:, diag, slot] = np.where(valid, cell_costs, np.inf)
+    return costs, lo
+
+
+def dtw_batch(query, templates, lengths, window=None, abandon_above=None, penalty=None,
+              template_presence=None):
+    """
+    DTW distance from one query to every template at once.
+
+    query:     (n, features)
+    templates: (T, max_len, features) padded tensor from stack_templates
+    lengths:   (T,) real template lengths
+
+    Each template gets the same band as dtw_distance_fast(query, template,
+    window) and is normalized by n + m, so distances match the per-template
+    calls up to float32 rounding of the frame costs. The wavefront runs once
+    over the union of all bands with the template axis vectorized; cells
+    outside a template's own band or length are masked to inf.
+
+    abandon_above: optional (T,) normalized distance limits. Every warping
+    path crosses one of any two consecutive anti-diagonals, so a template
+    is abandoned once both exceed its limit; abandoned templates return inf
+    and the loop stops when no template is left running.
+
+    penalty / template_presence: presence-aware frame cost, see
+    batch_frame_costs
+
+    Returns: (T,) float64 distances
+    """
+    n = len(query)
+    num_templates, max_len = templates.shape[:2]
+    if num_templates == 0:
+        return np.empty(0)
+
+    costs, lo = batch_band_costs(query, templates, lengths, window, penalty, template_presence)
+    width = costs.shape[2]
+
+    # Templates reach their (n, m) corner on different diagonals
+    totals = np.full(num_templates, np.inf)
+    corner_slot = n - lengths - lo + 1
+    finish = {}
+    for t, m in enumerate(lengths):
+        finish.setdefault(n + int(m), []).append(t)
+
+    prev2 = np.full((num_templates, width + 2), np.inf)
+    prev1 = np.full((num_templates, width + 2), np.inf)
+    cur = np.full((num_templates, width + 2), np.inf)
+    best = np.empty((num_templates, width))
+
+    prev2[:, 1 - lo] = 0.0
+    if 0 in finish:
+        totals[finish[0]] = 0.0
+
+    # Working arrays hold the templates in `active`; row_of maps back
+    active = np.arange(num_templates)
+    row_of = np.arange(num_templates)
+    running = np.ones(num_templates, dtype=bool)
+    abandoned = np.zeros(num_templates, dtype=bool)
+    if abandon_above is not None:
+        limits = np.asarray(abandon_above, dtype=np.float64) * (n + lengths)
+        prev2_low = np.zeros(num_templates)
+
+    for d in range(2, n + max_len + 1):
+        np.minimum(prev1[:, :-2], prev1[:, 2:], out=best)
+        np.minimum(best, prev2[:, 1:-1], out=best)
+        np.add(costs[:, d], best, out=cur[:, 1:-1])
+        prev2, prev1, cur = prev1, cur, prev2
+
+        if d in finish:
+            done = np.array(finish[d])
+            done = done[row_of[done] >= 0]
+            totals[done] = prev1[row_of[done], corner_slot[done]]
+            running[done] = False
+
+        if abandon_above is None:
+            continue
+
+        prev1_low = prev1.min(axis=1)
+        over = np.minimum(prev1_low, prev2_low) > limits[active]
+        abandoned[active[over & running[active]]] = True
+        running &= ~abandoned
+        prev2_low = prev1_low
+
+        # Drop finished / abandoned rows once they are half the work
+        keep = running[active]
+        if not keep.any():
+            break
+        if keep.sum() * 2 <= len(active):
+            active = active[keep]
+            costs, prev1, prev2 = costs[keep], prev1[keep], prev2[keep]
+            cur, best, prev2_low = cur[keep], best[keep], prev2_low[keep]
+            row_of[:] = -1
+            row_of[active] = np.arange(len(active))
+
+    totals[abandoned] = np.inf
+    return totals / (n + lengths)
+
+
+def dtw_batch_open_end(query, templates, lengths, window=None, penalty=None, template_presence=None):
+    """
+    Open-end DTW: the whole query against the best-matching prefix of
+    every template, for gestures still in progress.
+
+    Same bands and frame costs as dtw_batch. The path must start at
+    (1, 1) and use every query frame, but may end at any template frame
+    j; each end is normalized by its own path length n + j and the best
+    one is kept.
+
+    Returns: (distances, ends), (T,) float64 normalized distances and
+    the (T,) template prefix lengths j they were reached at
+    """
+    n = len(query)
+    num_templates, max_len = templates.shape[:2]
+    distances = np.full(num_templates, np.inf)
+    ends = np.zeros(num_templates, dtype=np.int64)
+    if num_templates == 0 or n == 0:
+        return distances, ends
+
+    costs, lo = batch_band_costs(query, templates, lengths, window, penalty, template_presence)
+    width = costs.shape[2]
+
+    prev2 = np.full((num_templates, width + 2), np.inf)
+    prev1 = np.full((num_templates, width + 2), np.inf)
+    cur = np.full((num_templates, width + 2), np.inf)
+    best = np.empty((num_templates, width))
+    prev2[:, 1 - lo] = 0.0
+
+    for d in range(2, n + max_len + 1):
+        np.minimum(prev1[:, :-2], prev1[:, 2:], out=best)
+        np.minimum(best, prev2[:, 1:-1], out=best)
+        np.add(costs[:, d], best, out=cur[:, 1:-1])
+        prev2, prev1, cur = prev1, cur, prev2
+
+        # Cell (n, j) of this diagonal: the same band slot for every template
+        j = d - n
+        slot = n - j - lo + 1
+        if j < 1 or not 1 <= slot <= width:
+            continue
+        value = prev1[:, slot] / (n + j)
+        better = value < distances
+        distances[better] = value[better]
+        ends[better] = j
+    return distances, ends
+
+
+def dtw_batch_paths(query, templates, lengths, window=None, penalty=None):
+    """
+    Optimal warping paths from one query to every template at once.
+
+    Same bands and costs as dtw_batch; every diagonal is kept and all
+    templates walk back from their corners together, preferring the
+    match step on ties like dtw_path.
+
+    Returns: (template, i, j) int arrays listing every path cell, with
+    0-based query frame i and template frame j
+    """
+    n = len(query)
+    num_templates, max_len = templates.shape[:2]
+    if num_templates == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    costs, lo = batch_band_costs(query, templates, lengths, window, penalty)
+    acc = np.full((num_templates, n + max_len + 1, costs.shape[2] + 2), np.inf)
+    acc[:, 0, 1 - lo] = 0.0
+    for d in range(2, n + max_len + 1):
+        best = np.minimum(acc[:, d - 1, :-2], acc[:, d - 1, 2:])
+        np.minimum(best, acc[:, d - 2, 1:-1], out=best)
+        np.add(costs[:, d], best, out=acc[:, d, 1:-1])
+
+    t = np.arange(num_templates)
+    i = np.full(num_templates, n)
+    j = np.asarray(lengths, dtype=np.int64).copy()
+    cells = []
+    walking = np.ones(num_templates, dtype=bool)
+    while walking.any():
+        tw, iw, jw = t[walking], i[walking], j[walking]
+        cells.append((tw, iw - 1, jw - 1))
+        walking &= (i != 1) | (j != 1)
+        tw, iw, jw = t[walking], i[walking], j[walking]
+        d, s = iw + jw, iw - jw - lo + 1
+        steps = np.stack([acc[tw, d - 2, s], acc[tw, d - 1, s - 1], acc[tw, d - 1, s + 1]])
+        step = np.argmin(steps, axis=0)
+        i[walking] = iw - (step <= 1)
+        j[walking] = jw - (step != 1)
+
+    return tuple(np.concatenate(parts) for parts in zip(*cells))
+
+
+def lb_envelope(seq, window):
+    """
+    Upper/lower envelope of a template for LB_Keogh.
+
+    upper[i] / lower[i] are the per-feature max / min of seq[i-window:i+window+1],
+    i.e. over every template frame the band lets query frame i align with.
+    """
+    upper = seq.copy()
+    lower = seq.copy()
+    for shift in range(1, window + 1):
+        np.maximum(upper[shift:], seq[:-shift], out=upper[shift:])
+        np.maximum(upper[:-shift], seq[shift:], out=upper[:-shift])
+        np.minimum(lower[shift:], seq[:-shift], out=lower[shift:])
+        np.minimum(lower[:-shift], seq[shift:], out=lower[:-shift])
+    return upper, lower
+
+
+def lb_kim_batch(query, templates, lengths, penalty=None):
+    """
+    LB_Kim (first/last frame) lower bound of the accumulated DTW cost.
+
+    Every warping path starts at cell (1, 1) and ends at (n, m), so the sum
+    of those two frame costs never exceeds the full DTW cost.
+
+    Returns: (T,) float64 un-normalized bounds
+    """
+    first = templates[:, 0]
+    last = templates[np.arange(len(lengths)), np.maximum(lengths - 1, 0)]
+    bound = frame_pair_costs(first, query[0], penalty)
+    # The two corners are the same cell for a 1 x 1 grid
+    single = (len(query) == 1) & (lengths == 1)
+    bound += np.where(single, 0.0, frame_pair_costs(last, query[-1], penalty))
+    return bound
+
+
+def lb_keogh_batch(query, uppers, lowers, lengths, penalty=None, presence=None):
+    """
+    LB_Keogh lower bound of the accumulated DTW cost.
+
+    Each query frame i is aligned with at least one template frame inside
+    the band, which lies in the box [lower[i], upper[i]]; its distance to
+    that box bounds the cell cost. Envelopes are built for query length ==
+    template length, so other templates get a bound of 0.
+
+    uppers, lowers: (T, max_len, features) stacked lb_envelope outputs
+
+    With a penalty (presence-aware cost), presence is the stacked
+    lb_envelope of the templates' hand_presence: (uppers, lowers) of shape
+    (T, max_len, HANDS), i.e. whether any / every frame in the band has
+    the hand. Per hand the bound takes the cheaper of what a present and
+    an absent template frame could cost.
+
+    Returns: (T,) float64 un-normalized bounds
+    """
+    n = len(query)
+    bound = np.zeros(len(lengths))
+    match = lengths == n
+    if n == 0 or not match.any() or uppers.shape[1] < n:
+        return bound
+
+    if match.all():
+        upper, lower = uppers[:, :n], lowers[:, :n]
+    else:
+        upper, lower = uppers[match, :n], lowers[match, :n]
+    excess = query - np.clip(query, lower, upper)
+    if penalty is None:
+        sq = np.einsum('tnf,tnf->tn', excess, excess)
+    else:
+        blocks = excess.reshape(*excess.shape[:2], HANDS, excess.shape[-1] // HANDS)
+        box = np.einsum('tnhf,tnhf->tnh', blocks, blocks)
+        any_present = presence[0][match, :n] > 0
+        any_absent = presence[1][match, :n] == 0
+        penalty_sq = np.float64(penalty) ** 2
+        if_present = np.minimum(np.where(any_present, box, np.inf), np.where(any_absent, penalty_sq, np.inf))
+        if_absent = np.where(any_absent, 0.0, penalty_sq)
+        sq = np.where(hand_presence(query), if_present, if_absent).sum(axis=2)
+    bound[match] = np.sqrt(sq).sum(axis=1)
+    return bound
+
+
+def spring_step(total, span, start, costs, t):
+    """
+    Advance SPRING subsequence-DTW columns by one stream frame.
+
+    total: (T, max_len + 1) accumulated cost of the best partial match
+           ending at each template frame after stream frame t - 1;
+           column 0 is the free start
+    span:  (T, max_len + 1) stream frames covered by those matches
+    start: (T, max_len + 1) stream frame where those matches began
+    costs: (T, max_len) cost of frame t against every template frame,
+           inf past a template's length
+    t:     index of the new stream frame
+
+    Any stream frame may start a match, so column 0 restarts empty with
+    start t. Each stream frame advances the template by 0, 1 or 2 frames
+    (an Itakura-style step pattern), so a match covers at least half the
+    template's length and the column update has no dependency along the
+    template axis: the whole (T, max_len) step is a few array operations.
+    Predecessors are chosen by average cost per stream frame, so longer
+    well-aligned matches are not beaten by squeezed ones.
+
+    Returns: (total, span, start) for frame t
+    """
+    num_templates, columns = total.shape
+    pad_total = np.full((num_templates, 1), np.inf)
+    pad_int = np.zeros((num_templates, 1), dtype=span.dtype)
+
+    # A match leaving the free start on this frame begins at t
+    prev_start = start.copy()
+    prev_start[:, 0] = t
+
+    # Predecessors of columns 1..max_len: stay (j), advance 1 (j-1), advance 2 (j-2)
+    totals = np.stack([
+        total[:, 1:],
+        total[:, :-1],
+        np.concatenate([pad_total, total[:, :-2]], axis=1)
+    ])
+    spans = np.stack([
+        span[:, 1:],
+        span[:, :-1],
+        np.concatenate([pad_int, span[:, :-2]], axis=1)
+    ])
+    starts = np.stack([
+        prev_start[:, 1:],
+        prev_start[:, :-1],
+        np.concatenate([pad_int, prev_start[:, :-2]], axis=1)
+    ])
+
+    with np.errstate(invalid='ignore'):
+        pick = ((totals + costs) / (spans + 1)).argmin(axis=0)[None]
+    new_total = np.empty_like(total)
+    new_span = np.empty_like(span)
+    new_start = np.empty_like(start)
+    new_total[:, 0], new_span[:, 0], new_start[:, 0] = 0.0, 0, t
+    new_total[:, 1:] = np.take_along_axis(totals, pick, axis=0)[0] + costs
+    new_span[:, 1:] = np.take_along_axis(spans, pick, axis=0)[0] + 1
+    new_start[:, 1:] = np.take_along_axis(starts, pick, axis=0)[0]
+    return new_total, new_span, new_start
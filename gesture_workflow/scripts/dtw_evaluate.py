@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Leave-one-out Evaluation for the DTW Gesture Classifier
+
+Used by train_model. The symmetric N x N DTW matrix between all
+templates is computed once (upper triangle only, rows spread over worker
+processes), and every held-out prediction is read from it instead of
+rebuilding a classifier per sample.
+
+- k-NN: the k nearest other templates, voted exactly like classify
+- centroids: the held-out sample's class prototypes are rebuilt without
+  it (clustered from the matrix, averaged with DBA) and the nearest
+  prototype wins, as in production centroid mode
+"""
+
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dtw_engine import dtw_batch, stack_templates
+
+# Below this many templates everything runs in-process: pool startup
+# costs more than the DTWs it would spread
+PARALLEL_MIN_TEMPLATES = 48
+
+# Row chunks per worker, so uneven rows still balance out
+CHUNKS_PER_WORKER = 4
+
+_state = {}
+
+
+def init_worker(state):
+    """Pool initializer: data shared by every task"""
+    _state.clear()
+    _state.update(state)
+
+
+def run_tasks(fn, tasks, state, workers):
+    """fn over tasks, in a process pool when it is worth it"""
+    if workers <= 1 or len(state['sequences']) < PARALLEL_MIN_TEMPLATES:
+        init_worker(state)
+        try:
+            return [fn(task) for task in tasks]
+        finally:
+            _state.clear()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(state,)) as pool:
+        return list(pool.map(fn, tasks))
+
+
+def matrix_rows(rows):
+    """Task: distances from some sequences to the given columns"""
+    sequences, padded, lengths = _state['sequences'], _state['padded'], _state['lengths']
+    penalty = _state['penalty']
+    return [(i, cols, dtw_batch(sequences[i], padded[cols], lengths[cols], penalty=penalty))
+            for i, cols in rows]
+
+
+def missing_rows(known):
+    """
+    Group the unknown pairs of a symmetric matrix into (row, columns)
+    tasks, each pair once. A pair is charged to the endpoint missing the
+    most entries, so a new sequence becomes one batched row instead of
+    one single-column call per old sequence.
+    """
+    missing = np.isnan(known)
+    np.fill_diagonal(missing, False)
+    counts = missing.sum(axis=1)
+    i, j = np.nonzero(np.triu(missing))
+    owner = np.where(counts[i] >= counts[j], i, j)
+    other = np.where(owner == i, j, i)
+
+    rows = []
+    for row in np.unique(owner):
+        rows.append((int(row), other[owner == row]))
+    return rows
+
+
+def balanced_chunks(rows, num_chunks):
+    """Deal (row, columns) tasks into chunks of similar total width"""
+    chunks = [[] for _ in range(max(1, min(num_chunks, len(rows))))]
+    loads = [0] * len(chunks)
+    for row in sorted(rows, key=lambda row: -len(row[1])):
+        c = loads.index(min(loads))
+        chunks[c].append(row)
+        loads[c] += len(row[1])
+    return chunks
+
+
+def distance_matrix(sequences, workers=None, known=None, penalty=None):
+    """
+    Symmetric matrix of dtw_distance_fast between all sequences.
+
+    known: optional (n, n) matrix of already computed distances, NaN
+    where unknown (e.g. from the training cache); only those pairs are
+    computed. Each pair is computed once, batched per row.
+    penalty: presence-aware frame cost, as the classifier's presence_penalty
+    """
+    n = len(sequences)
+    workers = workers or os.cpu_count() or 1
+    if known is None:
+        known = np.full((n, n), np.nan)
+    distances = np.where(np.isnan(known), 0.0, known)
+    np.fill_diagonal(distances, 0.0)
+
+    rows = missing_rows(known)
+    if not rows:
+        return distances
+
+    padded, lengths = stack_templates(sequences)
+    state = {'sequences': sequences, 'padded': padded, 'lengths': lengths, 'penalty': penalty}
+    for chunk in run_tasks(matrix_rows, balanced_chunks(rows, workers * CHUNKS_PER_WORKER), state, workers):
+        for i, cols, row in chunk:
+            distances[i, cols] = row
+            distances[cols, i] = row
+    return distances
+
+
+def knn_predictions(distances, labels, k):
+    """Held-out k-NN predictions, voted like DTWGestureClassifier.classify"""
+    predictions = []
+    for i in range(len(labels)):
+        others = [j for j in range(len(labels)) if j != i]
+        if not others:
+            predictions.append("Unknown")
+            continue
+        others.sort(key=lambda j: distances[i, j])
+        votes = Counter(labels[j] for j in others[:min(k, len(others))])
+        predictions.append(votes.most_common(1)[0][0])
+    return predictions
+
+
+def prototype_prediction(i):
+    """Task: held-out prediction of sample i against rebuilt prototypes"""
+    from dtw_gesture import cluster_sequences, dba_average
+
+    sequences, labels, distances = _state['sequences'], _state['labels'], _state['distances']
+    penalty = _state['penalty']
+    held_out = labels[i]
+    members = np.array([j for j, label in enumerate(labels) if label == held_out and j != i])
+
+    # Same result as compute_prototypes on the remaining sequences. Most
+    # clusters do not contain i and recur for every held-out sample of
+    # the class, so their DBA averages are memoized by member list.
+    memo = _state.setdefault('dba_memo', {})
+    prototypes = dict(_state['prototypes'])
+    prototypes[held_out] = []
+    if len(members):
+        clusters = cluster_sequences(distances[np.ix_(members, members)], _state['num_prototypes'])
+        for cluster in clusters:
+            key = tuple(members[cluster].tolist())
+            if key not in memo:
+                memo[key] = dba_average([sequences[j] for j in key], sequences[key[0]], penalty=penalty)[0]
+            prototypes[held_out].append(memo[key])
+
+    bank = [(name, seq) for name, seqs in prototypes.items() for seq in seqs]
+    if not bank:
+        return "Unknown"
+    padded, lengths = stack_templates([seq for _, seq in bank])
+    dists = dtw_batch(sequences[i], padded, lengths, penalty=penalty)
+    return bank[int(np.argmin(dists))][0]
+
+
+def confusion_matrix(labels, predictions, class_names):
+    """{true_class: {predicted_class: count}}"""
+    matrix = {true: {pred: 0 for pred in class_names} for true in class_names}
+    for true, pred in zip(labels, predictions):
+        row = matrix.setdefault(true, {pred: 0 for pred in class_names})
+        row[pred] = row.get(pred, 0) + 1
+    return matrix
+
+
+def summarize(labels, predictions, class_names):
+    correct = sum(true == pred for true, pred in zip(labels, predictions))
+    return {
+        "accuracy": correct / len(labels) if labels else 0.0,
+        "confusion_matrix": confusion_matrix(labels, predictions, class_names)
+    }
+
+
+def leave_one_out(classifier, distances, workers=None):
+    """
+    LOO results for the k-NN and centroid strategies.
+
+    classifier: trained classifier with centroids built
+    distances:  distance_matrix over classifier.templates
+
+    Returns: {"knn": {...}, "centroids": {...}}, each holding
+    "accuracy" and "confusion_matrix"
+    """
+    workers = workers or os.cpu_count() or 1
+    labels = [class_name for class_name, _ in classifier.templates]
+    sequences = [seq for _, seq in classifier.templates]
+
+    knn = knn_predictions(distances, labels, classifier.k)
+
+    state = {
+        'sequences': sequences,
+        'labels': labels,
+        'distances': distances,
+        'prototypes': classifier.centroids,
+        'num_prototypes': classifier.prototypes,
+        'penalty': classifier.presence_penalty
+    }
+    centroids = run_tasks(prototype_prediction, range(len(labels)), state, workers)
+
+    return {
+        "knn": summarize(labels, knn, classifier.class_names),
+        "centroids": summarize(labels, centroids, classifier.class_names)
+    }
+
+
+def dtw_query_ms(classifier, queries, repeat=3):
+    """
+    Milliseconds per query of the batched DTW against all templates
+    (best of `repeat`), e.g. to compare feature spaces. Queries must be
+    in the classifier's template space.
+    """
+    _, padded, lengths = classifier.template_bank(False)
+    penalty = classifier.presence_penalty
+    presence = None if penalty is None else classifier.bank_presence(False)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in queries:
+            dtw_batch(query, padded, lengths, penalty=penalty, template_presence=presence)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000 / max(len(queries), 1)
@@ -15,6 +15,16 @@ import sys
 from datetime import datetime
 import pickle
 from collections import Counter
+from itertools import chain
+
+from dtw_engine import (
+    default_window, dtw, dtw_batch, dtw_batch_paths, dtw_batch_open_end, stack_templates,
+    lb_envelope, lb_kim_batch, lb_keogh_batch, spring_step,
+    hand_presence, frame_pair_costs
+)
+from dtw_model_format import pack_sequences, unpack_sequences, stacked_view, write_model, read_model
+from stream_protocol import iter_timed_requests, ProtocolError
+from stream_stats import RequestTimer, StreamStats, wants_timing, install_stats_signal
 
 # Configuration
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -22,8 +32,45 @@ WORKFLOW_DIR = os.path.dirname(SCRIPT_DIR)
 GESTURES_DIR = os.path.join(WORKFLOW_DIR, 'gestures')
 MODELS_DIR = os.path.join(WORKFLOW_DIR, 'models')
 CLASSES_FILE = os.path.join(WORKFLOW_DIR, 'classes.json')
-MODEL_PATH = os.path.join(MODELS_DIR, 'gesture_model.pkl')
+MODEL_PATH = os.path.join(MODELS_DIR, 'gesture_model.gdtw')
+LEGACY_MODEL_PATH = os.path.join(MODELS_DIR, 'gesture_model.pkl')  # Converted by --convert-model
 MODEL_INFO_PATH = os.path.join(MODELS_DIR, 'model_info.json')
+CACHE_DIR = os.path.join(MODELS_DIR, 'cache')
+
+# Full-template k-NN pruning: size of the first batched DTW call after
+# the seed candidates (doubling afterwards) and the slack absorbing float
+# rounding between lower bounds and batched DTW
+CASCADE_BLOCK = 8
+LB_SLACK = 1e-5
+
+# Frame-push streaming: normalized DTW distance below which a subsequence
+# counts as a spotted gesture, and the stream decimation that brings 30 fps
+# input close to the rate of the downsampled templates (~2 s -> 20 frames)
+SPOT_THRESHOLD = 0.6
+SPOT_STRIDE = 3
+
+# Centroid mode: prototypes learned per class (DTW k-medoids clusters,
+# each averaged with DTW Barycenter Averaging) and DBA refinement passes
+PROTOTYPES_PER_CLASS = 3
+DBA_ITERATIONS = 10
+
+# Optional PCA of the 126 frame features (train --pca-variance / --pca-components):
+# default share of the variance the kept components must explain
+PCA_VARIANCE = 0.95
+PCA_TIMING_QUERIES = 20  # Templates timed as queries for the speedup report
+
+# Frame cost added for a hand detected in only one of two frames, instead
+# of comparing its landmarks with the 63 zeros of the missing hand (about
+# the length of a normalized hand's feature block)
+PRESENCE_PENALTY = 5.0
+
+# Early decision on gestures in progress ({"frames": [...], "early": true}):
+# frames a whole gesture is expected to take (2 s at 30 fps, the default
+# class duration), the share of it that must be seen before deciding, and
+# the relative distance margin 1 - best / second best class required
+EARLY_EXPECTED_FRAMES = 60
+EARLY_MIN_FRACTION = 0.25
+EARLY_MARGIN = 0.2
 
 # Hand landmark indices
 WRIST = 0
@@ -78,33 +125,72 @@ def normalize_landmarks(landmarks):
     return landmarks
 
 
-def extract_frame_features(frame):
+def frames_to_landmarks(frames):
     """
-    Extract normalized features from a single frame.
-    Returns flattened array of both hands' landmarks.
+    Parse a frame list into one landmark array.
+    
+    Only the JSON lists are touched per frame; every hand with at least
+    21 landmarks is converted to float32 in a single pass.
+    
+    Returns: (landmarks, present)
+      landmarks: (num_frames, 2, 21, 3) float32, zeros for absent hands
+      present:   (num_frames, 2) bool, [left, right] hand detected
     """
-    left_hand = frame.get('left_hand')
-    right_hand = frame.get('right_hand')
+    num_frames = len(frames)
+    hands = []
+    slots = []
+    for t, frame in enumerate(frames):
+        for h, key in enumerate(('left_hand', 'right_hand')):
+            hand = frame.get(key)
+            if hand and 'landmarks' in hand:
+                landmarks = hand['landmarks']
+                if landmarks is not None and len(landmarks) >= 21:
+                    hands.append(landmarks[:21])
+                    slots.append(t * 2 + h)
     
-    # Process left hand
-    if left_hand and 'landmarks' in left_hand:
-        left_norm = normalize_landmarks(left_hand['landmarks'])
-    else:
-        left_norm = np.zeros((21, 3), dtype=np.float32)
+    landmarks = np.zeros((num_frames * 2, 21, 3), dtype=np.float32)
+    present = np.zeros(num_frames * 2, dtype=bool)
+    if hands:
+        flat = np.fromiter(chain.from_iterable(chain.from_iterable(hands)), dtype=np.float32)
+        if flat.size != len(hands) * 21 * 3:
+            # Malformed landmarks (not [x, y, z]): let numpy raise as before
+            flat = np.array(hands, dtype=np.float32)
+        landmarks[slots] = flat.reshape(-1, 21, 3)
+        present[slots] = True
+    return landmarks.reshape(num_frames, 2, 21, 3), present.reshape(num_frames, 2)
+
+
+def normalize_hands(landmarks, present):
+    """
+    Vectorized normalize_landmarks over every detected hand at once.
     
-    # Process right hand
-    if right_hand and 'landmarks' in right_hand:
-        right_norm = normalize_landmarks(right_hand['landmarks'])
-    else:
-        right_norm = np.zeros((21, 3), dtype=np.float32)
+    landmarks: (num_frames, 2, 21, 3) float32, normalized in place
+    present:   (num_frames, 2) bool
+    """
+    hands = landmarks[present]
     
-    if left_norm is None:
-        left_norm = np.zeros((21, 3), dtype=np.float32)
-    if right_norm is None:
-        right_norm = np.zeros((21, 3), dtype=np.float32)
+    # Translate to wrist origin
+    hands -= hands[:, WRIST:WRIST + 1]
     
-    # Flatten both hands: (21*3 + 21*3) = 126 features
-    return np.concatenate([left_norm.flatten(), right_norm.flatten()])
+    # Palm size (wrist to middle MCP); row-wise dot products reduce
+    # exactly like np.linalg.norm on one landmark
+    mcp = hands[:, MIDDLE_MCP]
+    palm_size = np.sqrt(np.matmul(mcp[:, None, :], mcp[:, :, None])[:, 0, 0])
+    
+    # Scale by palm size (avoid division by zero)
+    scale = np.where(palm_size > 0.001, palm_size, np.float32(1.0))
+    hands /= scale[:, None, None]
+    
+    landmarks[present] = hands
+    return landmarks
+
+
+def extract_frame_features(frame):
+    """
+    Extract normalized features from a single frame.
+    Returns flattened array of both hands' landmarks.
+    """
+    return sequence_to_features([frame])[0]
 
 
 def sequence_to_features(frames):
@@ -112,11 +198,49 @@ def sequence_to_features(frames):
     Convert a sequence of frames to a feature matrix.
     Returns: numpy array (num_frames, 126)
     """
-    features = []
-    for frame in frames:
-        f = extract_frame_features(frame)
-        features.append(f)
-    return np.array(features, dtype=np.float32)
+    landmarks, present = frames_to_landmarks(frames)
+    return landmarks_to_features(landmarks, present)
+
+
+def landmarks_to_features(landmarks, present):
+    """
+    Feature matrix from parsed landmarks, e.g. a binary stream request.
+    landmarks is normalized in place and must be writable.
+    Returns: numpy array (num_frames, 126)
+    """
+    landmarks[~present] = 0.0
+    normalize_hands(landmarks, present)
+    
+    # Flatten both hands: (21*3 + 21*3) = 126 features
+    return landmarks.reshape(len(landmarks), 2 * 21 * 3)
+
+
+def fit_projection(sequences, components=None, variance=PCA_VARIANCE):
+    """
+    PCA of all frames of the given feature sequences.
+    
+    components: number of kept components; if None, the fewest that
+                explain `variance` of the total variance
+    
+    Returns: ((mean (126,), basis (126, C)) float32, explained variance
+    ratio of each kept component)
+    """
+    frames = np.concatenate(sequences).astype(np.float64)
+    mean = frames.mean(axis=0)
+    centered = frames - mean
+    eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered / max(len(frames) - 1, 1))
+    order = np.argsort(eigenvalues)[::-1]
+    eigenvalues = np.clip(eigenvalues[order], 0.0, None)
+    eigenvectors = eigenvectors[:, order]
+    
+    total = eigenvalues.sum()
+    ratio = eigenvalues / total if total > 0 else np.zeros_like(eigenvalues)
+    if components is None:
+        components = int(np.searchsorted(np.cumsum(ratio), variance - 1e-12)) + 1
+    components = int(np.clip(components, 1, len(mean)))
+    
+    projection = (mean.astype(np.float32), np.ascontiguousarray(eigenvectors[:, :components], dtype=np.float32))
+    return projection, ratio[:components]
 
 
 def dtw_distance(seq1, seq2):
@@ -128,26 +252,8 @@ def dtw_distance(seq1, seq2):
     
     Returns: float distance
     """
-    n, m = len(seq1), len(seq2)
-    
-    # Cost matrix
-    dtw_matrix = np.full((n + 1, m + 1), np.inf)
-    dtw_matrix[0, 0] = 0
-    
-    for i in range(1, n + 1):
-        for j in range(1, m + 1):
-            # Euclidean distance between frames
-            cost = np.linalg.norm(seq1[i-1] - seq2[j-1])
-            
-            # DTW recurrence
-            dtw_matrix[i, j] = cost + min(
-                dtw_matrix[i-1, j],      # insertion
-                dtw_matrix[i, j-1],      # deletion
-                dtw_matrix[i-1, j-1]     # match
-            )
-    
-    # Normalize by path length
-    return dtw_matrix[n, m] / (n + m)
+    # Unconstrained recurrence, normalized by path length
+    return dtw(seq1, seq2)
 
 
 def dtw_distance_fast(seq1, seq2, window=None):
@@ -156,28 +262,8 @@ def dtw_distance_fast(seq1, seq2, window=None):
     Much faster for long sequences.
     """
     n, m = len(seq1), len(seq2)
-    
-    if window is None:
-        window = max(n, m) // 4 + 1
-    
-    window = max(window, abs(n - m) + 1)
-    
-    dtw_matrix = np.full((n + 1, m + 1), np.inf)
-    dtw_matrix[0, 0] = 0
-    
-    for i in range(1, n + 1):
-        j_start = max(1, i - window)
-        j_end = min(m, i + window) + 1
-        
-        for j in range(j_start, j_end):
-            cost = np.linalg.norm(seq1[i-1] - seq2[j-1])
-            dtw_matrix[i, j] = cost + min(
-                dtw_matrix[i-1, j],
-                dtw_matrix[i, j-1],
-                dtw_matrix[i-1, j-1]
-            )
-    
-    return dtw_matrix[n, m] / (n + m)
+    window = default_window(n, m, window)
+    return dtw(seq1, seq2, window)
 
 
 def downsample_sequence(seq, target_frames=20):
@@ -218,6 +304,114 @@ def compute_centroid(sequences):
     return np.mean(resampled, axis=0).astype(np.float32)
 
 
+def pairwise_dtw(sequences, penalty=None):
+    """
+    Symmetric matrix of dtw_distance_fast between all sequences,
+    one batched DTW call per row.
+    penalty: presence-aware frame cost (see dtw_engine)
+    """
+    padded, lengths = stack_templates(sequences)
+    distances = np.array([dtw_batch(seq, padded, lengths, penalty=penalty) for seq in sequences])
+    distances = (distances + distances.T) / 2
+    np.fill_diagonal(distances, 0.0)
+    return distances
+
+
+def cluster_sequences(distances, num_clusters):
+    """
+    k-medoids on a precomputed DTW distance matrix.
+    
+    Starts from the overall medoid, adds the sequence farthest from the
+    current medoids until there are num_clusters, then alternates
+    assignment and medoid update until stable.
+    
+    Returns: list of member index arrays, one per cluster
+    """
+    n = len(distances)
+    medoids = [int(np.argmin(distances.sum(axis=1)))]
+    while len(medoids) < min(num_clusters, n):
+        farthest = distances[:, medoids].min(axis=1)
+        if farthest.max() <= 0:
+            break  # Remaining sequences duplicate a medoid
+        medoids.append(int(np.argmax(farthest)))
+    
+    for _ in range(n):
+        assignment = np.argmin(distances[:, medoids], axis=1)
+        clusters = [np.flatnonzero(assignment == c) for c in range(len(medoids))]
+        clusters = [members for members in clusters if len(members)]
+        updated = [int(members[np.argmin(distances[np.ix_(members, members)].sum(axis=1))])
+                   for members in clusters]
+        if updated == medoids:
+            break
+        medoids = updated
+    
+    # Medoid first: it seeds the DBA average
+    return [np.array([m] + [i for i in members if i != m])
+            for m, members in zip(medoids, clusters)]
+
+
+def dba_accumulate(average, sequences, penalty=None):
+    """
+    Align sequences to an average with the same band as dtw_distance_fast
+    (all paths in one batched call).
+    
+    Returns: (sums, counts), float64 sums of the frames warped onto each
+    average frame and how many there are
+    """
+    padded, lengths = stack_templates(sequences)
+    t, i, j = dtw_batch_paths(average, padded, lengths, penalty=penalty)
+    # Every path visits every average frame: sum the frames warped
+    # onto each one as contiguous runs of the cells sorted by frame
+    order = np.argsort(i, kind='stable')
+    counts = np.bincount(i, minlength=len(average)).astype(np.float64)
+    starts = np.concatenate([[0], np.cumsum(counts[:-1])]).astype(np.int64)
+    sums = np.add.reduceat(padded[t[order], j[order]].astype(np.float64), starts)
+    return sums, counts
+
+
+def dba_average(sequences, initial, iterations=DBA_ITERATIONS, penalty=None):
+    """
+    DTW Barycenter Averaging (Petitjean et al., 2011).
+    
+    Replaces each average frame by the mean of the frames warped onto it
+    until the average stops changing.
+    
+    Returns: (average, sums, counts); the accumulators of the last
+    alignment, so sequences can later be folded in or out as running
+    statistics (average == sums / counts once converged). With
+    iterations=0 the initial average is returned as is.
+    """
+    average = np.array(initial, dtype=np.float32)
+    sums, counts = dba_accumulate(average, sequences, penalty)
+    for _ in range(iterations):
+        updated = (sums / counts[:, None]).astype(np.float32)
+        converged = np.allclose(updated, average, atol=1e-6)
+        average = updated
+        if converged:
+            break
+        sums, counts = dba_accumulate(average, sequences, penalty)
+    return average, sums, counts
+
+
+def compute_prototypes(sequences, num_prototypes, distances=None, penalty=None):
+    """
+    Up to num_prototypes representative sequences: the class is clustered
+    by DTW distance and every cluster averaged with DBA.
+    distances: optional precomputed pairwise_dtw(sequences)
+    penalty:   presence-aware frame cost of the alignments
+    
+    Returns: list of dba_average results (prototype, sums, counts)
+    """
+    if not sequences:
+        return []
+    
+    if distances is None:
+        distances = pairwise_dtw(sequences, penalty)
+    clusters = cluster_sequences(distances, num_prototypes)
+    return [dba_average([sequences[i] for i in members], sequences[members[0]], penalty=penalty)
+            for members in clusters]
+
+
 class DTWGestureClassifier:
     """
     DTW + k-NN Gesture Classifier
@@ -227,38 +421,300 @@ class DTWGestureClassifier:
     
     Optimized version uses:
     - Downsampled sequences (20 frames) for faster comparison
-    - Centroid templates (1 per class) for O(num_classes) instead of O(num_templates)
+    - Centroid templates (a few DBA prototypes per class) for O(num_classes)
+      instead of O(num_templates)
+    - Optional LB_Kim / LB_Keogh pruning with early-abandoning DTW for full-template k-NN
+    - A hand-presence-aware frame cost, so one-handed gestures compare one hand
     """
     
-    def __init__(self, k=3, use_centroids=True, downsample_frames=20):
+    def __init__(self, k=3, use_centroids=True, downsample_frames=20, prune=False,
+                 prototypes=PROTOTYPES_PER_CLASS, presence_penalty=PRESENCE_PENALTY):
         self.k = k
         self.use_centroids = use_centroids
         self.downsample_frames = downsample_frames
+        self.prune = prune
+        self.prototypes = prototypes
+        self.presence_penalty = presence_penalty  # None: plain Euclidean frame cost
         self.templates = []  # List of (class_name, sequence)
+        self.template_ids = []  # "class/sequence_id" per template
+        self.envelopes = []  # LB_Keogh (upper, lower) per template
         self.class_names = []
-        self.centroids = {}  # class_name -> centroid sequence (computed during save/build)
+        self.centroids = {}  # class_name -> list of prototype sequences (computed during save/build)
+        self.prototype_stats = {}  # class_name -> DBA (sums, counts) per prototype
+        self.projection = None  # Optional PCA (mean, basis) applied to frames before DTW
+        self.revision = 0  # Bumped by every incremental update
+        self.version = None  # Set when saved or loaded, reported as "model_version"
+        self.last_prune_stats = None  # Candidates removed per cascade stage on the last classify
+        self._banks = {}  # 'templates' / 'centroids' / 'envelopes' -> stacked tensors
+    
+    def project(self, sequence):
+        """Frames in the space templates are stored in (PCA-projected if fitted)"""
+        if self.projection is None:
+            return sequence
+        mean, basis = self.projection
+        return np.matmul(sequence - mean, basis, dtype=np.float32)
     
-    def add_template(self, class_name, sequence):
-        """Add a template sequence for a class"""
+    def template_bank(self, use_centroids):
+        """
+        Stacked float32 tensor of the templates classify compares against.
+        Built lazily and reused until templates or centroids change.
+        """
+        key = 'centroids' if use_centroids else 'templates'
+        if key not in self._banks:
+            if use_centroids:
+                pairs = [(class_name, seq) for class_name, prototypes in self.centroids.items()
+                         for seq in prototypes]
+            else:
+                pairs = self.templates
+            labels = [class_name for class_name, _ in pairs]
+            padded, lengths = stack_templates([seq for _, seq in pairs])
+            self._banks[key] = (labels, padded, lengths)
+        return self._banks[key]
+    
+    def envelope_bank(self):
+        """Stacked LB_Keogh envelopes, aligned with template_bank(False)"""
+        if 'envelopes' not in self._banks:
+            uppers, _ = stack_templates([upper for upper, _ in self.envelopes])
+            lowers, _ = stack_templates([lower for _, lower in self.envelopes])
+            self._banks['envelopes'] = (uppers, lowers)
+        return self._banks['envelopes']
+    
+    def bank_presence(self, use_centroids):
+        """
+        Hand presence of every frame of template_bank(use_centroids),
+        (T, max_len, HANDS). Cached until the bank is rebuilt.
+        """
+        _, padded, _ = self.template_bank(use_centroids)
+        key = 'centroid_presence' if use_centroids else 'template_presence'
+        cached = self._banks.get(key)
+        if cached is None or cached[0] is not padded:
+            cached = (padded, hand_presence(padded))
+            self._banks[key] = cached
+        return cached[1]
+    
+    def presence_envelope_bank(self):
+        """LB_Keogh envelopes of the template presence, for the cascade"""
+        _, padded, lengths = self.template_bank(False)
+        cached = self._banks.get('presence_envelopes')
+        if cached is None or cached[0] is not padded:
+            presence = self.bank_presence(False).astype(np.float32)
+            envelopes = [self.template_envelope(presence[i, :m]) for i, m in enumerate(lengths.tolist())]
+            uppers, _ = stack_templates([upper for upper, _ in envelopes])
+            lowers, _ = stack_templates([lower for _, lower in envelopes])
+            cached = (padded, (uppers, lowers))
+            self._banks['presence_envelopes'] = cached
+        return cached[1]
+    
+    def template_envelope(self, sequence):
+        """LB_Keogh envelope for queries of the same length as the template"""
+        m = len(sequence)
+        return lb_envelope(sequence, default_window(m, m))
+    
+    def add_template(self, class_name, sequence, template_id=None):
+        """Add a template sequence for a class, returns its id"""
         if class_name not in self.class_names:
             self.class_names.append(class_name)
+        if template_id is None:
+            template_id = f"{class_name}/template_{len(self.templates) + 1:03d}"
+            while template_id in self.template_ids:
+                template_id += "_"
+        elif template_id in self.template_ids:
+            raise ValueError(f"Template {template_id} already exists")
         # Downsample for storage
-        downsampled = downsample_sequence(sequence, self.downsample_frames)
+        downsampled = self.project(downsample_sequence(sequence, self.downsample_frames))
         self.templates.append((class_name, downsampled))
+        self.template_ids.append(template_id)
+        self.envelopes.append(self.template_envelope(downsampled))
+        self._banks.pop('templates', None)
+        self._banks.pop('envelopes', None)
+        return template_id
     
-    def build_centroids(self):
-        """Build centroid templates for each class"""
-        class_sequences = {}
-        for class_name, seq in self.templates:
-            if class_name not in class_sequences:
-                class_sequences[class_name] = []
-            class_sequences[class_name].append(seq)
+    def add_sequence(self, class_name, sequence, template_id=None):
+        """
+        Add a recording without retraining: the template is stored and its
+        class prototypes are updated from their running DBA statistics.
+        Returns the template id.
+        """
+        template_id = self.add_template(class_name, sequence, template_id)
+        self.update_prototypes(class_name, self.templates[-1][1], 1)
+        self.revision += 1
+        return template_id
+    
+    def remove_sequence(self, template_id):
+        """Remove a recording without retraining, returns its class"""
+        if template_id not in self.template_ids:
+            raise ValueError(f"Unknown template {template_id}")
+        index = self.template_ids.index(template_id)
+        class_name, sequence = self.templates.pop(index)
+        self.template_ids.pop(index)
+        self.envelopes.pop(index)
+        self._banks.pop('templates', None)
+        self._banks.pop('envelopes', None)
+        
+        if not any(name == class_name for name, _ in self.templates):
+            self.class_names.remove(class_name)
+            self.centroids.pop(class_name, None)
+            self.prototype_stats.pop(class_name, None)
+            self._banks.pop('centroids', None)
+        else:
+            self.update_prototypes(class_name, sequence, -1)
+        self.revision += 1
+        return class_name
+    
+    def update_prototypes(self, class_name, sequence, sign):
+        """
+        Fold one sequence into (sign=1) or out of (sign=-1) the nearest
+        prototype of its class: a single DBA step on the stored sums and
+        counts. A class below its prototype budget seeds a new prototype
+        instead. When statistics are missing (models saved before they
+        existed) or removal would empty a prototype frame, the class is
+        rebuilt from its templates.
+        """
+        self._banks.pop('centroids', None)
+        prototypes = self.centroids.setdefault(class_name, [])
+        stats = self.prototype_stats.get(class_name)
+        if stats is None or len(stats) != len(prototypes):
+            self.build_class_prototypes(class_name)
+            return
+        
+        if sign > 0 and len(prototypes) < self.prototypes:
+            prototypes.append(np.array(sequence, dtype=np.float32))
+            stats.append((sequence.astype(np.float64), np.ones(len(sequence))))
+            return
+        
+        padded, lengths = stack_templates(prototypes)
+        p = int(np.argmin(dtw_batch(sequence, padded, lengths, penalty=self.presence_penalty)))
+        seq_sums, seq_counts = dba_accumulate(prototypes[p], [sequence], self.presence_penalty)
+        sums = stats[p][0] + sign * seq_sums
+        counts = stats[p][1] + sign * seq_counts
+        if counts.min() <= 0:
+            self.build_class_prototypes(class_name)
+            return
+        prototypes[p] = (sums / counts[:, None]).astype(np.float32)
+        stats[p] = (sums, counts)
+    
+    def build_class_prototypes(self, class_name, distances=None):
+        """
+        (Re)learn one class's DBA prototypes from its templates.
+        distances: optional pairwise DTW matrix over those templates
+        """
+        sequences = [seq for name, seq in self.templates if name == class_name]
+        learned = compute_prototypes(sequences, self.prototypes, distances, self.presence_penalty)
+        self._banks.pop('centroids', None)
+        if learned:
+            self.centroids[class_name] = [prototype for prototype, _, _ in learned]
+            self.prototype_stats[class_name] = [(sums, counts) for _, sums, counts in learned]
+        else:
+            self.centroids.pop(class_name, None)
+            self.prototype_stats.pop(class_name, None)
+    
+    def build_centroids(self, distances=None):
+        """
+        Build DBA prototype templates for each class.
+        distances: optional pairwise DTW matrix over self.templates
+        """
+        class_members = {}
+        for i, (class_name, _) in enumerate(self.templates):
+            class_members.setdefault(class_name, []).append(i)
         
         self.centroids = {}
-        for class_name, sequences in class_sequences.items():
-            centroid = compute_centroid(sequences)
-            if centroid is not None:
-                self.centroids[class_name] = centroid
+        self.prototype_stats = {}
+        for class_name, members in class_members.items():
+            class_distances = None if distances is None else distances[np.ix_(members, members)]
+            self.build_class_prototypes(class_name, class_distances)
+    
+    def cascade_distances(self, query):
+        """
+        Exact full-template distances needed by classify, with pruning.
+        
+        A template can only change the result if it could enter the k
+        nearest or become the closest template of its class (which sets
+        all_probs). Candidates are visited in LB_Kim order and dropped once
+        LB_Kim, then LB_Keogh, exceeds both of those distances; survivors
+        run a DTW that is abandoned as soon as it does.
+        
+        Returns: [(distance, class_name)] in template order, for every
+        template that was not pruned
+        """
+        labels, padded, lengths = self.template_bank(False)
+        uppers, lowers = self.envelope_bank()
+        penalty = self.presence_penalty
+        presence = presence_envelopes = None
+        if penalty is not None:
+            presence = self.bank_presence(False)
+            presence_envelopes = self.presence_envelope_bank()
+        
+        path_len = len(query) + lengths
+        lb_kim = lb_kim_batch(query, padded, lengths, penalty) / path_len - LB_SLACK
+        order = np.argsort(lb_kim, kind='stable')
+        
+        class_index = {name: i for i, name in enumerate(dict.fromkeys(labels))}
+        template_class = np.array([class_index[name] for name in labels])
+        class_best = np.full(len(class_index), np.inf)
+        kth_best = np.inf
+        computed = {}  # template index -> distance
+        
+        # Seed with the k most promising templates plus the most promising
+        # one of every class so both thresholds are finite after one call,
+        # then visit the rest in blocks that double in size
+        _, first_of_class = np.unique(template_class[order], return_index=True)
+        seeded = np.zeros(len(order), dtype=bool)
+        seeded[:self.k] = True
+        seeded[first_of_class] = True
+        order = np.concatenate([order[seeded], order[~seeded]])
+        blocks = [int(seeded.sum())]
+        size = CASCADE_BLOCK
+        while sum(blocks) < len(order):
+            blocks.append(size)
+            size *= 2
+        
+        stats = {
+            "candidates": len(labels),
+            "pruned_lb_kim": 0,
+            "pruned_lb_keogh": 0,
+            "abandoned": 0,
+            "full_dtw": 0
+        }
+        
+        start = 0
+        for size in blocks:
+            block = order[start:start + size]
+            start += size
+            limits = np.maximum(kth_best, class_best[template_class[block]])
+            
+            keep = lb_kim[block] <= limits
+            stats["pruned_lb_kim"] += int((~keep).sum())
+            if keep.any():
+                candidates = block[keep]
+                lb_keogh = lb_keogh_batch(
+                    query, uppers[candidates], lowers[candidates], lengths[candidates], penalty,
+                    None if penalty is None else tuple(bank[candidates] for bank in presence_envelopes)
+                )
+                lb_keogh = lb_keogh / path_len[candidates] - LB_SLACK
+                keep[keep] = lb_keogh <= limits[keep]
+                stats["pruned_lb_keogh"] += len(candidates) - int(keep.sum())
+            
+            survivors = block[keep]
+            if not len(survivors):
+                continue
+            
+            dists = dtw_batch(query, padded[survivors], lengths[survivors],
+                              abandon_above=limits[keep], penalty=penalty,
+                              template_presence=None if penalty is None else presence[survivors])
+            for t, dist in zip(survivors.tolist(), dists.tolist()):
+                if dist == np.inf:
+                    stats["abandoned"] += 1
+                    continue
+                stats["full_dtw"] += 1
+                computed[t] = dist
+                c = template_class[t]
+                class_best[c] = min(class_best[c], dist)
+            
+            if len(computed) >= self.k:
+                kth_best = sorted(computed.values())[self.k - 1]
+        
+        self.last_prune_stats = stats
+        return [(computed[t], labels[t]) for t in sorted(computed)]
     
     def classify(self, query_sequence, return_all_distances=False):
         """
@@ -270,26 +726,28 @@ class DTWGestureClassifier:
             return "Unknown", 0.0, {}
         
         # Downsample query
-        query_downsampled = downsample_sequence(query_sequence, self.downsample_frames)
-        
-        # Use centroids if available (much faster - O(num_classes))
-        if self.use_centroids and self.centroids:
-            distances = []
-            for class_name, centroid in self.centroids.items():
-                dist = dtw_distance_fast(query_downsampled, centroid)
-                distances.append((dist, class_name))
+        query_downsampled = self.project(downsample_sequence(query_sequence, self.downsample_frames))
+        
+        # Use centroids if available (much faster - O(num_classes)),
+        # otherwise all templates. Either way batched DTW calls compare
+        # the query against the stacked bank.
+        use_centroids = bool(self.use_centroids and self.centroids)
+        self.last_prune_stats = None
+        if not use_centroids and self.prune:
+            distances = self.cascade_distances(query_downsampled)
         else:
-            # Fall back to all templates (slower - O(num_templates))
-            distances = []
-            for class_name, template in self.templates:
-                dist = dtw_distance_fast(query_downsampled, template)
-                distances.append((dist, class_name))
+            labels, padded, lengths = self.template_bank(use_centroids)
+            presence = None if self.presence_penalty is None else self.bank_presence(use_centroids)
+            dists = dtw_batch(query_downsampled, padded, lengths,
+                              penalty=self.presence_penalty, template_presence=presence)
+            distances = list(zip(dists.tolist(), labels))
         
         # Sort by distance (closest first)
         distances.sort(key=lambda x: x[0])
         
-        # k-NN voting
-        k = min(self.k, len(distances))
+        # k-NN voting; prototypes are averages, not samples, so centroid
+        # mode follows the nearest one (as the single-centroid vote did)
+        k = min(1 if use_centroids else self.k, len(distances))
         k_nearest = distances[:k]
         
         # Vote
@@ -302,63 +760,216 @@ class DTWGestureClassifier:
         for dist, cls in distances:
             if cls not in all_distances:
                 all_distances[cls] = dist
-        
-        # Convert to probabilities using softmax on negative distances
-        min_dist = min(all_distances.values())
-        max_dist = max(all_distances.values())
-        
-        # Normalize distances to [0, 1] range and invert
-        all_probs = {}
-        if max_dist > min_dist:
-            for cls, dist in all_distances.items():
-                # Similarity = 1 - normalized_distance
-                normalized = (dist - min_dist) / (max_dist - min_dist + 1e-8)
-                all_probs[cls] = 1.0 - normalized
-        else:
-            # All same distance
-            for cls in all_distances:
-                all_probs[cls] = 1.0 / len(all_distances)
-        
-        # Normalize to sum to 1
-        total = sum(all_probs.values())
-        if total > 0:
-            for cls in all_probs:
-                all_probs[cls] /= total
+        all_probs = distance_probs(all_distances)
         
         confidence = all_probs.get(predicted_class, 0.0)
         
         return predicted_class, confidence, all_probs
     
-    def save(self, path):
-        """Save model to file (includes centroids for fast inference)"""
-        # Build centroids before saving
-        self.build_centroids()
+    def classify_prefix(self, query_sequence, expected_frames=EARLY_EXPECTED_FRAMES,
+                        margin=EARLY_MARGIN, min_fraction=EARLY_MIN_FRACTION):
+        """
+        Early decision on a gesture still in progress.
         
-        data = {
+        The partial query is downsampled at the rate a whole gesture of
+        expected_frames gets, then matched against the best prefix of
+        every template (open-end DTW). Each class is scored by its
+        nearest template; a class is decided once its distance beats the
+        second best class's by the relative margin 1 - best / second.
+        With a single class there is nothing to beat: the margin is 0
+        and only whole windows (classify) are decided.
+        
+        Returns: (predicted_class or None while undecided, confidence,
+        all_probs, margin reached)
+        """
+        if not self.templates and not self.centroids:
+            return None, 0.0, {}, 0.0
+        
+        fraction = min(len(query_sequence) / expected_frames, 1.0)
+        target = max(2, round(fraction * self.downsample_frames))
+        query = self.project(downsample_sequence(query_sequence, target))
+        
+        use_centroids = bool(self.use_centroids and self.centroids)
+        labels, padded, lengths = self.template_bank(use_centroids)
+        presence = None if self.presence_penalty is None else self.bank_presence(use_centroids)
+        dists, _ = dtw_batch_open_end(query, padded, lengths, penalty=self.presence_penalty,
+                                      template_presence=presence)
+        
+        all_distances = {}
+        for dist, cls in zip(dists.tolist(), labels):
+            all_distances[cls] = min(dist, all_distances.get(cls, np.inf))
+        ranked = sorted(all_distances, key=all_distances.get)
+        best = all_distances[ranked[0]]
+        second = all_distances[ranked[1]] if len(ranked) > 1 else np.inf
+        reached = 1.0 - best / second if 0 < second < np.inf else 0.0
+        
+        all_probs = distance_probs(all_distances)
+        if fraction < min_fraction or reached < margin:
+            return None, 0.0, all_probs, reached
+        return ranked[0], all_probs[ranked[0]], all_probs, reached
+    
+    def save(self, path, distances=None, rebuild_centroids=True):
+        """
+        Save model to a binary model file (includes centroids for fast
+        inference). Written to a temporary file and renamed, so a reader
+        never sees a partial model.
+        """
+        # Build centroids before saving (incremental updates keep theirs)
+        if rebuild_centroids:
+            self.build_centroids(distances)
+        self.version = datetime.now().isoformat()
+        
+        sequences = [seq for _, seq in self.templates]
+        prototype_pairs = [(class_name, seq) for class_name, prototypes in self.centroids.items()
+                           for seq in prototypes]
+        prototypes = [seq for _, seq in prototype_pairs]
+        first = (sequences or prototypes or [np.zeros((0, 0))])[0]
+        features = first.shape[1]
+        class_ids = {class_name: i for i, class_name in enumerate(self.class_names)}
+        
+        arrays = {}
+        arrays['templates'], arrays['template_offsets'], arrays['template_lengths'] = \
+            pack_sequences(sequences, features)
+        arrays['template_classes'] = np.array([class_ids[name] for name, _ in self.templates], dtype=np.int32)
+        arrays['prototypes'], arrays['prototype_offsets'], arrays['prototype_lengths'] = \
+            pack_sequences(prototypes, features)
+        arrays['prototype_classes'] = np.array([class_ids[name] for name, _ in prototype_pairs], dtype=np.int32)
+        
+        # DBA statistics for incremental updates, where present
+        sums, counts, has_stats = [], [], []
+        for class_name, class_prototypes in self.centroids.items():
+            stats = self.prototype_stats.get(class_name)
+            valid = stats is not None and len(stats) == len(class_prototypes)
+            for p, seq in enumerate(class_prototypes):
+                has_stats.append(valid)
+                sums.append(stats[p][0] if valid else np.zeros_like(seq))
+                counts.append((stats[p][1] if valid else np.zeros(len(seq)))[:, None])
+        arrays['prototype_sums'] = pack_sequences(sums, features)[0]
+        arrays['prototype_counts'] = pack_sequences(counts, 1)[0]
+        arrays['prototype_has_stats'] = np.array(has_stats, dtype=np.uint8)
+        if self.projection is not None:
+            arrays['projection_mean'], arrays['projection_basis'] = self.projection
+        
+        header = {
             'k': self.k,
             'use_centroids': self.use_centroids,
             'downsample_frames': self.downsample_frames,
-            'templates': self.templates,
+            'prune': self.prune,
+            'prototypes': self.prototypes,
+            'presence_penalty': self.presence_penalty,
             'class_names': self.class_names,
-            'centroids': self.centroids
+            'template_ids': self.template_ids,
+            'features': features,
+            'version': self.version
         }
-        with open(path, 'wb') as f:
-            pickle.dump(data, f)
+        write_model(path, header, arrays)
     
     @classmethod
     def load(cls, path):
-        """Load model from file"""
+        """
+        Map a binary model file. Templates and prototypes are read-only
+        views of the map; nothing is unpickled. LB_Keogh envelopes are
+        recomputed (read from the file for format version 1).
+        """
+        header, arrays = read_model(path)
+        
+        model = cls(
+            k=header['k'],
+            use_centroids=header['use_centroids'],
+            downsample_frames=header['downsample_frames'],
+            prune=header['prune'],
+            prototypes=header['prototypes'],
+            presence_penalty=header.get('presence_penalty')  # Older models: plain cost
+        )
+        class_names = header['class_names']
+        model.class_names = list(class_names)
+        model.template_ids = list(header['template_ids'])
+        model.version = header.get('version')
+        if 'projection_basis' in arrays:
+            model.projection = (arrays['projection_mean'], arrays['projection_basis'])
+        
+        offsets, lengths = arrays['template_offsets'], arrays['template_lengths']
+        labels = [class_names[c] for c in arrays['template_classes'].tolist()]
+        model.templates = list(zip(labels, unpack_sequences(arrays['templates'], offsets, lengths)))
+        
+        offsets, lengths = arrays['prototype_offsets'], arrays['prototype_lengths']
+        prototype_labels = [class_names[c] for c in arrays['prototype_classes'].tolist()]
+        prototypes = unpack_sequences(arrays['prototypes'], offsets, lengths)
+        sums = unpack_sequences(arrays['prototype_sums'], offsets, lengths)
+        counts = unpack_sequences(arrays['prototype_counts'], offsets, lengths)
+        has_stats = arrays['prototype_has_stats'].astype(bool).tolist()
+        for p, class_name in enumerate(prototype_labels):
+            model.centroids.setdefault(class_name, []).append(prototypes[p])
+            model.prototype_stats.setdefault(class_name, []).append(
+                (sums[p], counts[p][:, 0]) if has_stats[p] else None)
+        model.prototype_stats = {
+            class_name: stats for class_name, stats in model.prototype_stats.items()
+            if all(entry is not None for entry in stats)
+        }
+        
+        # The padded blocks are the banks classify stacks; use them in place
+        banks = (
+            ('templates', labels, 'templates', 'template_offsets', 'template_lengths'),
+            ('centroids', prototype_labels, 'prototypes', 'prototype_offsets', 'prototype_lengths')
+        )
+        for key, bank_labels, block, offsets, lengths in banks:
+            stacked = stacked_view(arrays[block], arrays[offsets], arrays[lengths])
+            if stacked is not None:
+                model._banks[key] = (bank_labels, stacked, arrays[lengths])
+        model.load_envelopes(arrays)
+        
+        return model
+    
+    def load_envelopes(self, arrays):
+        """LB_Keogh envelopes of freshly loaded templates, stored or recomputed"""
+        offsets, lengths = arrays['template_offsets'], arrays['template_lengths']
+        if 'envelope_uppers' in arrays:  # format version 1
+            uppers, lowers = arrays['envelope_uppers'], arrays['envelope_lowers']
+            self.envelopes = list(zip(unpack_sequences(uppers, offsets, lengths),
+                                      unpack_sequences(lowers, offsets, lengths)))
+            uppers, lowers = stacked_view(uppers, offsets, lengths), stacked_view(lowers, offsets, lengths)
+            if uppers is not None and lowers is not None:
+                self._banks['envelopes'] = (uppers, lowers)
+        elif 'templates' in self._banks and len(lengths):
+            # Equal lengths: one envelope pass over the whole bank, frames first
+            padded = self._banks['templates'][1]
+            m = padded.shape[1]
+            uppers, lowers = lb_envelope(padded.swapaxes(0, 1), default_window(m, m))
+            uppers = np.ascontiguousarray(uppers.swapaxes(0, 1))
+            lowers = np.ascontiguousarray(lowers.swapaxes(0, 1))
+            self.envelopes = list(zip(uppers, lowers))
+            self._banks['envelopes'] = (uppers, lowers)
+        else:
+            self.envelopes = [self.template_envelope(seq) for _, seq in self.templates]
+    
+    @classmethod
+    def load_legacy(cls, path):
+        """Load a model pickled by older versions (used by convert_legacy_model)"""
         with open(path, 'rb') as f:
             data = pickle.load(f)
         
         model = cls(
             k=data.get('k', 3),
             use_centroids=data.get('use_centroids', True),
-            downsample_frames=data.get('downsample_frames', 20)
+            downsample_frames=data.get('downsample_frames', 20),
+            prune=data.get('prune', False),
+            prototypes=data.get('prototypes', 1),
+            presence_penalty=None
         )
         model.templates = data.get('templates', [])
+        model.template_ids = data.get('template_ids') or [
+            f"{class_name}/template_{i + 1:03d}" for i, (class_name, _) in enumerate(model.templates)
+        ]
+        model.envelopes = data.get('envelopes') or [
+            model.template_envelope(seq) for _, seq in model.templates
+        ]
         model.class_names = data.get('class_names', [])
-        model.centroids = data.get('centroids', {})
+        model.centroids = {
+            # Older models store a single centroid array per class
+            class_name: [value] if isinstance(value, np.ndarray) else list(value)
+            for class_name, value in data.get('centroids', {}).items()
+        }
+        model.prototype_stats = data.get('prototype_stats', {})
         
         # Build centroids if not present (backward compatibility)
         if not model.centroids and model.templates:
@@ -367,8 +978,148 @@ class DTWGestureClassifier:
         return model
 
 
-def train_model():
-    """Train DTW + k-NN model"""
+def distance_probs(all_distances):
+    """
+    {class: nearest distance} -> {class: probability}: distances are
+    min-max normalized, inverted and scaled to sum to 1
+    """
+    min_dist = min(all_distances.values())
+    max_dist = max(all_distances.values())
+    
+    # Normalize distances to [0, 1] range and invert
+    all_probs = {}
+    if max_dist > min_dist:
+        for cls, dist in all_distances.items():
+            # Similarity = 1 - normalized_distance
+            normalized = (dist - min_dist) / (max_dist - min_dist + 1e-8)
+            all_probs[cls] = 1.0 - normalized
+    else:
+        # All same distance
+        for cls in all_distances:
+            all_probs[cls] = 1.0 / len(all_distances)
+    
+    # Normalize to sum to 1
+    total = sum(all_probs.values())
+    if total > 0:
+        for cls in all_probs:
+            all_probs[cls] /= total
+    return all_probs
+
+
+def model_key(classifier):
+    """Changes whenever the templates in use do (reload or incremental update)"""
+    return (classifier, classifier.revision)
+
+
+class GestureSpotter:
+    """
+    Streaming subsequence DTW (SPRING) over one camera's frame stream.
+    
+    Keeps a running DTW column per template, so each pushed frame costs
+    O(templates x template_length) regardless of how long the stream is.
+    A gesture is reported once a subsequence ending at some frame matches
+    a template below the threshold and no overlapping partial match is
+    still doing better, following SPRING (Sakurai et al., 2007).
+    
+    Every `stride`-th frame enters the DTW, bringing the camera rate
+    close to that of the downsampled templates. Matches are scored like
+    dtw(): accumulated cost over (matched frames + template length).
+    """
+    
+    def __init__(self, classifier, threshold=SPOT_THRESHOLD, stride=SPOT_STRIDE):
+        self.threshold = threshold
+        self.stride = stride
+        use_centroids = bool(classifier.use_centroids and classifier.centroids)
+        self.labels, self.templates, self.lengths = classifier.template_bank(use_centroids)
+        self.project = classifier.project
+        self.penalty = classifier.presence_penalty
+        self.source = model_key(classifier)  # Templates this spotter was built from
+        self.reset()
+    
+    def reset(self):
+        """Forget all partial matches"""
+        num_templates, max_len = self.templates.shape[:2]
+        self.frames_seen = 0
+        self.frame_index = -1
+        self.total = np.full((num_templates, max_len + 1), np.inf)
+        self.total[:, 0] = 0.0
+        self.span = np.zeros((num_templates, max_len + 1), dtype=np.int64)
+        self.start = np.zeros((num_templates, max_len + 1), dtype=np.int64)
+        self.clear_candidates()
+    
+    def clear_candidates(self):
+        """Drop every pending (unconfirmed) best match"""
+        num_templates = len(self.labels)
+        self.best_dist = np.full(num_templates, np.inf)
+        self.best_start = np.full(num_templates, -1, dtype=np.int64)
+        self.best_end = np.full(num_templates, -1, dtype=np.int64)
+    
+    def push(self, features):
+        """
+        Feed one frame's feature vector (126,).
+        
+        Returns: detection dict, or None while nothing is confirmed
+        """
+        self.frames_seen += 1
+        if (self.frames_seen - 1) % self.stride:
+            return None
+        features = self.project(features)
+        self.frame_index += 1
+        t = self.frame_index
+        rows = np.arange(len(self.labels))
+        
+        costs = frame_pair_costs(self.templates, features, self.penalty)
+        costs[np.arange(self.templates.shape[1]) >= self.lengths[:, None]] = np.inf
+        self.total, self.span, self.start = spring_step(
+            self.total, self.span, self.start, costs, t
+        )
+        
+        # Confirm a pending match once no partial match that overlaps it
+        # is still doing better
+        score = self.total / (self.span + self.lengths[:, None])
+        pending = self.best_end >= 0
+        cannot_beat = ((score >= self.best_dist[:, None])
+                       | (self.start > self.best_end[:, None]))
+        confirmed = pending & cannot_beat[:, 1:].all(axis=1)
+        
+        detection = None
+        if confirmed.any():
+            best = int(np.flatnonzero(confirmed)[self.best_dist[confirmed].argmin()])
+            detection = {
+                "predicted_class": self.labels[best],
+                "distance": float(self.best_dist[best]),
+                "confidence": max(0.0, 1.0 - float(self.best_dist[best]) / self.threshold),
+                "start_frame": int(self.best_start[best]) * self.stride,
+                "end_frame": int(self.best_end[best]) * self.stride
+            }
+            # Gestures don't overlap: drop every path that started inside it
+            self.total[self.start <= self.best_end[best]] = np.inf
+            self.total[:, 0] = 0.0
+            self.clear_candidates()
+            score = self.total / (self.span + self.lengths[:, None])
+        
+        # Track the best match ending at this frame
+        end_score = score[rows, self.lengths]
+        begin = self.start[rows, self.lengths]
+        better = (end_score <= self.threshold) & (end_score < self.best_dist)
+        self.best_dist[better] = end_score[better]
+        self.best_start[better] = begin[better]
+        self.best_end[better] = t
+        
+        return detection
+
+
+def train_model(pca_components=None, pca_variance=None, prune=False):
+    """
+    Train DTW + k-NN model.
+    
+    pca_components / pca_variance: fit a PCA of the frame features and
+    run DTW in the projected space (fixed number of components, or the
+    fewest explaining this share of the variance). The full-feature
+    model is evaluated as well, for comparison.
+    prune: classify by k-NN over all templates with the LB_Kim / LB_Keogh
+    cascade and early-abandoning DTW, instead of by nearest prototype
+    """
     log_progress("Starting DTW + k-NN gesture model training...")
     
     classes = load_classes()
@@ -376,9 +1127,14 @@ def train_model():
         log_progress("No classes found!")
         return False
     
-    classifier = DTWGestureClassifier(k=3)
+    from dtw_cache import TrainingCache
+    cache = TrainingCache(CACHE_DIR)
+    
+    classifier = DTWGestureClassifier(k=3, use_centroids=not prune, prune=prune)
     class_sample_counts = {}
     total_samples = 0
+    digests = []  # content hash of every template's file
+    raw_sequences = []  # (class_name, template_id, features) for the PCA model
     
     # Load all sequences as templates
     for cls in classes:
@@ -394,16 +1150,23 @@ def train_model():
         for seq_file in sequence_files:
             seq_path = os.path.join(class_dir, seq_file)
             try:
-                with open(seq_path, 'r') as f:
-                    data = json.load(f)
+                with open(seq_path, 'rb') as f:
+                    content = f.read()
                 
-                frames = data.get('frames', [])
-                if not frames:
+                # Convert to feature sequence, unless this content was seen before
+                digest = cache.digest(content)
+                features = cache.load_features(digest)
+                if features is None:
+                    data = json.loads(content)
+                    features = sequence_to_features(data.get('frames', []))
+                    cache.save_features(digest, features)
+                if not len(features):
                     continue
                 
-                # Convert to feature sequence
-                features = sequence_to_features(frames)
-                classifier.add_template(class_name, features)
+                template_id = f"{class_name}/{os.path.splitext(seq_file)[0]}"
+                classifier.add_template(class_name, features, template_id)
+                raw_sequences.append((class_name, template_id, features))
+                digests.append(digest)
                 total_samples += 1
                 
             except Exception as e:
@@ -418,28 +1181,74 @@ def train_model():
     log_progress(f"Classes: {classifier.class_names}")
     log_progress(f"Samples per class: {class_sample_counts}")
     
+    # Pairwise DTW matrix, shared by prototype clustering and evaluation
+    from dtw_evaluate import distance_matrix, leave_one_out, dtw_query_ms
+    log_progress(f"Feature cache: {cache.feature_hits} hits, {cache.feature_misses} extracted")
+    params = {"window": None, "downsample_frames": classifier.downsample_frames,
+              "presence_penalty": classifier.presence_penalty}
+    known = cache.load_distances(digests, params)
+    log_progress(f"Computing pairwise DTW distance matrix "
+                 f"({int(np.isnan(known).sum() - np.isnan(known.diagonal()).sum()) // 2} new pairs)...")
+    distances = distance_matrix([seq for _, seq in classifier.templates], known=known,
+                                penalty=classifier.presence_penalty)
+    cache.save_distances(digests, distances, params)
+    evicted = cache.evict(digests)
+    if evicted:
+        log_progress(f"Evicted {evicted} stale cache entries")
+    
+    # Optional PCA: same templates in the projected space
+    full_classifier, full_distances = classifier, distances
+    projection_info = None
+    if pca_components or pca_variance:
+        projection, ratio = fit_projection([features for _, _, features in raw_sequences],
+                                           pca_components, pca_variance or PCA_VARIANCE)
+        # Projected frames have no per-hand blocks: plain frame cost
+        classifier = DTWGestureClassifier(k=3, use_centroids=not prune, prune=prune, presence_penalty=None)
+        classifier.projection = projection
+        for class_name, template_id, features in raw_sequences:
+            classifier.add_template(class_name, features, template_id)
+        log_progress(f"PCA: {projection[1].shape[1]} of {projection[1].shape[0]} components "
+                     f"explain {ratio.sum():.4f} of the variance")
+        log_progress("Computing pairwise DTW distance matrix in PCA space...")
+        distances = distance_matrix([seq for _, seq in classifier.templates])
+        projection_info = {
+            "components": int(projection[1].shape[1]),
+            "input_features": int(projection[1].shape[0]),
+            "explained_variance": float(ratio.sum())
+        }
+    
     # Save model
     os.makedirs(MODELS_DIR, exist_ok=True)
-    classifier.save(MODEL_PATH)
+    classifier.save(MODEL_PATH, distances)
     log_progress(f"Model saved to {MODEL_PATH}")
+    prototype_counts = {name: len(prototypes) for name, prototypes in classifier.centroids.items()}
+    log_progress(f"Prototypes per class: {prototype_counts}")
     
-    # Compute leave-one-out accuracy
+    # Compute leave-one-out accuracy of both strategies from the matrix
     log_progress("Computing leave-one-out cross-validation accuracy...")
-    correct = 0
-    for i, (true_class, query_seq) in enumerate(classifier.templates):
-        # Create temp classifier without this sample
-        temp_classifier = DTWGestureClassifier(k=3)
-        for j, (cls, seq) in enumerate(classifier.templates):
-            if i != j:
-                temp_classifier.add_template(cls, seq)
-        
-        if temp_classifier.templates:
-            pred_class, _, _ = temp_classifier.classify(query_seq)
-            if pred_class == true_class:
-                correct += 1
-    
-    accuracy = correct / total_samples if total_samples > 0 else 0
-    log_progress(f"Leave-one-out accuracy: {accuracy:.4f}")
+    loo = leave_one_out(classifier, distances)
+    log_progress(f"Leave-one-out accuracy (k-NN): {loo['knn']['accuracy']:.4f}")
+    log_progress(f"Leave-one-out accuracy (centroids): {loo['centroids']['accuracy']:.4f}")
+    
+    if projection_info:
+        full_classifier.build_centroids(full_distances)
+        full_loo = leave_one_out(full_classifier, full_distances)
+        log_progress(f"Full-feature leave-one-out accuracy (k-NN): {full_loo['knn']['accuracy']:.4f}")
+        log_progress(f"Full-feature leave-one-out accuracy (centroids): {full_loo['centroids']['accuracy']:.4f}")
+        
+        # Same recordings as queries, in each model's own feature space
+        full_ms = dtw_query_ms(full_classifier, [seq for _, seq in full_classifier.templates[:PCA_TIMING_QUERIES]])
+        pca_ms = dtw_query_ms(classifier, [seq for _, seq in classifier.templates[:PCA_TIMING_QUERIES]])
+        log_progress(f"DTW per query against all templates: {full_ms:.3f} ms full, "
+                     f"{pca_ms:.3f} ms PCA ({full_ms / pca_ms:.1f}x)")
+        projection_info.update({
+            "full_feature_loo_accuracy": {strategy: result["accuracy"] for strategy, result in full_loo.items()},
+            "dtw_ms_per_query": {"full": full_ms, "pca": pca_ms},
+            "dtw_speedup": full_ms / pca_ms
+        })
+    
+    # Report the strategy classify actually uses
+    accuracy = loo['centroids' if classifier.use_centroids else 'knn']['accuracy']
     
     # Emit progress for UI
     log_progress("epoch_complete", {
@@ -462,7 +1271,14 @@ def train_model():
         "total_samples": total_samples,
         "final_accuracy": float(accuracy),
         "model_type": "DTW_KNN",
-        "k": 3
+        "k": 3,
+        "use_centroids": classifier.use_centroids,
+        "prune": classifier.prune,
+        "prototypes_per_class": classifier.prototypes,
+        "prototype_counts": prototype_counts,
+        "loo_accuracy": {strategy: result["accuracy"] for strategy, result in loo.items()},
+        "confusion_matrix": {strategy: result["confusion_matrix"] for strategy, result in loo.items()},
+        "projection": projection_info
     }
     
     with open(MODEL_INFO_PATH, 'w') as f:
@@ -477,10 +1293,34 @@ def train_model():
     return True
 
 
+def convert_legacy_model(legacy_path, path):
+    """Rewrite a pickled model in the binary model format"""
+    classifier = DTWGestureClassifier.load_legacy(legacy_path)
+    classifier.save(path, rebuild_centroids=False)
+    return classifier
+
+
+def resolve_model():
+    """
+    Path of the binary model, or None if there is none. A pickled
+    gesture_model.pkl is never loaded here: convert it with
+    --convert-model (training writes the binary model directly).
+    """
+    return MODEL_PATH if os.path.exists(MODEL_PATH) else None
+
+
+def model_not_found():
+    """Error response when there is no binary model"""
+    if os.path.exists(LEGACY_MODEL_PATH):
+        return {"error": "Model not found", "legacy_model": LEGACY_MODEL_PATH,
+                "hint": "Convert it with dtw_gesture.py --convert-model"}
+    return {"error": "Model not found"}
+
+
 def classify_sequence(frames):
     """Classify a single sequence"""
-    if not os.path.exists(MODEL_PATH):
-        return {"error": "Model not found"}
+    if not resolve_model():
+        return model_not_found()
     
     try:
         classifier = DTWGestureClassifier.load(MODEL_PATH)
@@ -498,18 +1338,305 @@ def classify_sequence(frames):
         return {"error": str(e)}
 
 
+def load_sequence_file(path, class_name=None):
+    """
+    Read a recorded sequence for an incremental update.
+    Returns: (class_name, template_id, features); the class defaults to
+    the file's "class" field, then its directory name
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+    class_name = class_name or data.get('class') or os.path.basename(os.path.dirname(os.path.abspath(path)))
+    sequence_id = data.get('sequence_id') or os.path.splitext(os.path.basename(path))[0]
+    frames = data.get('frames', [])
+    if not frames:
+        raise ValueError(f"No frames in {path}")
+    return class_name, f"{class_name}/{sequence_id}", sequence_to_features(frames)
+
+
+def persist_update(classifier):
+    """Atomically save an incrementally updated model and refresh model_info.json"""
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    classifier.save(MODEL_PATH, rebuild_centroids=False)
+    
+    model_info = {}
+    if os.path.exists(MODEL_INFO_PATH):
+        with open(MODEL_INFO_PATH, 'r') as f:
+            model_info = json.load(f)
+    class_sample_counts = Counter(class_name for class_name, _ in classifier.templates)
+    model_info.update({
+        "updated_at": datetime.now().isoformat(),
+        "classes": classifier.class_names,
+        "trained_classes": classifier.class_names,
+        "class_sample_counts": {name: class_sample_counts[name] for name in classifier.class_names},
+        "num_classes": len(classifier.class_names),
+        "total_samples": len(classifier.templates),
+        "model_type": "DTW_KNN",
+        "prototypes_per_class": classifier.prototypes,
+        "prototype_counts": {name: len(prototypes) for name, prototypes in classifier.centroids.items()}
+    })
+    tmp_path = f"{MODEL_INFO_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(model_info, f, indent=2)
+    os.replace(tmp_path, MODEL_INFO_PATH)
+
+
+def add_sequence(classifier, path=None, class_name=None, frames=None, sequence_id=None):
+    """
+    Add one recording to a loaded model and persist it.
+    Either a sequence file, or a class plus frames (sequence_id optional).
+    """
+    if path:
+        class_name, template_id, features = load_sequence_file(path, class_name)
+    else:
+        if not class_name or not frames:
+            raise ValueError("add_sequence needs a file, or a class and frames")
+        template_id = f"{class_name}/{sequence_id}" if sequence_id else None
+        features = sequence_to_features(frames)
+    
+    template_id = classifier.add_sequence(class_name, features, template_id)
+    persist_update(classifier)
+    return {
+        "status": "added",
+        "template_id": template_id,
+        "class": class_name,
+        "total_templates": len(classifier.templates),
+        "revision": classifier.revision
+    }
+
+
+def remove_sequence(classifier, template_id):
+    """Remove one recording from a loaded model and persist it"""
+    class_name = classifier.remove_sequence(template_id)
+    persist_update(classifier)
+    return {
+        "status": "removed",
+        "template_id": template_id,
+        "class": class_name,
+        "total_templates": len(classifier.templates),
+        "revision": classifier.revision
+    }
+
+
+def handle_stream_request(classifier, data, spotters, reloader=None, stats=None, timer=None,
+                          timing=False):
+    """
+    Answer one --stream line, echoing its optional "id" (any JSON value)
+    so callers can keep many requests in flight. Every response reports
+    the "model_version" that answered it.
+    
+    {"id": 7, "frames": [...]}             any handle_stream_message request
+    {"id": 8, "batch": [{...}, ...]}       several requests in one round trip,
+                                           answered as {"id": 8, "batch": [...]}
+    
+    Failures become {"error": ...} responses that still carry the id; a
+    failing batch item does not affect the others.
+    
+    timer:  RequestTimer started when the line arrived (parse already marked)
+    timing: add the stage timings to the response (the request's own
+            "timing" key overrides it); stats records them either way
+    """
+    timer = timer or RequestTimer()
+    result = stream_response(classifier, data, spotters, reloader, stats, timer)
+    timer.finish()
+    if wants_timing(data, timing):
+        result.update(timer.timings)
+    if stats:
+        stats.record(timer.timings, "error" in result)
+    return result
+
+
+def stream_response(classifier, data, spotters, reloader, stats, timer):
+    """handle_stream_request without the timing fields (batch items recurse here)"""
+    if not isinstance(data, dict):
+        return {"error": "Request must be a JSON object"}
+    
+    try:
+        if 'batch' in data:
+            result = {"batch": [stream_response(classifier, item, spotters, reloader, stats, timer)
+                                for item in data['batch']]}
+        else:
+            result = handle_stream_message(classifier, data, spotters, reloader, stats, timer)
+    except Exception as e:
+        result = {"error": str(e)}
+    
+    if 'id' in data:
+        result["id"] = data['id']
+    result["model_version"] = classifier.version
+    return result
+
+
+def handle_stream_message(classifier, data, spotters, reloader=None, stats=None, timer=None):
+    """
+    Answer one --stream request.
+    
+    {"frames": [...]}                      classify a whole window
+    {"frames": [...], "early": true}       decide on a gesture in progress if the
+                                           margin allows (optional "expected_frames",
+                                           "margin"), see classify_early_window
+    {"frame": {...}, "session": "cam-1"}   push one frame to the session's spotter
+    {"reset": true, "session": "cam-1"}    forget the session's partial matches
+    {"cmd": "add_sequence", "file": "..."}  add a recording (or "class" + "frames"
+                                           + optional "sequence_id") and persist
+    {"cmd": "remove_sequence", "template_id": "wave/sequence_003"}
+    {"cmd": "reload"}                      load the model file again in the background
+    {"cmd": "stats"}                       latency histograms, counts, queue depth, memory
+    """
+    timer = timer or RequestTimer()
+    cmd = data.get('cmd')
+    if cmd == 'add_sequence':
+        return add_sequence(classifier, path=data.get('file'), class_name=data.get('class'),
+                            frames=data.get('frames'), sequence_id=data.get('sequence_id'))
+    if cmd == 'remove_sequence':
+        return remove_sequence(classifier, data.get('template_id'))
+    if cmd == 'reload':
+        if reloader is None:
+            raise ValueError("Reload is not available in this mode")
+        reloader.request()
+        return {"status": "reloading"}
+    if cmd == 'stats':
+        if stats is None:
+            raise ValueError("Stats are not available in this mode")
+        return {"stats": stats.snapshot()}
+    if cmd is not None:
+        raise ValueError(f"Unknown command {cmd!r}")
+    
+    if 'frame' in data or data.get('reset'):
+        session = data.get('session', 'default')
+        if session not in spotters or spotters[session].source != model_key(classifier):
+            spotters[session] = GestureSpotter(classifier)
+        spotter = spotters[session]
+        
+        if data.get('reset'):
+            spotter.reset()
+            return {"session": session, "reset": True}
+        
+        features = extract_frame_features(data['frame'])
+        timer.mark('features')
+        detection = spotter.push(features)
+        timer.mark('model')
+        result = {
+            "session": session,
+            "frame_index": spotter.frames_seen - 1,
+            "spotted": detection is not None,
+            "predicted_class": None
+        }
+        if detection:
+            result.update(detection)
+        return result
+    
+    features = sequence_to_features(data.get('frames', []))
+    timer.mark('features')
+    if not len(features):
+        return {"error": "Sequence too short"}
+    if data.get('early'):
+        result = classify_early_window(classifier, features, data.get('expected_frames'), data.get('margin'))
+    else:
+        result = classify_window(classifier, features)
+    timer.mark('model')
+    return result
+
+
+def model_status(classifier, status):
+    """Status line printed when a model is loaded or swapped in"""
+    return {
+        "status": status,
+        "classes": classifier.class_names,
+        "model_type": "DTW_KNN",
+        "model_version": classifier.version
+    }
+
+
+def swap_model(reloader, pool=None):
+    """
+    Between two stream requests: switch to a model the reloader finished
+    loading. Returns the new classifier, or None.
+    """
+    classifier = reloader.swap()
+    if classifier is None:
+        return None
+    line = json.dumps(model_status(classifier, "reloaded"))
+    if pool:
+        pool.use(classifier)
+        pool.emit(line)  # ordered with the workers' responses
+    else:
+        print(line, flush=True)
+    return classifier
+
+
+def classify_early_window(classifier, features, expected_frames=None, margin=None):
+    """
+    Stream response for a partial window. "early" is true once the
+    classifier decided; until then "predicted_class" is None and the
+    client keeps sending longer prefixes (or the whole window).
+    """
+    predicted_class, confidence, all_probs, reached = classifier.classify_prefix(
+        features,
+        expected_frames=expected_frames or EARLY_EXPECTED_FRAMES,
+        margin=EARLY_MARGIN if margin is None else margin
+    )
+    return {
+        "predicted_class": predicted_class,
+        "confidence": confidence,
+        "all_probs": all_probs,
+        "frame_count": len(features),
+        "early": predicted_class is not None,
+        "margin": reached
+    }
+
+
+def classify_window(classifier, features):
+    """Stream response for one whole-window classification"""
+    predicted_class, confidence, all_probs = classifier.classify(features)
+    
+    result = {
+        "predicted_class": predicted_class,
+        "confidence": confidence,
+        "all_probs": all_probs,
+        "frame_count": len(features)
+    }
+    if classifier.last_prune_stats:
+        result["pruning"] = classifier.last_prune_stats
+    return result
+
+
 if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description='DTW Gesture Recognition')
     parser.add_argument('--train', action='store_true', help='Train the model')
+    parser.add_argument('--pca-components', type=int, metavar='N',
+                        help='Train: run DTW on N PCA components of the frame features')
+    parser.add_argument('--pca-variance', type=float, metavar='F',
+                        help=f'Train: keep the PCA components explaining this share of the variance '
+                             f'(e.g. {PCA_VARIANCE})')
+    parser.add_argument('--prune', action='store_true',
+                        help='Train: k-NN over all templates with LB_Kim / LB_Keogh pruning '
+                             'instead of nearest prototype')
     parser.add_argument('--classify', type=str, help='Classify a sequence file')
     parser.add_argument('--info', action='store_true', help='Print model info')
+    parser.add_argument('--add-sequence', type=str, metavar='FILE',
+                        help='Add a recorded sequence to the model without retraining')
+    parser.add_argument('--class', dest='class_name', type=str,
+                        help='Class for --add-sequence (default: from the file)')
+    parser.add_argument('--remove-sequence', type=str, metavar='ID',
+                        help='Remove a template ("class/sequence_id") without retraining')
+    parser.add_argument('--convert-model', type=str, nargs='?', const=LEGACY_MODEL_PATH, metavar='PKL',
+                        help='Convert a pickled model to the binary model format')
     parser.add_argument('--stream', action='store_true', help='Stream mode')
+    parser.add_argument('--binary', action='store_true',
+                        help='Stream mode reads binary framed requests (see stream_protocol.py)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Stream / serve mode classifies windows in N worker processes')
+    parser.add_argument('--serve', type=str, metavar='unix:/path.sock',
+                        help='Serve the stream protocol to many clients on a Unix socket')
+    parser.add_argument('--timing', action='store_true',
+                        help='Stream / serve mode: add parse_ms, features_ms, model_ms and '
+                             'total_ms to every response')
     args = parser.parse_args()
     
     if args.train:
-        success = train_model()
+        success = train_model(args.pca_components, args.pca_variance, args.prune)
         sys.exit(0 if success else 1)
     
     elif args.info:
@@ -519,43 +1646,136 @@ if __name__ == "__main__":
         else:
             print(json.dumps({"error": "No model info found"}))
     
+    elif args.convert_model:
+        try:
+            classifier = convert_legacy_model(args.convert_model, MODEL_PATH)
+            print(json.dumps({
+                "status": "converted",
+                "model_path": MODEL_PATH,
+                "total_templates": len(classifier.templates)
+            }))
+        except Exception as e:
+            print(json.dumps({"error": str(e)}))
+            sys.exit(1)
+    
+    elif args.add_sequence or args.remove_sequence:
+        try:
+            if resolve_model():
+                classifier = DTWGestureClassifier.load(MODEL_PATH)
+            elif args.add_sequence and not os.path.exists(LEGACY_MODEL_PATH):
+                classifier = DTWGestureClassifier(k=3)  # First recording starts a model
+            else:
+                print(json.dumps(model_not_found()))
+                sys.exit(1)
+            
+            if args.add_sequence:
+                result = add_sequence(classifier, path=args.add_sequence, class_name=args.class_name)
+            else:
+                result = remove_sequence(classifier, args.remove_sequence)
+            print(json.dumps(result))
+        except Exception as e:
+            print(json.dumps({"error": str(e)}))
+            sys.exit(1)
+    
     elif args.classify:
         with open(args.classify, 'r') as f:
             data = json.load(f)
         result = classify_sequence(data.get('frames', []))
         print(json.dumps(result))
     
+    elif args.serve:
+        if not resolve_model():
+            print(json.dumps(model_not_found()), flush=True)
+            sys.exit(1)
+        
+        from dtw_server import serve
+        classifier = DTWGestureClassifier.load(MODEL_PATH)
+        print(json.dumps(model_status(classifier, "loaded")), flush=True)
+        try:
+            serve(classifier, args.serve, workers=args.workers, model_path=MODEL_PATH, timing=args.timing)
+        except ValueError as e:
+            print(json.dumps({"error": str(e)}), flush=True)
+            sys.exit(1)
+    
     elif args.stream:
         # Load model once
-        if not os.path.exists(MODEL_PATH):
-            print(json.dumps({"error": "Model not found"}), flush=True)
+        if not resolve_model():
+            print(json.dumps(model_not_found()), flush=True)
             sys.exit(1)
         
         classifier = DTWGestureClassifier.load(MODEL_PATH)
-        print(json.dumps({
-            "status": "loaded",
-            "classes": classifier.class_names,
-            "model_type": "DTW_KNN"
-        }), flush=True)
-        
-        for line in sys.stdin:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                data = json.loads(line)
-                frames = data.get('frames', [])
-                features = sequence_to_features(frames)
-                predicted_class, confidence, all_probs = classifier.classify(features)
-                
-                print(json.dumps({
-                    "predicted_class": predicted_class,
-                    "confidence": confidence,
-                    "all_probs": all_probs,
-                    "frame_count": len(frames)
-                }), flush=True)
-            except Exception as e:
-                print(json.dumps({"error": str(e)}), flush=True)
+        print(json.dumps(model_status(classifier, "loaded")), flush=True)
+        
+        # Retrained models are picked up without a restart
+        from dtw_reload import ModelReloader
+        reloader = ModelReloader(classifier, MODEL_PATH, DTWGestureClassifier.load)
+        
+        # Optional process pool for whole-window requests
+        stats = StreamStats(input_stream=sys.stdin)
+        install_stats_signal(stats)
+        pool = None
+        if args.workers > 1:
+            from dtw_workers import StreamPool
+            pool = StreamPool(classifier, args.workers, reloader, stats, args.timing)
+            stats.queue_depth = pool.queued
+        
+        status = 0
+        try:
+            if args.binary:
+                for request, received in iter_timed_requests(sys.stdin.buffer):
+                    timer = RequestTimer(received)
+                    timer.mark('parse')
+                    if isinstance(request, ProtocolError):
+                        print(json.dumps({"error": str(request)}), flush=True)
+                        stats.record(timer.finish(), error=True)
+                        continue
+                    request_id, landmarks, present = request
+                    classifier = swap_model(reloader, pool) or classifier
+                    if pool:
+                        pool.handle_request(request_id, landmarks, present, timer)
+                        continue
+                    try:
+                        features = landmarks_to_features(landmarks, present)
+                        timer.mark('features')
+                        result = classify_window(classifier, features)
+                        timer.mark('model')
+                        result["id"] = request_id
+                    except Exception as e:
+                        result = {"id": request_id, "error": str(e)}
+                    result["model_version"] = classifier.version
+                    timer.finish()
+                    if args.timing:
+                        result.update(timer.timings)
+                    print(json.dumps(result), flush=True)
+                    stats.record(timer.timings, "error" in result)
+            else:
+                spotters = {}  # session -> GestureSpotter for frame-push clients
+                for line in sys.stdin:
+                    timer = RequestTimer()
+                    line = line.strip()
+                    if not line:
+                        continue
+                    classifier = swap_model(reloader, pool) or classifier
+                    if pool:
+                        pool.handle_line(line, timer)
+                        continue
+                    try:
+                        data = json.loads(line)
+                        timer.mark('parse')
+                        result = handle_stream_request(classifier, data, spotters, reloader, stats,
+                                                       timer, args.timing)
+                        print(json.dumps(result), flush=True)
+                    except Exception as e:
+                        print(json.dumps({"error": str(e)}), flush=True)
+                        stats.record(timer.finish(), error=True)
+        except ProtocolError as e:
+            print(json.dumps({"error": str(e)}), flush=True)
+            status = 1
+        finally:
+            reloader.close()
+            if pool:
+                pool.close()
+        sys.exit(status)
     
     else:
         # Default: read from stdin
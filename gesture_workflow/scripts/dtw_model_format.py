@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Binary Model Format for the DTW Gesture Classifier
+
+Replaces the pickled model (a list of (class_name, ndarray) tuples) with
+one file that is opened with np.memmap: loading reads only the JSON
+header, template data is paged in on first use, and every process that
+maps the same file shares its pages.
+
+File layout (little-endian):
+  8s       magic b'GDTWMDL\\0'
+  u32      format version
+  u32      header length
+  bytes    JSON header: settings, class names, template ids and the
+           (offset, shape, dtype) of every array, offsets counted from
+           the start of the data section
+  ...      zero padding to a multiple of 64
+  arrays   each 64-byte aligned
+
+Ragged sequence sets (templates, prototypes) are stored as one
+contiguous float32 block of frames with an offsets/lengths index and a
+class-id array, without padding. When every sequence has the same
+length (downsampled templates do) the block is also the stacked
+(N, length, features) bank that classify compares against.
+
+Version 2 dropped the stored LB_Keogh envelopes (two more copies of the
+templates, recomputed at load) and stores the DBA sums as float32.
+Version 1 files (fixed-stride blocks with envelopes) still load.
+"""
+
+import os
+import json
+import struct
+import numpy as np
+
+MAGIC = b'GDTWMDL\0'
+FORMAT_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+PREFIX = struct.Struct('<8sII')
+ALIGNMENT = 64
+
+
+class ModelFormatError(ValueError):
+    """File is not a model of a supported format version"""
+
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def pack_sequences(sequences, features, dtype=np.float32):
+    """
+    Ragged sequences -> (block, offsets, lengths), back to back: sequence
+    i is block[offsets[i]:offsets[i] + lengths[i]].
+    """
+    lengths = np.array([len(seq) for seq in sequences], dtype=np.int64)
+    offsets = np.zeros(len(sequences), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    block = np.zeros((int(lengths.sum()), features), dtype=dtype)
+    for start, seq in zip(offsets.tolist(), sequences):
+        block[start:start + len(seq)] = seq
+    return block, offsets, lengths
+
+
+def unpack_sequences(block, offsets, lengths):
+    """Views of every sequence in a block (no copies)"""
+    return [block[start:start + length] for start, length in zip(offsets.tolist(), lengths.tolist())]
+
+
+def stacked_view(block, offsets, lengths):
+    """The block as an (N, max_len, features) bank, or None unless rows sit at a fixed stride"""
+    n = len(lengths)
+    if n == 0:
+        return None
+    stride = int(lengths.max())
+    if len(block) != n * stride or not np.array_equal(offsets, np.arange(n) * stride):
+        return None
+    return block.reshape(n, stride, block.shape[1])
+
+
+def write_model(path, header, arrays):
+    """
+    Write a model file atomically (temporary file + os.replace), so a
+    reader never maps a partial model.
+
+    header: JSON-serializable dict; an "arrays" entry is added
+    arrays: name -> ndarray
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = align(offset)
+        layout[name] = {"offset": offset, "shape": list(array.shape), "dtype": array.dtype.str}
+        offset += array.nbytes
+
+    header = dict(header, arrays=layout)
+    header_bytes = json.dumps(header).encode()
+    data_start = align(PREFIX.size + len(header_bytes))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """(header, data_start) of a model file"""
+    with open(path, 'rb') as f:
+        prefix = f.read(PREFIX.size)
+        if len(prefix) < PREFIX.size:
+            raise ModelFormatError(f"{path} is too short to be a model")
+        magic, version, header_size = PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ModelFormatError(f"{path} is not a DTW model file")
+        if version not in SUPPORTED_VERSIONS:
+            raise ModelFormatError(f"Unsupported model format version {version}")
+        header = json.loads(f.read(header_size))
+    return header, align(PREFIX.size + header_size)
+
+
+def read_model(path):
+    """
+    Map a model file read-only.
+    Returns: (header, arrays) with arrays name -> read-only view of the map
+    """
+    header, data_start = read_header(path)
+    raw = np.memmap(path, dtype=np.uint8, mode='r')
+
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        start = data_start + entry["offset"]
+        size = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        if size and start + size > len(raw):
+            raise ModelFormatError(f"{path} is truncated (array {name})")
+        arrays[name] = raw[start:start + size].view(dtype).reshape(shape)
+    return header, arrays
+
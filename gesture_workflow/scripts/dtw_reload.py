@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Hot Model Reload for the DTW Stream Process
+
+Lets `dtw_gesture.py --stream` / `--serve` pick up a retrained model
+without restarting. A background thread polls the model file's stat
+(os.replace by save() always changes it) and also wakes on an explicit
+{"cmd": "reload"}. The new model is loaded off the request path; the
+request loop swaps it in between two requests, so no request is dropped
+or sees a half-loaded model.
+
+A change whose header carries the version the process already serves
+(its own incremental save) is not reloaded.
+"""
+
+import os
+import sys
+import json
+import threading
+
+from dtw_model_format import read_header
+
+# Seconds between model file checks
+RELOAD_POLL_SECONDS = 1.0
+
+
+def file_signature(path):
+    """Identity of the file currently at path, None if missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class ModelReloader:
+    def __init__(self, classifier, path, load, poll_seconds=RELOAD_POLL_SECONDS):
+        self.classifier = classifier
+        self.path = path
+        self.load = load
+        self.poll_seconds = poll_seconds
+        self.signature = file_signature(path)
+        self.pending = None  # Loaded classifier waiting for swap()
+        self.lock = threading.Lock()
+        self.forced = False
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def request(self):
+        """Reload on the next poll even if the file looks unchanged"""
+        self.forced = True
+        self.wake.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wake.wait(self.poll_seconds)
+            self.wake.clear()
+            forced, self.forced = self.forced, False
+
+            signature = file_signature(self.path)
+            if signature is None or (signature == self.signature and not forced):
+                continue
+            self.signature = signature
+            try:
+                if not forced and read_header(self.path)[0].get('version') == self.serving_version():
+                    continue
+                classifier = self.load(self.path)
+            except Exception as e:
+                print(json.dumps({"error": f"Model reload failed: {e}"}), file=sys.stderr, flush=True)
+                continue
+            with self.lock:
+                self.pending = classifier
+
+    def serving_version(self):
+        with self.lock:
+            classifier = self.pending or self.classifier
+        return classifier.version
+
+    def swap(self):
+        """
+        Called by the request loop between requests.
+        Returns the newly loaded classifier, or None if there is none.
+        """
+        if self.pending is None:
+            return None
+        with self.lock:
+            classifier, self.pending = self.pending, None
+            self.classifier = classifier
+        return classifier
+
+    def close(self):
+        self.stopped.set()
+        self.wake.set()
+        self.thread.join()
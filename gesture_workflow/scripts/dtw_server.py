@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Asyncio Unix-socket Server for the DTW Gesture Classifier
+
+Backs `dtw_gesture.py --serve unix:/path.sock`. One warm model process
+serves many clients; every connection speaks the --stream JSONL protocol
+(one request per line, optional "id" echoed in the response).
+
+The event loop only moves bytes. Classification runs in an executor:
+one thread next to the loaded classifier, or the --workers process pool,
+so a slow client never blocks the others. Whole-window requests of one
+connection are pipelined and may be answered out of order; frame-push
+requests and commands are answered in order, with spotter sessions
+private to their connection.
+
+A retrained model is swapped in between requests (see dtw_reload.py);
+requests already running finish on the model they started with.
+"""
+
+import os
+import json
+import signal
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from dtw_gesture import DTWGestureClassifier, handle_stream_request, model_status
+from dtw_reload import ModelReloader
+from dtw_workers import STATEFUL_MARKERS, StreamPool, classify_line
+from stream_stats import RequestTimer, StreamStats
+
+# Requests in flight per connection before it stops reading
+CONNECTION_QUEUE = 16
+
+# Longest accepted request line (a 10 s two-hand window is ~300 KB)
+LINE_LIMIT = 16 * 1024 * 1024
+
+
+def parse_address(address):
+    """'unix:/path.sock' -> '/path.sock'"""
+    scheme, _, path = address.partition(':')
+    if scheme != 'unix' or not path:
+        raise ValueError(f"Unsupported address {address!r}, expected unix:/path.sock")
+    return path
+
+
+class GestureServer:
+    def __init__(self, classifier, workers=1, model_path=None, timing=False):
+        self.classifier = classifier
+        self.timing = timing
+        self.in_flight = 0  # Requests read and not answered, all connections
+        self.stats = StreamStats(queue_depth=lambda: self.in_flight)
+        self.reloader = ModelReloader(classifier, model_path, DTWGestureClassifier.load) if model_path else None
+        # A single thread owns the parent classifier (lazy bank caches,
+        # last_prune_stats and spotters are not thread safe)
+        self.local = ThreadPoolExecutor(max_workers=1)
+        self.pool = StreamPool(classifier, workers) if workers > 1 else None
+        self.connections = 0
+
+    def answer(self, line, spotters, timer):
+        """Blocking: one request line -> one response line"""
+        try:
+            data = json.loads(line)
+        except Exception as e:
+            self.stats.record(timer.finish(), error=True)
+            return json.dumps({"error": str(e)})
+        timer.mark('parse')
+        return json.dumps(handle_stream_request(self.classifier, data, spotters, self.reloader,
+                                                self.stats, timer, self.timing))
+
+    def refresh(self):
+        """
+        Swap in a reloaded model. Runs on the event loop thread, like
+        every change of the pool's executor.
+        """
+        if self.pool:
+            self.pool.sync()  # after add / remove commands
+        classifier = self.reloader.swap() if self.reloader else None
+        if classifier is None:
+            return
+        self.classifier = classifier
+        if self.pool:
+            self.pool.use(classifier)
+        print(json.dumps(model_status(classifier, "reloaded")), flush=True)
+
+    async def respond(self, line, spotters, writer, slots):
+        loop = asyncio.get_running_loop()
+        timer = RequestTimer()
+        self.in_flight += 1
+        try:
+            if self.pool and not any(marker in line for marker in STATEFUL_MARKERS):
+                response, timings, failed = await loop.run_in_executor(
+                    self.pool.executor, classify_line, line, self.timing)
+                self.stats.record(dict(timings, total_ms=timer.finish()["total_ms"]), failed)
+            else:
+                response = await loop.run_in_executor(self.local, self.answer, line, spotters, timer)
+                self.refresh()
+            writer.write(response.encode() + b'\n')
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.in_flight -= 1
+            slots.release()
+
+    async def handle_client(self, reader, writer):
+        self.connections += 1
+        spotters = {}  # session -> GestureSpotter, per connection
+        slots = asyncio.Semaphore(CONNECTION_QUEUE)
+        tasks = set()
+        try:
+            while True:
+                try:
+                    raw = await reader.readline()
+                except ValueError:
+                    writer.write(json.dumps({"error": "Request line too long"}).encode() + b'\n')
+                    break
+                if not raw:
+                    break
+                line = raw.decode().strip()
+                if not line:
+                    continue
+
+                await slots.acquire()
+                self.refresh()
+                if any(marker in line for marker in STATEFUL_MARKERS):
+                    # Frame order matters: finish before reading the next line
+                    await self.respond(line, spotters, writer, slots)
+                    continue
+                task = asyncio.create_task(self.respond(line, spotters, writer, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks)
+        except (ConnectionError, asyncio.CancelledError):  # client gone, or shutdown
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.connections -= 1
+            writer.close()
+
+    async def run(self, path):
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket from a previous run
+
+        server = await asyncio.start_unix_server(self.handle_client, path=path, limit=LINE_LIMIT)
+        print(json.dumps({"status": "listening", "address": f"unix:{path}"}), flush=True)
+
+        loop = asyncio.get_running_loop()
+        stop = loop.create_future()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.cancel)
+        try:
+            async with server:
+                await stop
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def close(self):
+        if self.reloader:
+            self.reloader.close()
+        self.local.shutdown(wait=True)
+        if self.pool:
+            self.pool.close()
+
+
+def serve(classifier, address, workers=1, model_path=None, timing=False):
+    """
+    Serve the classifier on a Unix socket until SIGINT / SIGTERM.
+    model_path: model file to watch for hot reloads
+    timing:     add the stage timings to every response
+    """
+    path = parse_address(address)
+    server = GestureServer(classifier, workers, model_path, timing)
+    try:
+        asyncio.run(server.run(path))
+    finally:
+        server.close()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Multi-core DTW Stream Classification
+
+Backs `dtw_gesture.py --stream --workers N`. The parent loads the model
+once and copies its stacked template banks into one shared memory block;
+each worker process maps that block read-only and builds a classifier
+around numpy views of it, so N workers cost one copy of the templates.
+
+Whole-window requests are parsed, classified and serialized in the
+workers and answered as soon as they finish (out of order, matched by
+their "id"). Frame-push requests keep per-session spotter state and
+commands change the model, so both are answered by the parent, which
+holds the full classifier; after an update the model is republished to
+a fresh set of workers.
+
+Workers time their own stages and return them with the response line;
+the parent records them in its StreamStats with the end-to-end total,
+which includes the wait for a free worker.
+"""
+
+import os
+import sys
+import json
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+# Requests in flight per worker before the reader blocks
+QUEUE_PER_WORKER = 4
+
+# Keys whose presence makes a request stateful (handled by the parent)
+STATEFUL_MARKERS = ('"frame"', '"reset"', '"cmd"')
+
+_worker_classifier = None
+_worker_memory = None
+
+
+def pack_model(classifier):
+    """
+    Copy the classifier's banks into one shared memory block.
+
+    Returns: (memory, spec); spec is the picklable description workers
+    need to rebuild the classifier, array entries being
+    (offset, shape, dtype) into the block
+    """
+    labels, padded, lengths = classifier.template_bank(False)
+    arrays = {'templates': padded, 'template_lengths': lengths}
+    centroid_labels = []
+    if classifier.centroids:
+        centroid_labels, centroids, centroid_lengths = classifier.template_bank(True)
+        arrays['centroids'] = centroids
+        arrays['centroid_lengths'] = centroid_lengths
+    if classifier.envelopes:
+        arrays['uppers'], arrays['lowers'] = classifier.envelope_bank()
+    if classifier.projection is not None:
+        arrays['projection_mean'], arrays['projection_basis'] = classifier.projection
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = (offset + 63) // 64 * 64
+        layout[name] = (offset, array.shape, array.dtype.str)
+        offset += array.nbytes
+
+    memory = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for name, array in arrays.items():
+        view_of(memory, layout[name])[...] = array
+
+    spec = {
+        'memory': memory.name,
+        'layout': layout,
+        'k': classifier.k,
+        'use_centroids': classifier.use_centroids,
+        'downsample_frames': classifier.downsample_frames,
+        'prune': classifier.prune,
+        'prototypes': classifier.prototypes,
+        'presence_penalty': classifier.presence_penalty,
+        'version': classifier.version,
+        'class_names': classifier.class_names,
+        'template_labels': labels,
+        'centroid_labels': centroid_labels
+    }
+    return memory, spec
+
+
+def view_of(memory, entry):
+    """numpy view of one packed array"""
+    offset, shape, dtype = entry
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf, offset=offset)
+
+
+def attach_model(spec):
+    """
+    Rebuild a classifier whose templates, centroids and envelopes are
+    views on the shared block. The cached banks are the packed arrays
+    themselves, so classify never restacks them.
+    """
+    from dtw_gesture import DTWGestureClassifier
+
+    memory = shared_memory.SharedMemory(name=spec['memory'])
+    arrays = {name: view_of(memory, entry) for name, entry in spec['layout'].items()}
+    for array in arrays.values():
+        array.flags.writeable = False
+
+    classifier = DTWGestureClassifier(
+        k=spec['k'],
+        use_centroids=spec['use_centroids'],
+        downsample_frames=spec['downsample_frames'],
+        prune=spec['prune'],
+        prototypes=spec['prototypes'],
+        presence_penalty=spec['presence_penalty']
+    )
+    classifier.class_names = list(spec['class_names'])
+    classifier.version = spec['version']
+
+    labels = spec['template_labels']
+    padded, lengths = arrays['templates'], arrays['template_lengths']
+    classifier.templates = [(name, padded[i, :lengths[i]]) for i, name in enumerate(labels)]
+    classifier._banks['templates'] = (labels, padded, lengths)
+
+    if 'centroids' in arrays:
+        labels = spec['centroid_labels']
+        padded, lengths = arrays['centroids'], arrays['centroid_lengths']
+        classifier.centroids = {}
+        for i, name in enumerate(labels):
+            classifier.centroids.setdefault(name, []).append(padded[i, :lengths[i]])
+        classifier._banks['centroids'] = (labels, padded, lengths)
+
+    if 'projection_basis' in arrays:
+        classifier.projection = (arrays['projection_mean'], arrays['projection_basis'])
+
+    if 'uppers' in arrays:
+        uppers, lowers = arrays['uppers'], arrays['lowers']
+        classifier.envelopes = [(uppers[i, :m], lowers[i, :m])
+                                for i, m in enumerate(arrays['template_lengths'].tolist())]
+        classifier._banks['envelopes'] = (uppers, lowers)
+
+    return memory, classifier
+
+
+def init_worker(spec):
+    """Pool initializer: attach to the parent's shared model"""
+    global _worker_classifier, _worker_memory
+    _worker_memory, _worker_classifier = attach_model(spec)
+
+
+def classify_line(line, timing=False):
+    """
+    Worker: one JSONL request -> (JSON response line, stage timings, failed)
+    timing: add the timings to the response, see handle_stream_request
+    """
+    from dtw_gesture import handle_stream_request
+    from stream_stats import RequestTimer
+
+    timer = RequestTimer()
+    try:
+        data = json.loads(line)
+    except Exception as e:
+        return json.dumps({"error": str(e)}), timer.finish(), True
+    timer.mark('parse')
+    result = handle_stream_request(_worker_classifier, data, {}, timer=timer, timing=timing)
+    return json.dumps(result), timer.timings, "error" in result
+
+
+def classify_arrays(request_id, landmarks, present, timing=False):
+    """Worker: one decoded binary request -> (JSON response line, stage timings, failed)"""
+    from dtw_gesture import classify_window, landmarks_to_features
+    from stream_stats import RequestTimer
+
+    timer = RequestTimer()
+    try:
+        features = landmarks_to_features(landmarks, present)
+        timer.mark('features')
+        result = classify_window(_worker_classifier, features)
+        timer.mark('model')
+    except Exception as e:
+        result = {"error": str(e)}
+    result["id"] = request_id
+    result["model_version"] = _worker_classifier.version
+    timer.finish()
+    if timing:
+        result.update(timer.timings)
+    return json.dumps(result), timer.timings, "error" in result
+
+
+class StreamPool:
+    """
+    Process pool answering stream requests; responses are printed as
+    they complete. At most QUEUE_PER_WORKER requests per worker are in
+    flight, so a fast writer cannot queue unbounded work.
+    """
+
+    def __init__(self, classifier, workers, reloader=None, stats=None, timing=False):
+        self.classifier = classifier
+        self.workers = workers
+        self.reloader = reloader
+        self.stats = stats
+        self.timing = timing
+        self.spotters = {}
+        self.output_lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(workers * QUEUE_PER_WORKER)
+        self.in_flight = 0  # Submitted, not answered yet
+        self.retiring = []  # Threads draining executors of older models
+
+        # Workers are spawned, not forked: each starts a fresh numpy whose
+        # BLAS is limited to one thread, so N workers use N cores
+        for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+            os.environ.setdefault(var, '1')
+        self.start()
+
+    def start(self):
+        """Publish the classifier as it is now to a new set of workers"""
+        from dtw_gesture import model_key
+        self.published = model_key(self.classifier)
+        self.memory, spec = pack_model(self.classifier)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(spec,)
+        )
+
+    def use(self, classifier):
+        """Switch to a reloaded model"""
+        self.classifier = classifier
+        self.spotters.clear()
+        self.sync()
+
+    def sync(self):
+        """
+        Follow a model reload or incremental update. New requests go to
+        fresh workers at once; the old ones finish their requests in
+        flight before their shared block is freed.
+        """
+        from dtw_gesture import model_key
+        if self.published == model_key(self.classifier):
+            return
+        executor, memory = self.executor, self.memory
+        self.start()
+
+        def retire():
+            executor.shutdown(wait=True)
+            memory.close()
+            memory.unlink()
+        thread = threading.Thread(target=retire, daemon=True)
+        thread.start()
+        self.retiring.append(thread)
+
+    def emit(self, line):
+        with self.output_lock:
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+
+    def queued(self):
+        """Requests submitted to the workers and not answered yet"""
+        return self.in_flight
+
+    def submit(self, timer, fn, *args):
+        self.slots.acquire()
+        with self.output_lock:
+            self.in_flight += 1
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda future: self.finished(future, timer))
+
+    def finished(self, future, timer):
+        self.slots.release()
+        with self.output_lock:
+            self.in_flight -= 1
+        try:
+            line, timings, failed = future.result()
+        except Exception as e:
+            line, timings, failed = json.dumps({"error": str(e)}), {}, True
+        self.emit(line)
+        if self.stats and timer:
+            # Stages timed in the parent (binary decoding) plus the worker's,
+            # and the total as the client sees it
+            timings = dict(timings)
+            for stage, value in timer.timings.items():
+                timings[stage] = timings.get(stage, 0.0) + value
+            timings["total_ms"] = timer.finish()["total_ms"]
+            self.stats.record(timings, failed)
+
+    def handle_line(self, line, timer=None):
+        """Route one JSONL request to a worker, or answer it here if stateful"""
+        if not any(marker in line for marker in STATEFUL_MARKERS):
+            self.submit(timer, classify_line, line, self.timing)
+            return
+
+        from dtw_gesture import handle_stream_request
+        try:
+            data = json.loads(line)
+            if timer:
+                timer.mark('parse')
+            result = handle_stream_request(self.classifier, data, self.spotters, self.reloader,
+                                           self.stats, timer, self.timing)
+        except Exception as e:
+            result = {"error": str(e)}
+            if self.stats and timer:
+                self.stats.record(timer.finish(), error=True)
+        self.sync()
+        self.emit(json.dumps(result))
+
+    def handle_request(self, request_id, landmarks, present, timer=None):
+        """Route one decoded binary request to a worker"""
+        self.submit(timer, classify_arrays, request_id, landmarks, present, self.timing)
+
+    def close(self):
+        """Wait for requests in flight, stop the workers, free the block"""
+        for thread in self.retiring:
+            thread.join()
+        self.executor.shutdown(wait=True)
+        self.memory.close()
+        self.memory.unlink()
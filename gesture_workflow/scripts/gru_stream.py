@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Stateful Frame-by-frame GRU Inference
+
+Backs the session requests of `inference.py --stream`. The full-window
+path pads every request to MAX_SEQ_LEN frames and runs both recurrent
+layers over all of them, so a sliding window repeats ~89 frames of work
+per new frame. A RecurrentStack is a numpy copy of the trained Keras
+Sequential model (Masking, GRU / LSTM, BatchNormalization, Dense,
+Dropout) that carries every recurrent layer's state across calls: each
+pushed frame costs one step per layer, and the head runs once per call.
+
+Keras semantics are kept exactly: a frame equal to the mask value (no
+hand detected) leaves every state unchanged, dropout is off, and batch
+normalization uses the moving statistics. A session fed the same frames
+as a full window from a reset therefore gives the same probabilities
+(up to float32 rounding); `inference.py --check-stateful` measures that
+on the recorded gestures, and gru_stream_check.py compares every step
+with model.predict for the trained model and each supported layer type.
+
+The state summarizes every frame since the last reset, while the
+full-window model only sees the last MAX_SEQ_LEN frames: clients reset
+a session at gesture boundaries.
+"""
+
+import numpy as np
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+# Keras activation names -> numpy functions
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'sigmoid': sigmoid,
+    'tanh': np.tanh,
+    'relu': lambda x: np.maximum(x, 0),
+    'softmax': softmax
+}
+
+# Layers that are the identity at inference time
+PASSTHROUGH_LAYERS = ('Dropout', 'InputLayer', 'SpatialDropout1D', 'GaussianNoise')
+
+
+def activation(config, key):
+    name = config.get(key) or 'linear'
+    if isinstance(name, dict):  # serialized activation object (Keras 3)
+        name = name.get('config', {}).get('name', name.get('class_name'))
+    if name not in ACTIVATIONS:
+        raise ValueError(f"Activation {name!r} is not supported in stateful mode")
+    return ACTIVATIONS[name]
+
+
+class RecurrentStack:
+    """
+    Numpy inference copy of a trained Keras Sequential model.
+    Raises ValueError for layers it cannot step (Conv1D, Bidirectional, ...).
+    """
+
+    def __init__(self, model):
+        self.mask_value = None
+        self.layers = []  # (kind, params) in model order
+        for layer in model.layers:
+            kind = type(layer).__name__
+            config = layer.get_config()
+            weights = [np.asarray(w, dtype=np.float32) for w in layer.get_weights()]
+            if kind in PASSTHROUGH_LAYERS:
+                continue
+            if kind == 'Masking':
+                self.mask_value = float(config.get('mask_value', 0.0))
+            elif kind in ('GRU', 'LSTM'):
+                if config.get('go_backwards') or config.get('stateful'):
+                    raise ValueError(f"{layer.name}: only forward, non-stateful recurrent layers are supported")
+                self.layers.append((kind, self.recurrent_params(kind, config, weights)))
+            elif kind == 'BatchNormalization':
+                self.layers.append(('affine', self.batch_norm_params(config, weights)))
+            elif kind == 'Dense':
+                bias = weights[1] if config.get('use_bias', True) else 0.0
+                self.layers.append(('dense', (weights[0], bias, activation(config, 'activation'))))
+            else:
+                raise ValueError(f"Layer {layer.name} ({kind}) is not supported in stateful mode")
+
+        recurrent = [i for i, (kind, _) in enumerate(self.layers) if kind in ('GRU', 'LSTM')]
+        if not recurrent:
+            raise ValueError("Model has no recurrent layer")
+        self.head = recurrent[-1] + 1  # layers after the last recurrent one run once per call
+
+    @staticmethod
+    def recurrent_params(kind, config, weights):
+        kernel, recurrent_kernel = weights[0], weights[1]
+        units = recurrent_kernel.shape[0]
+        reset_after = kind == 'GRU' and config.get('reset_after', False)
+        if config.get('use_bias', True):
+            bias = weights[2]
+        else:
+            bias = np.zeros((2 if reset_after else 1) * kernel.shape[1], np.float32)
+        params = {
+            'units': units,
+            'kernel': kernel,
+            'recurrent_kernel': recurrent_kernel,
+            'activation': activation(config, 'activation'),
+            'recurrent_activation': activation(config, 'recurrent_activation')
+        }
+        if kind == 'GRU':
+            # reset_after (the TF2 default) keeps separate input and recurrent biases
+            params['reset_after'] = reset_after
+        if reset_after:
+            params['input_bias'], params['recurrent_bias'] = bias.reshape(2, -1)
+        else:
+            params['input_bias'] = bias
+        return params
+
+    @staticmethod
+    def batch_norm_params(config, weights):
+        """BatchNormalization at inference as x * scale + shift"""
+        weights = list(weights)
+        gamma = weights.pop(0) if config.get('scale', True) else 1.0
+        beta = weights.pop(0) if config.get('center', True) else 0.0
+        mean, variance = weights
+        scale = gamma / np.sqrt(variance + config.get('epsilon', 1e-3))
+        return scale.astype(np.float32), (beta - mean * scale).astype(np.float32)
+
+    def initial_state(self):
+        """Zero state of every recurrent layer: [h] for GRU, [h, c] for LSTM"""
+        states = []
+        for kind, params in self.layers[:self.head]:
+            if kind == 'GRU':
+                states.append([np.zeros(params['units'], np.float32)])
+            elif kind == 'LSTM':
+                states.append([np.zeros(params['units'], np.float32)] * 2)
+        return states
+
+    def masked(self, frames):
+        """(num_frames,) True where the Masking layer would skip the frame"""
+        if self.mask_value is None:
+            return np.zeros(len(frames), dtype=bool)
+        return np.all(frames == self.mask_value, axis=1)
+
+    def advance(self, states, frames):
+        """
+        Run new frames through the recurrent part.
+        frames: (num_frames, features) unmasked frames
+        Returns: the updated states
+        """
+        x = np.asarray(frames, dtype=np.float32)
+        new_states = []
+        r = 0
+        for kind, params in self.layers[:self.head]:
+            if kind == 'GRU':
+                x, state = gru_steps(params, x, states[r])
+            elif kind == 'LSTM':
+                x, state = lstm_steps(params, x, states[r])
+            else:
+                x = apply_layer(kind, params, x)
+                continue
+            new_states.append(state)
+            r += 1
+        return new_states
+
+    def output(self, states):
+        """Model output (class probabilities) for the current states"""
+        x = states[-1][0][None]
+        for kind, params in self.layers[self.head:]:
+            x = apply_layer(kind, params, x)
+        return x[0]
+
+
+def apply_layer(kind, params, x):
+    """A time-distributed layer on (num_frames, features)"""
+    if kind == 'affine':
+        scale, shift = params
+        return x * scale + shift
+    kernel, bias, act = params
+    return act(x @ kernel + bias)
+
+
+def gru_steps(params, x, state):
+    """Keras GRU over x (num_frames, features) from state [h] -> (outputs, [h])"""
+    u = params['units']
+    act, gate = params['activation'], params['recurrent_activation']
+    U = params['recurrent_kernel']
+    h = state[0]
+    xs = x @ params['kernel'] + params['input_bias']  # all input projections at once
+    outputs = np.empty((len(x), u), dtype=np.float32)
+    for t in range(len(x)):
+        if params['reset_after']:
+            rec = h @ U + params['recurrent_bias']
+            z = gate(xs[t, :u] + rec[:u])
+            r = gate(xs[t, u:2 * u] + rec[u:2 * u])
+            candidate = act(xs[t, 2 * u:] + r * rec[2 * u:])
+        else:
+            rec = h @ U[:, :2 * u]
+            z = gate(xs[t, :u] + rec[:u])
+            r = gate(xs[t, u:2 * u] + rec[u:])
+            candidate = act(xs[t, 2 * u:] + (r * h) @ U[:, 2 * u:])
+        h = z * h + (1 - z) * candidate
+        outputs[t] = h
+    return outputs, [h]
+
+
+def lstm_steps(params, x, state):
+    """Keras LSTM over x (num_frames, features) from state [h, c] -> (outputs, [h, c])"""
+    u = params['units']
+    act, gate = params['activation'], params['recurrent_activation']
+    U = params['recurrent_kernel']
+    h, c = state
+    xs = x @ params['kernel'] + params['input_bias']
+    outputs = np.empty((len(x), u), dtype=np.float32)
+    for t in range(len(x)):
+        g = xs[t] + h @ U  # gates i, f, c, o
+        c = gate(g[u:2 * u]) * c + gate(g[:u]) * act(g[2 * u:3 * u])
+        h = gate(g[3 * u:]) * act(c)
+        outputs[t] = h
+    return outputs, [h, c]
+
+
+class RecurrentSession:
+    """Recurrent state of one stream session"""
+
+    def __init__(self, stack):
+        self.stack = stack
+        self.reset()
+
+    def reset(self):
+        self.states = self.stack.initial_state()
+        self.frames_seen = 0
+        self.probs = None
+
+    def push(self, frames):
+        """
+        Feed new frames (num_frames, features).
+        Returns: class probabilities after the last of them
+        """
+        frames = np.asarray(frames, dtype=np.float32)
+        self.frames_seen += len(frames)
+        frames = frames[~self.stack.masked(frames)]
+        if len(frames) or self.probs is None:
+            self.states = self.stack.advance(self.states, frames)
+            self.probs = self.stack.output(self.states)
+        return self.probs
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Parity Check of gru_stream.py against Keras
+
+RecurrentStack re-implements Masking, GRU (both reset_after variants),
+LSTM, BatchNormalization and Dense in numpy; a slip there makes every
+session prediction wrong while nothing crashes. This pushes the sample
+gestures frame by frame through a RecurrentStack and compares the
+probabilities after every frame with model.predict on the same prefix
+(the padded window the full-window path would see).
+
+Models checked:
+- the trained model in models/, if there is one
+- freshly built ones of every supported recurrent layer (GRU with
+  reset_after on and off, LSTM) with random weights and batch
+  normalization statistics, whose outputs are far from saturated, so a
+  math error shows up in the probabilities
+
+Without TensorFlow there is nothing to compare against: the check says
+so and exits 0. With it, any difference above PARITY_TOLERANCE prints an
+error and exits 1.
+
+    python gru_stream_check.py [model.keras ...]
+"""
+
+import os
+import sys
+import json
+import numpy as np
+
+from gru_stream import RecurrentStack, RecurrentSession
+from inference import (
+    GestureClassifier, MODELS_DIR, MAX_SEQ_LEN, TOTAL_FEATURES, MASK_VALUE,
+    PARITY_TOLERANCE, load_recordings
+)
+
+TRAINED_MODELS = ('gesture_model.keras', 'gesture_model.h5')
+
+# Freshly built stacks: (name, recurrent layer, layer options)
+BUILT_MODELS = (
+    ('gru_reset_after', 'GRU', {'reset_after': True}),
+    ('gru_reset_before', 'GRU', {'reset_after': False}),
+    ('lstm', 'LSTM', {})
+)
+BUILT_CLASSES = 4
+
+
+def build_model(layer_type, options, seed):
+    """The train_gesture.py architecture with random weights and BN statistics"""
+    import tensorflow as tf
+    from tensorflow.keras import layers, models
+
+    tf.keras.utils.set_random_seed(seed)
+    recurrent = getattr(layers, layer_type)
+    model = models.Sequential([
+        layers.Input(shape=(MAX_SEQ_LEN, TOTAL_FEATURES)),
+        layers.Masking(mask_value=MASK_VALUE),
+        recurrent(32, return_sequences=True, **options),
+        layers.BatchNormalization(),
+        recurrent(16, **options),
+        layers.BatchNormalization(),
+        layers.Dense(16, activation='relu'),
+        layers.Dropout(0.3),
+        layers.Dense(BUILT_CLASSES, activation='softmax')
+    ])
+
+    rng = np.random.default_rng(seed)
+    for layer in model.layers:
+        if type(layer).__name__ == 'BatchNormalization':
+            gamma, beta, mean, variance = layer.get_weights()
+            layer.set_weights([
+                rng.uniform(0.5, 1.5, gamma.shape), rng.normal(0, 0.5, beta.shape),
+                rng.normal(0, 0.5, mean.shape), rng.uniform(0.5, 2.0, variance.shape)
+            ])
+    return model
+
+
+def prefix_windows(features):
+    """(num_frames, MAX_SEQ_LEN, TOTAL_FEATURES): window i holds frames 0..i"""
+    X = np.full((len(features), MAX_SEQ_LEN, TOTAL_FEATURES), MASK_VALUE, dtype=np.float32)
+    for i in range(len(features)):
+        X[i, :i + 1] = features[:i + 1]
+    return X
+
+
+def check_model(name, model, sequences):
+    """Largest probability difference over every frame of every sequence"""
+    stack = RecurrentStack(model)
+    max_diff = 0.0
+    steps = 0
+    for features in sequences:
+        expected = model.predict(prefix_windows(features), verbose=0)
+        session = RecurrentSession(stack)
+        for i, frame in enumerate(features):
+            probs = session.push(frame[None])
+            max_diff = max(max_diff, float(np.abs(probs - expected[i]).max()))
+        steps += len(features)
+
+    return {
+        "model": name,
+        "sequences": len(sequences),
+        "steps": steps,
+        "max_abs_diff": max_diff,
+        "tolerance": PARITY_TOLERANCE,
+        "passed": max_diff <= PARITY_TOLERANCE
+    }
+
+
+def main():
+    try:
+        import tensorflow as tf
+    except ImportError:
+        print(json.dumps({"skipped": "TensorFlow is not installed"}))
+        return 0
+
+    recordings = load_recordings()
+    if not recordings:
+        print(json.dumps({"error": "No recordings found"}))
+        return 1
+    classifier = GestureClassifier('keras')
+    sequences = [classifier.frame_features(frames)[-MAX_SEQ_LEN:] for _, frames in recordings]
+
+    paths = sys.argv[1:] or [os.path.join(MODELS_DIR, name) for name in TRAINED_MODELS]
+    models = []
+    trained = next((path for path in paths if os.path.exists(path)), None)
+    if trained:
+        models.append((os.path.basename(trained), tf.keras.models.load_model(trained, compile=False)))
+    for seed, (name, layer_type, options) in enumerate(BUILT_MODELS):
+        models.append((name, build_model(layer_type, options, seed)))
+
+    passed = True
+    for name, model in models:
+        result = check_model(name, model, sequences)
+        print(json.dumps(result), flush=True)
+        if not result["passed"]:
+            print(json.dumps({"error": f"{name}: stateful outputs differ from model.predict by "
+                                       f"{result['max_abs_diff']:.3g}"}), flush=True)
+            passed = False
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
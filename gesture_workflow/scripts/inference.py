@@ -6,16 +6,35 @@ This script loads a trained GRU model and classifies gesture sequences.
 Can be used for:
 1. Single sequence classification
 2. Real-time streaming classification via stdin
+3. Frame-by-frame streaming sessions that carry the GRU state across
+   calls (see gru_stream.py)
+
+The model runs on the Keras backend, or on the quantized TFLite export
+of train_gesture.py (see tflite_backend.py); --backend overrides the
+"inference_backend" of model_info.json.
+
+TensorFlow is imported only when a Keras model is loaded, so --info and
+the tflite backend (with tflite_runtime installed) start without it.
+--profile-startup reports each mode's startup time and peak RSS.
 """
 
 import os
 import json
 import sys
+import time
 import numpy as np
+from collections import OrderedDict
 
-# Suppress TF warnings
+# Suppress TF warnings (TensorFlow itself is imported on first use)
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-import tensorflow as tf
+
+from stream_protocol import iter_timed_requests, ProtocolError
+from stream_stats import (
+    RequestTimer, StreamStats, wants_timing, install_stats_signal, print_startup_profile
+)
+from gru_stream import RecurrentStack, RecurrentSession
+from micro_batch import MicroBatcher, MAX_BATCH, MAX_WAIT_MS
+from tflite_backend import TFLiteModel
 
 # Configuration
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -23,6 +42,7 @@ WORKFLOW_DIR = os.path.dirname(SCRIPT_DIR)
 MODELS_DIR = os.path.join(WORKFLOW_DIR, 'models')
 MODEL_PATH = os.path.join(MODELS_DIR, 'gesture_model.h5')
 MODEL_INFO_PATH = os.path.join(MODELS_DIR, 'model_info.json')
+GESTURES_DIR = os.path.join(WORKFLOW_DIR, 'gestures')
 
 # Must match training configuration
 MAX_SEQ_LEN = 90
@@ -32,33 +52,86 @@ FEATURES_PER_HAND = NUM_LANDMARKS * COORDS_PER_LANDMARK  # 63
 TOTAL_FEATURES = FEATURES_PER_HAND * 2  # 126
 MASK_VALUE = 0.0
 
+BACKENDS = ('keras', 'tflite')
+
+# Shortest sequence classified
+MIN_FRAMES = 5
+
+# Batch sizes the compiled inference function is traced and warmed for at
+# load; a batch is zero-padded up to the next size (larger ones run in
+# chunks of the largest), so no request ever triggers a retrace
+BATCH_SIZES = (1, 4, 16)
+
+# Stateful sessions kept by one stream; beyond this the least recently
+# used one is dropped ({"reset": true} frees a session explicitly)
+MAX_SESSIONS = 256
+
+# Command line options followed by a value (not positional arguments)
+VALUE_OPTIONS = ('--backend', '--max-batch', '--max-wait-ms')
+
+# Largest |stateful - full window| probability difference accepted by --check-stateful
+PARITY_TOLERANCE = 1e-4
+
 
 class GestureClassifier:
-    def __init__(self):
+    def __init__(self, backend=None):
+        self.backend = backend  # None: model_info.json's choice, else keras
         self.model = None
+        self.tflite = None  # TFLiteModel on the tflite backend
         self.class_names = []
         self.loaded = False
+        self.stack = None  # RecurrentStack, built on the first session request
+        self.infer = {}  # batch size -> traced inference function
         
     def load(self):
         """Load the trained model and class info"""
-        if not os.path.exists(MODEL_PATH):
-            print(json.dumps({"error": "Model not found", "path": MODEL_PATH}), flush=True)
+        info = {}
+        if os.path.exists(MODEL_INFO_PATH):
+            with open(MODEL_INFO_PATH, 'r') as f:
+                info = json.load(f)
+        
+        backend = self.backend or info.get('inference_backend', 'keras')
+        if backend not in BACKENDS:
+            print(json.dumps({"error": f"Unknown backend {backend!r}", "backends": list(BACKENDS)}), flush=True)
+            return False
+        
+        if backend == 'tflite':
+            if not info.get('tflite_model'):
+                print(json.dumps({"error": "No usable TFLite model: no export ran on the plain "
+                                           "interpreter within the accuracy limit (see model_info.json)"}), flush=True)
+                return False
+            model_path = os.path.join(MODELS_DIR, info['tflite_model'])
+        else:
+            model_path = MODEL_PATH
+        if not os.path.exists(model_path):
+            print(json.dumps({"error": "Model not found", "path": model_path}), flush=True)
             return False
             
         try:
-            self.model = tf.keras.models.load_model(MODEL_PATH)
-            
-            # Load class names
-            if os.path.exists(MODEL_INFO_PATH):
-                with open(MODEL_INFO_PATH, 'r') as f:
-                    info = json.load(f)
-                    self.class_names = info.get('classes', [])
+            self.stack = None
+            if backend == 'tflite':
+                self.model = None
+                self.tflite = TFLiteModel(model_path)
+                start = time.perf_counter()
+                self.tflite.predict(np.full((1, MAX_SEQ_LEN, TOTAL_FEATURES), MASK_VALUE, np.float32))
+                warmup_ms = (time.perf_counter() - start) * 1000
+            else:
+                import tensorflow as tf
+                self.model = tf.keras.models.load_model(model_path)
+                self.tflite = None
+                warmup_ms = self.compile()
+            self.backend = backend
+            self.class_names = info.get('classes', [])
             
             self.loaded = True
             print(json.dumps({
                 "status": "loaded",
                 "classes": self.class_names,
-                "max_seq_len": MAX_SEQ_LEN
+                "max_seq_len": MAX_SEQ_LEN,
+                "backend": backend,
+                "model": os.path.basename(model_path),
+                "batch_sizes": list(BATCH_SIZES) if backend == 'keras' else [self.tflite.batch],
+                "warmup_ms": warmup_ms
             }), flush=True)
             return True
             
@@ -66,6 +139,49 @@ class GestureClassifier:
             print(json.dumps({"error": str(e)}), flush=True)
             return False
     
+    def compile(self):
+        """
+        Trace the model once per BATCH_SIZES entry and run each trace on a
+        dummy batch. model.predict builds a data adapter and callbacks on
+        every call, which costs more than the GRU itself for one window.
+        Returns: time spent, in ms
+        """
+        import tensorflow as tf
+        
+        start = time.perf_counter()
+        model = self.model
+        
+        @tf.function
+        def forward(X):
+            return model(X, training=False)
+        
+        self.infer = {}
+        for size in BATCH_SIZES:
+            spec = tf.TensorSpec((size, MAX_SEQ_LEN, TOTAL_FEATURES), tf.float32)
+            self.infer[size] = forward.get_concrete_function(spec)
+            self.infer[size](tf.zeros(spec.shape, tf.float32))
+        return (time.perf_counter() - start) * 1000
+    
+    def predict_batch(self, X):
+        """
+        Class probabilities of padded windows X (n, MAX_SEQ_LEN, TOTAL_FEATURES)
+        through the compiled function or the interpreter.
+        Returns: (n, num_classes) numpy array
+        """
+        if self.tflite is not None:
+            return self.tflite.predict(X)
+        
+        import tensorflow as tf  # already loaded by load()
+        largest = BATCH_SIZES[-1]
+        outputs = []
+        for start in range(0, len(X), largest):
+            chunk = X[start:start + largest]
+            size = next(size for size in BATCH_SIZES if size >= len(chunk))
+            if size > len(chunk):
+                chunk = np.concatenate([chunk, np.full((size - len(chunk),) + chunk.shape[1:], MASK_VALUE, np.float32)])
+            outputs.append(self.infer[size](tf.constant(chunk, tf.float32)).numpy()[:len(X) - start])
+        return np.concatenate(outputs)
+    
     def flatten_hand(self, hand_data):
         """
         Flatten hand landmarks to 1D array.
@@ -97,6 +213,10 @@ class GestureClassifier:
         Input: [{"left_hand": {...}, "right_hand": {...}}, ...]
         Output: numpy array of shape (1, MAX_SEQ_LEN, TOTAL_FEATURES)
         """
+        return self.pad_sequence(self.frame_features(frames))
+    
+    def frame_features(self, frames):
+        """Unpadded (num_frames, TOTAL_FEATURES) float32 features of a frame list"""
         sequence = []
         
         for frame in frames:
@@ -104,60 +224,167 @@ class GestureClassifier:
             right = self.flatten_hand(frame.get('right_hand'))
             sequence.append(left + right)
         
-        # Pad or truncate to MAX_SEQ_LEN
-        if len(sequence) > MAX_SEQ_LEN:
-            sequence = sequence[-MAX_SEQ_LEN:]  # Take last frames
-        elif len(sequence) < MAX_SEQ_LEN:
-            padding = [[MASK_VALUE] * TOTAL_FEATURES] * (MAX_SEQ_LEN - len(sequence))
-            sequence = sequence + padding
-        
-        return np.array([sequence], dtype=np.float32)
+        return np.array(sequence, dtype=np.float32).reshape(-1, TOTAL_FEATURES)
+    
+    def pad_sequence(self, sequence):
+        """
+        Pad or truncate a (num_frames, TOTAL_FEATURES) array to MAX_SEQ_LEN.
+        Output: numpy array of shape (1, MAX_SEQ_LEN, TOTAL_FEATURES)
+        """
+        X = np.full((1, MAX_SEQ_LEN, TOTAL_FEATURES), MASK_VALUE, dtype=np.float32)
+        sequence = sequence[-MAX_SEQ_LEN:]  # Take last frames
+        X[0, :len(sequence)] = sequence
+        return X
     
-    def classify(self, frames, threshold=0.5):
+    def classify(self, frames, threshold=0.5, timer=None):
         """
         Classify a gesture sequence.
+        timer: optional RequestTimer, charged the features and model stages
         Returns: {"class": str, "confidence": float, "all_probs": dict}
         """
         if not self.loaded:
             return {"error": "Model not loaded"}
         
-        if len(frames) < 5:
-            return {"error": "Sequence too short", "min_frames": 5}
+        if len(frames) < MIN_FRAMES:
+            return {"error": "Sequence too short", "min_frames": MIN_FRAMES}
         
+        timer = timer or RequestTimer()
         try:
-            # Preprocess
             X = self.preprocess_sequence(frames)
-            
-            # Predict
-            probs = self.model.predict(X, verbose=0)[0]
-            
-            # Get best prediction
-            best_idx = int(np.argmax(probs))
-            best_prob = float(probs[best_idx])
-            best_class = self.class_names[best_idx] if best_idx < len(self.class_names) else f"class_{best_idx}"
-            
-            # Create probability dict for all classes
-            all_probs = {}
-            for i, p in enumerate(probs):
-                name = self.class_names[i] if i < len(self.class_names) else f"class_{i}"
-                all_probs[name] = float(p)
-            
-            result = {
-                "class": best_class if best_prob >= threshold else "unknown",
-                "confidence": best_prob,
-                "all_probs": all_probs,
-                "frame_count": len(frames)
-            }
-            
-            return result
-            
+            timer.mark('features')
+            return self.predict(X, len(frames), threshold, timer)
+        except Exception as e:
+            return {"error": str(e)}
+    
+    def classify_batch(self, requests, timers):
+        """
+        Classify several whole windows in one forward pass.
+        requests: [(frames, threshold)], timers: a RequestTimer per request
+        Returns: one classify() result per request
+        """
+        if not self.loaded:
+            return [{"error": "Model not loaded"} for _ in requests]
+        
+        results = [None] * len(requests)
+        rows = []
+        for i, ((frames, threshold), timer) in enumerate(zip(requests, timers)):
+            try:
+                if len(frames) < MIN_FRAMES:
+                    results[i] = {"error": "Sequence too short", "min_frames": MIN_FRAMES}
+                    continue
+                rows.append((i, self.preprocess_sequence(frames)))
+            except Exception as e:
+                results[i] = {"error": str(e)}
+            timer.mark('features')
+        
+        if rows:
+            try:
+                probs = self.predict_batch(np.concatenate([X for _, X in rows]))
+            except Exception as e:
+                probs = None
+                error = str(e)
+            for row, (i, _) in enumerate(rows):
+                timers[i].mark('model')
+                frames, threshold = requests[i]
+                results[i] = {"error": error} if probs is None else self.build_result(probs[row], len(frames), threshold)
+        return results
+    
+    def classify_landmarks(self, landmarks, present, threshold=0.5, timer=None):
+        """
+        Classify a binary stream request.
+        Input: landmarks (num_frames, 2, 21, 3) float32, present (num_frames, 2) bool
+        """
+        if not self.loaded:
+            return {"error": "Model not loaded"}
+        
+        if len(landmarks) < MIN_FRAMES:
+            return {"error": "Sequence too short", "min_frames": MIN_FRAMES}
+        
+        timer = timer or RequestTimer()
+        try:
+            landmarks[~present] = 0.0
+            X = self.pad_sequence(landmarks.reshape(len(landmarks), TOTAL_FEATURES))
+            timer.mark('features')
+            return self.predict(X, len(landmarks), threshold, timer)
         except Exception as e:
             return {"error": str(e)}
+    
+    def predict(self, X, frame_count, threshold, timer=None):
+        """Run the model on one padded batch and build the response"""
+        probs = self.predict_batch(X)[0]
+        if timer:
+            timer.mark('model')
+        return self.build_result(probs, frame_count, threshold)
+    
+    def recurrent_stack(self):
+        """The model's RecurrentStack for stateful sessions (ValueError if it cannot step)"""
+        if self.model is None:
+            raise ValueError("Stateful sessions need the Keras model (--backend keras)")
+        if self.stack is None:
+            self.stack = RecurrentStack(self.model)
+        return self.stack
+    
+    def classify_session(self, sessions, session_id, frames, threshold=0.5, timer=None):
+        """
+        Push new frames to a stateful session and classify everything it
+        has seen since its last reset; each frame costs one GRU step.
+        sessions: OrderedDict session id -> RecurrentSession, owned by the
+        caller and kept in least recently used order (MAX_SESSIONS at most)
+        """
+        if not self.loaded:
+            return {"error": "Model not loaded"}
+        
+        timer = timer or RequestTimer()
+        try:
+            session = sessions.get(session_id)
+            if session is None or session.stack is not self.recurrent_stack():
+                session = sessions[session_id] = RecurrentSession(self.recurrent_stack())
+                while len(sessions) > MAX_SESSIONS:
+                    sessions.popitem(last=False)
+            sessions.move_to_end(session_id)
+            features = self.frame_features(frames)
+            timer.mark('features')
+            probs = session.push(features)
+            timer.mark('model')
+        except Exception as e:
+            return {"error": str(e)}
+        
+        # Below MIN_FRAMES the class stays "unknown", like a too short window
+        if session.frames_seen < MIN_FRAMES:
+            threshold = float('inf')
+        result = self.build_result(probs, session.frames_seen, threshold)
+        result["session"] = session_id
+        return result
+    
+    def build_result(self, probs, frame_count, threshold):
+        """Response for one probability vector"""
+        # Get best prediction
+        best_idx = int(np.argmax(probs))
+        best_prob = float(probs[best_idx])
+        best_class = self.class_names[best_idx] if best_idx < len(self.class_names) else f"class_{best_idx}"
+        
+        # Create probability dict for all classes
+        all_probs = {}
+        for i, p in enumerate(probs):
+            name = self.class_names[i] if i < len(self.class_names) else f"class_{i}"
+            all_probs[name] = float(p)
+        
+        result = {
+            "class": best_class if best_prob >= threshold else "unknown",
+            "confidence": best_prob,
+            "all_probs": all_probs,
+            "frame_count": frame_count
+        }
+        
+        return result
 
 
-def classify_file(filepath):
-    """Classify a sequence from a JSON file"""
-    classifier = GestureClassifier()
+def classify_file(filepath, backend=None, profile=False):
+    """
+    Classify a sequence from a JSON file
+    profile: print the startup profile once the result is out
+    """
+    classifier = GestureClassifier(backend)
     if not classifier.load():
         return
     
@@ -171,59 +398,291 @@ def classify_file(filepath):
         
     except Exception as e:
         print(json.dumps({"error": str(e)}), flush=True)
+    
+    if profile:
+        print_startup_profile("classify_file", backend=classifier.backend)
 
 
-def streaming_mode():
+def read_requests(stream):
     """
-    Run in streaming mode - read JSON lines from stdin.
-    Each line should be a JSON object with "frames" array.
-    Outputs classification result for each input.
+    Parse JSONL requests until EOF or "quit" / "exit".
+    Yields: (data, error, timer); data is None when the line is not JSON
     """
-    classifier = GestureClassifier()
-    if not classifier.load():
-        return
-    
-    print(json.dumps({"status": "ready", "mode": "streaming"}), flush=True)
-    
-    for line in sys.stdin:
+    for line in stream:
+        timer = RequestTimer()
         line = line.strip()
         if not line:
             continue
         
         if line == "quit" or line == "exit":
-            break
+            return
         
         try:
             data = json.loads(line)
-            frames = data.get('frames', [])
-            result = classifier.classify(frames, threshold=data.get('threshold', 0.5))
-            print(json.dumps(result), flush=True)
         except json.JSONDecodeError:
-            print(json.dumps({"error": "Invalid JSON"}), flush=True)
-        except Exception as e:
-            print(json.dumps({"error": str(e)}), flush=True)
+            yield None, {"error": "Invalid JSON"}, timer
+            continue
+        timer.mark('parse')
+        yield data, None, timer
+
+
+def is_window_request(request):
+    """Whole-window classifications are batched; everything else is answered alone"""
+    data, error, _ = request
+    return error is None and isinstance(data, dict) and not any(
+        key in data for key in ('cmd', 'session', 'frame', 'reset'))
+
+
+def answer_request(classifier, data, sessions, stats, timer):
+    """Result of one request that is not batched (commands, sessions)"""
+    try:
+        if data.get('cmd') == 'stats':
+            return {"stats": stats.snapshot()}
+        if 'cmd' in data:
+            return {"error": f"Unknown command {data['cmd']!r}"}
+        if data.get('reset'):
+            session_id = data.get('session', 'default')
+            sessions.pop(session_id, None)
+            return {"session": session_id, "reset": True}
+        frames = [data['frame']] if 'frame' in data else data.get('frames', [])
+        return classifier.classify_session(sessions, data.get('session', 'default'), frames,
+                                           threshold=data.get('threshold', 0.5), timer=timer)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def streaming_mode(timing=False, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, backend=None, profile=False):
+    """
+    Run in streaming mode - read JSON lines from stdin.
+    Each line should be a JSON object with "frames" array, or
+    {"cmd": "stats"} for latency histograms, counts, memory and batching.
+    Outputs classification result for each input, carrying its "id".
+    
+    Requests with a "session" push frames to a stateful session instead
+    of classifying a whole window:
+    {"frame": {...}, "session": "cam-1"}     one new frame
+    {"frames": [...], "session": "cam-1"}    several new frames
+    {"reset": true, "session": "cam-1"}      start the session over
+    At most MAX_SESSIONS sessions are kept; the least recently used one
+    is dropped for a new one, and its next frames start it over.
+    
+    Whole windows are micro-batched (see micro_batch.py): up to max_batch
+    of them share one forward pass, flushed after max_wait_ms at most.
+    Results come back in request order.
+    
+    timing: add parse_ms / queue_ms / features_ms / model_ms / total_ms to
+    every result (a request's own "timing" key overrides it)
+    backend: 'keras' or 'tflite', None for model_info.json's choice
+    profile: print the startup profile once ready
+    """
+    classifier = GestureClassifier(backend)
+    if not classifier.load():
+        return
+    
+    batcher = MicroBatcher(read_requests(sys.stdin), is_window_request, max_batch, max_wait_ms)
+    stats = StreamStats(queue_depth=batcher.queued, input_stream=sys.stdin,
+                        extra={"batching": batcher.stats.snapshot})
+    install_stats_signal(stats)
+    sessions = OrderedDict()  # session id -> RecurrentSession, least recently used first
+    print(json.dumps({"status": "ready", "mode": "streaming",
+                      "max_batch": batcher.max_batch, "max_wait_ms": max_wait_ms}), flush=True)
+    if profile:
+        print_startup_profile("stream", backend=classifier.backend)
+    
+    batcher.start()
+    for batch in batcher.batches():
+        for _, _, timer in batch:
+            timer.mark('queue')
+        
+        if is_window_request(batch[0]):
+            requests = [(data.get('frames', []), data.get('threshold', 0.5)) for data, _, _ in batch]
+            results = classifier.classify_batch(requests, [timer for _, _, timer in batch])
+        else:
+            data, error, timer = batch[0]
+            results = [error or answer_request(classifier, data, sessions, stats, timer)]
+        
+        lines = []
+        for (data, _, timer), result in zip(batch, results):
+            if isinstance(data, dict) and 'id' in data:
+                result["id"] = data['id']
+            timer.finish()
+            if wants_timing(data, timing):
+                result.update(timer.timings)
+            lines.append(json.dumps(result))
+            stats.record(timer.timings, "error" in result)
+        sys.stdout.write('\n'.join(lines) + '\n')
+        sys.stdout.flush()
+
+
+def binary_streaming_mode(timing=False, backend=None, profile=False):
+    """
+    Run in streaming mode with binary framed requests (see stream_protocol.py).
+    Outputs one JSON line per request, carrying the request "id".
+    SIGUSR1 writes stats to stderr (there are no commands in this protocol).
+    """
+    classifier = GestureClassifier(backend)
+    if not classifier.load():
+        return
+    
+    stats = StreamStats(input_stream=sys.stdin)
+    install_stats_signal(stats)
+    print(json.dumps({"status": "ready", "mode": "streaming", "protocol": "binary"}), flush=True)
+    if profile:
+        print_startup_profile("stream_binary", backend=classifier.backend)
+    
+    try:
+        for request, received in iter_timed_requests(sys.stdin.buffer):
+            timer = RequestTimer(received)
+            timer.mark('parse')
+            if isinstance(request, ProtocolError):
+                print(json.dumps({"error": str(request)}), flush=True)
+                stats.record(timer.finish(), error=True)
+                continue
+            request_id, landmarks, present = request
+            result = classifier.classify_landmarks(landmarks, present, timer=timer)
+            result["id"] = request_id
+            timer.finish()
+            if timing:
+                result.update(timer.timings)
+            print(json.dumps(result), flush=True)
+            stats.record(timer.timings, "error" in result)
+    except ProtocolError as e:
+        print(json.dumps({"error": str(e)}), flush=True)
+
+
+def load_recordings(paths=None):
+    """Frame lists of the given sequence files, or of every recording in gestures/"""
+    if not paths:
+        paths = []
+        if os.path.isdir(GESTURES_DIR):
+            for class_name in sorted(os.listdir(GESTURES_DIR)):
+                class_dir = os.path.join(GESTURES_DIR, class_name)
+                if os.path.isdir(class_dir):
+                    paths += [os.path.join(class_dir, f) for f in sorted(os.listdir(class_dir)) if f.endswith('.json')]
+    
+    recordings = []
+    for path in paths:
+        with open(path, 'r') as f:
+            frames = json.load(f).get('frames', [])
+        if frames:
+            recordings.append((path, frames))
+    return recordings
+
+
+def check_stateful(paths=None, profile=False):
+    """
+    Parity of stateful sessions with the full-window model: every
+    recording (its last MAX_SEQ_LEN frames, as a window sees them) is
+    pushed frame by frame to a fresh session and classified whole.
+    Reports the largest probability difference, class agreement and the
+    per-frame cost of both paths.
+    """
+    classifier = GestureClassifier('keras')
+    if not classifier.load():
+        return False
+    if profile:
+        print_startup_profile("check_stateful", backend=classifier.backend)
+    
+    try:
+        stack = classifier.recurrent_stack()
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}), flush=True)
+        return False
+    
+    recordings = load_recordings(paths)
+    if not recordings:
+        print(json.dumps({"error": "No recordings found"}), flush=True)
+        return False
+    
+    max_diff = 0.0
+    agree = 0
+    frames_total = 0
+    step_time = window_time = 0.0
+    for path, frames in recordings:
+        features = classifier.frame_features(frames)[-MAX_SEQ_LEN:]
+        
+        start = time.perf_counter()
+        expected = classifier.predict_batch(classifier.pad_sequence(features))[0]
+        window_time += time.perf_counter() - start
+        
+        session = RecurrentSession(stack)
+        start = time.perf_counter()
+        for frame in features:
+            probs = session.push(frame[None])
+        step_time += time.perf_counter() - start
+        
+        max_diff = max(max_diff, float(np.abs(probs - expected).max()))
+        agree += int(np.argmax(probs) == np.argmax(expected))
+        frames_total += len(features)
+    
+    result = {
+        "recordings": len(recordings),
+        "max_prob_diff": max_diff,
+        "tolerance": PARITY_TOLERANCE,
+        "class_agreement": agree / len(recordings),
+        "passed": max_diff <= PARITY_TOLERANCE,
+        "window_ms_per_call": window_time * 1000 / len(recordings),
+        "stateful_ms_per_frame": step_time * 1000 / max(frames_total, 1)
+    }
+    print(json.dumps(result), flush=True)
+    return result["passed"]
+
+
+def positional_args():
+    """Command line arguments after the mode, without options and their values"""
+    args = sys.argv[2:]
+    return [arg for i, arg in enumerate(args)
+            if not arg.startswith('--') and (i == 0 or args[i - 1] not in VALUE_OPTIONS)]
+
+
+def option_value(name, default):
+    """Value following `name` on the command line, or default"""
+    args = sys.argv[2:]
+    if name in args and args.index(name) + 1 < len(args):
+        return args[args.index(name) + 1]
+    return default
 
 
 def main():
+    profile = "--profile-startup" in sys.argv
+    if profile:
+        sys.argv.remove("--profile-startup")
+    
     if len(sys.argv) < 2:
         print("Usage:")
         print("  python inference.py <sequence.json>  - Classify a single sequence file")
         print("  python inference.py --stream         - Streaming mode (read from stdin)")
+        print("  python inference.py --stream --binary - Streaming mode, binary framed requests")
+        print("  python inference.py --stream --timing - Add per-stage latencies to every result")
+        print(f"  python inference.py --stream --max-batch N --max-wait-ms MS - Micro-batching (default {MAX_BATCH}, {MAX_WAIT_MS})")
+        print("  python inference.py ... --backend keras|tflite - Model backend (default: model_info.json)")
         print("  python inference.py --info           - Show model info")
+        print("  python inference.py ... --profile-startup - Report startup time and peak RSS on stderr")
+        print("  python inference.py --check-stateful [sequence.json ...] - Compare stateful sessions with the full-window model")
         return
     
     arg = sys.argv[1]
+    backend = option_value("--backend", None)
     
     if arg == "--stream":
-        streaming_mode()
+        timing = "--timing" in sys.argv[2:]
+        if "--binary" in sys.argv[2:]:
+            binary_streaming_mode(timing, backend, profile)
+        else:
+            streaming_mode(timing, int(option_value("--max-batch", MAX_BATCH)),
+                           float(option_value("--max-wait-ms", MAX_WAIT_MS)), backend, profile)
+    elif arg == "--check-stateful":
+        sys.exit(0 if check_stateful(positional_args(), profile) else 1)
     elif arg == "--info":
         if os.path.exists(MODEL_INFO_PATH):
             with open(MODEL_INFO_PATH, 'r') as f:
-                print(json.dumps(json.load(f), indent=2))
+                print(f.read())
         else:
             print(json.dumps({"error": "No model info found"}))
+        if profile:
+            print_startup_profile("info")
     elif os.path.exists(arg):
-        classify_file(arg)
+        classify_file(arg, backend, profile)
     else:
         print(json.dumps({"error": f"File not found: {arg}"}))
 
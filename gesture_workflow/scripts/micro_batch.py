@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Micro-batching Scheduler for inference.py --stream
+
+A batch of 16 windows costs about as much as one through the GRU, so
+concurrent stations should not queue behind each other one forward pass
+at a time. A reader thread parses requests into a bounded queue; the
+scheduler hands out batches of batchable requests, flushed when they
+reach max_batch or when the oldest has waited max_wait_ms. Anything
+else (commands, session frames) is a barrier: the batch in progress is
+flushed and the request is handed out alone, so per-client order holds.
+
+BatchStats keeps the recent batch sizes, queue waits and flush reasons
+for the {"cmd": "stats"} response, to tune throughput against latency.
+"""
+
+import time
+import queue
+import threading
+import numpy as np
+
+from stream_stats import STATS_WINDOW, summarize_latency
+
+# Defaults: the largest traced batch of inference.py and a wait well
+# under one camera frame (33 ms at 30 fps)
+MAX_BATCH = 16
+MAX_WAIT_MS = 5.0
+
+# Queue bound in batches: a fast writer blocks on the pipe instead of
+# piling up parsed requests
+QUEUE_BATCHES = 4
+
+# Why a batch was handed out: max_batch reached, max_wait_ms passed, a
+# barrier request arrived, or the input ended
+FLUSH_REASONS = ('full', 'timeout', 'barrier', 'end')
+
+_END = object()
+
+
+class BatchStats:
+    """Rolling batch sizes and queue waits, recorded by the scheduler"""
+
+    def __init__(self, max_batch, max_wait_ms, window=STATS_WINDOW):
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.window = window
+        self.batches = 0
+        self.requests = 0
+        self.barriers = 0  # requests handed out alone
+        self.flushes = {reason: 0 for reason in FLUSH_REASONS}
+        self.sizes = np.zeros(window, dtype=np.int64)
+        self.waits = np.zeros(window)
+        self.waits_filled = 0
+        self.lock = threading.RLock()  # snapshot() may run from a signal handler
+
+    def record(self, waits_ms, reason):
+        """One flushed batch: the queue wait of each of its requests"""
+        with self.lock:
+            self.sizes[self.batches % self.window] = len(waits_ms)
+            self.batches += 1
+            self.requests += len(waits_ms)
+            self.flushes[reason] += 1
+            for wait in waits_ms:
+                self.waits[self.waits_filled % self.window] = wait
+                self.waits_filled += 1
+
+    def record_barrier(self):
+        with self.lock:
+            self.barriers += 1
+
+    def snapshot(self):
+        with self.lock:
+            sizes = self.sizes[:min(self.batches, self.window)]
+            waits = self.waits[:min(self.waits_filled, self.window)].copy()
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait_ms,
+                "batches": self.batches,
+                "requests": self.requests,
+                "barriers": self.barriers,
+                "mean_batch_size": float(sizes.mean()) if len(sizes) else 0.0,
+                # batch_size_histogram[n]: recent batches of n requests
+                "batch_size_histogram": np.bincount(sizes, minlength=self.max_batch + 1).tolist(),
+                "flushes": dict(self.flushes),
+                "wait_ms": summarize_latency(waits)
+            }
+
+
+class MicroBatcher:
+    """
+    items:     iterable of requests, consumed on the reader thread
+    batchable: predicate; False makes a request a barrier
+    """
+
+    def __init__(self, items, batchable, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.items = items
+        self.batchable = batchable
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue(maxsize=self.max_batch * QUEUE_BATCHES)
+        self.stats = BatchStats(self.max_batch, max_wait_ms)
+        self.pending = 0  # taken from the queue, not handed out yet
+        self.reader = threading.Thread(target=self.read, daemon=True)
+
+    def start(self):
+        self.reader.start()
+
+    def read(self):
+        try:
+            for item in self.items:
+                self.queue.put((item, time.perf_counter()))
+        finally:
+            self.queue.put((_END, None))
+
+    def queued(self):
+        """Requests read and not handed out yet"""
+        return self.queue.qsize() + self.pending
+
+    def batches(self):
+        """
+        Yield lists of requests in arrival order until the items run out.
+        A list holds batchable requests only, or a single barrier.
+        """
+        held = None
+        while True:
+            item, enqueued = held or self.queue.get()
+            held = None
+            if item is _END:
+                return
+            if not self.batchable(item):
+                self.stats.record_barrier()
+                yield [item]
+                continue
+
+            batch, times = [item], [enqueued]
+            self.pending = 1
+            deadline = enqueued + self.max_wait
+            reason = 'full'
+            while len(batch) < self.max_batch:
+                try:
+                    item, enqueued = self.queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    reason = 'timeout'
+                    break
+                if item is _END or not self.batchable(item):
+                    held = (item, enqueued)
+                    reason = 'end' if item is _END else 'barrier'
+                    break
+                batch.append(item)
+                times.append(enqueued)
+                self.pending += 1
+
+            now = time.perf_counter()
+            self.stats.record([(now - t) * 1000 for t in times], reason)
+            self.pending = 0
+            yield batch
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Binary Framed Protocol for the --stream classifiers
+
+Optional alternative to one JSON line per request (JSONL stays the default).
+Enabled with `--stream --binary` on dtw_gesture.py and inference.py.
+
+Request layout (all little-endian):
+  u32      length of everything after this field
+  4s       magic b'GSTB'
+  u16      protocol version
+  u16      flags (reserved, 0)
+  u32      request id, echoed as "id" in the JSON response
+  u32      frame count T
+  bytes    hand-presence bits, bit (2 * t + hand) with hand 0 = left,
+           1 = right; padded with zeros to a multiple of 4 bytes
+  f32[]    landmark block (T, 2, 21, 3): raw MediaPipe coordinates,
+           zeros for absent hands
+
+Responses are unchanged JSON lines on stdout.
+
+A length prefix above MAX_MESSAGE_BYTES is answered with an error
+without allocating the message: its bytes are skipped in small chunks,
+which keeps the stream in sync.
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import numpy as np
+
+MAGIC = b'GSTB'
+VERSION = 1
+LENGTH = struct.Struct('<I')
+HEADER = struct.Struct('<4sHHII')
+
+HANDS = 2
+NUM_LANDMARKS = 21
+COORDS_PER_LANDMARK = 3
+FLOATS_PER_FRAME = HANDS * NUM_LANDMARKS * COORDS_PER_LANDMARK  # 126
+LANDMARK_DTYPE = np.dtype('<f4')
+
+# Largest accepted message body, as the socket server's line limit
+# (a 10 s two-hand window at 30 fps is ~150 KB)
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+
+# Chunk size used to skip an oversized message
+SKIP_CHUNK = 64 * 1024
+
+
+class ProtocolError(ValueError):
+    """Malformed binary request"""
+
+
+def presence_size(num_frames):
+    """Bytes used by the presence bits, padded to keep the float block aligned"""
+    return (((HANDS * num_frames + 7) // 8) + 3) // 4 * 4
+
+
+def encode_request(request_id, landmarks, present):
+    """
+    Build one binary request.
+
+    landmarks: (T, 2, 21, 3) array-like of coordinates
+    present:   (T, 2) bool, [left, right] hand detected
+
+    Returns: bytes, including the length prefix
+    """
+    landmarks = np.ascontiguousarray(landmarks, dtype=LANDMARK_DTYPE)
+    present = np.asarray(present, dtype=bool).reshape(-1)
+    num_frames = len(landmarks)
+
+    bits = np.packbits(present, bitorder='little').tobytes()
+    bits = bits.ljust(presence_size(num_frames), b'\0')
+    header = HEADER.pack(MAGIC, VERSION, 0, request_id, num_frames)
+    body = header + bits + landmarks.tobytes()
+    return LENGTH.pack(len(body)) + body
+
+
+def read_exact(stream, size):
+    """
+    Read exactly `size` bytes into a writable buffer.
+    Returns None on a clean EOF before the first byte.
+    """
+    buf = bytearray(size)
+    view = memoryview(buf)
+    got = 0
+    while got < size:
+        n = stream.readinto(view[got:])
+        if not n:
+            if got == 0:
+                return None
+            raise ProtocolError(f"Truncated message: {got}/{size} bytes")
+        got += n
+    return buf
+
+
+def skip_bytes(stream, size):
+    """Discard `size` bytes without holding them; ProtocolError if the stream ends first"""
+    while size > 0:
+        chunk = stream.read(min(size, SKIP_CHUNK))
+        if not chunk:
+            raise ProtocolError(f"Truncated message: {size} bytes missing")
+        size -= len(chunk)
+
+
+def read_body(stream, length):
+    """
+    The message body after a length prefix. An oversized one is skipped
+    and returned as a ProtocolError instead.
+    """
+    if length > MAX_MESSAGE_BYTES:
+        skip_bytes(stream, length)
+        return ProtocolError(f"Message of {length} bytes exceeds the {MAX_MESSAGE_BYTES} byte limit")
+    body = read_exact(stream, length)
+    if body is None:
+        raise ProtocolError("Missing message body")
+    return body
+
+
+def decode_request(body):
+    """
+    Parse one request body (the bytes after the length prefix).
+
+    The landmark array is a view on `body` (np.frombuffer, no copy); it is
+    writable when `body` is a bytearray, as returned by read_exact.
+
+    Returns: (request_id, landmarks (T, 2, 21, 3) float32, present (T, 2) bool)
+    """
+    if len(body) < HEADER.size:
+        raise ProtocolError("Message shorter than header")
+    magic, version, _, request_id, num_frames = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ProtocolError(f"Bad magic {magic!r}")
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+
+    bits_size = presence_size(num_frames)
+    block_offset = HEADER.size + bits_size
+    expected = block_offset + num_frames * FLOATS_PER_FRAME * LANDMARK_DTYPE.itemsize
+    if len(body) != expected:
+        raise ProtocolError(f"Expected {expected} bytes for {num_frames} frames, got {len(body)}")
+
+    bits = np.frombuffer(body, dtype=np.uint8, count=bits_size, offset=HEADER.size)
+    present = np.unpackbits(bits, count=HANDS * num_frames, bitorder='little')
+    landmarks = np.frombuffer(body, dtype=LANDMARK_DTYPE, offset=block_offset)
+    return (
+        request_id,
+        landmarks.reshape(num_frames, HANDS, NUM_LANDMARKS, COORDS_PER_LANDMARK),
+        present.reshape(num_frames, HANDS).astype(bool)
+    )
+
+
+def read_request(stream):
+    """
+    Read the next request from a binary stream (e.g. sys.stdin.buffer).
+    Returns None at EOF.
+    """
+    prefix = read_exact(stream, LENGTH.size)
+    if prefix is None:
+        return None
+    (length,) = LENGTH.unpack(prefix)
+    body = read_body(stream, length)
+    if isinstance(body, ProtocolError):
+        raise body
+    return decode_request(body)
+
+
+def iter_requests(stream):
+    """
+    Yield decoded requests until EOF.
+
+    A malformed body is yielded as a ProtocolError (the length prefix still
+    keeps the stream in sync); a broken length prefix ends the stream.
+    """
+    for request, _ in iter_timed_requests(stream):
+        yield request
+
+
+def iter_timed_requests(stream):
+    """
+    iter_requests yielding (request, received): time.perf_counter() once
+    the whole message was read, before it was decoded
+    """
+    while True:
+        prefix = read_exact(stream, LENGTH.size)
+        if prefix is None:
+            return
+        (length,) = LENGTH.unpack(prefix)
+        body = read_body(stream, length)
+        received = time.perf_counter()
+        if isinstance(body, ProtocolError):
+            yield body, received
+            continue
+        try:
+            yield decode_request(body), received
+        except ProtocolError as e:
+            yield e, received
+
+
+def frames_to_arrays(frames):
+    """
+    Reference conversion of JSON frames to (landmarks, present).
+    Hands with fewer than 21 landmarks are sent as absent.
+    """
+    num_frames = len(frames)
+    landmarks = np.zeros((num_frames, HANDS, NUM_LANDMARKS, COORDS_PER_LANDMARK), dtype=np.float32)
+    present = np.zeros((num_frames, HANDS), dtype=bool)
+    for t, frame in enumerate(frames):
+        for h, key in enumerate(('left_hand', 'right_hand')):
+            hand = frame.get(key)
+            points = hand.get('landmarks') if hand else None
+            if points is not None and len(points) >= NUM_LANDMARKS:
+                landmarks[t, h] = points[:NUM_LANDMARKS]
+                present[t, h] = True
+    return landmarks, present
+
+
+def self_test():
+    """Round-trip conformance checks; returns the number of failures"""
+    import io
+    import glob
+
+    rng = np.random.default_rng(0)
+    cases = []
+    for num_frames in (0, 1, 3, 4, 5, 50, 90):
+        landmarks = rng.normal(size=(num_frames, HANDS, NUM_LANDMARKS, 3)).astype(np.float32)
+        present = rng.random((num_frames, HANDS)) < 0.5
+        landmarks[~present] = 0.0
+        cases.append((f"random_{num_frames}", landmarks, present))
+
+    gestures_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gestures')
+    for path in sorted(glob.glob(os.path.join(gestures_dir, '*', '*.json'))):
+        with open(path, 'r') as f:
+            frames = json.load(f).get('frames', [])
+        cases.append((os.path.relpath(path, gestures_dir), *frames_to_arrays(frames)))
+
+    failures = 0
+    stream = io.BytesIO()
+    for request_id, (name, landmarks, present) in enumerate(cases):
+        message = encode_request(request_id, landmarks, present)
+        stream.write(message)
+        got_id, got_landmarks, got_present = decode_request(bytearray(message[LENGTH.size:]))
+        ok = (got_id == request_id
+              and got_landmarks.dtype == np.float32
+              and np.array_equal(got_landmarks, landmarks)
+              and np.array_equal(got_present, present)
+              and got_landmarks.flags.writeable
+              and not got_landmarks.flags.owndata)
+        if not ok:
+            failures += 1
+            print(json.dumps({"case": name, "status": "FAIL"}), flush=True)
+
+    # Back-to-back messages on one stream, then a clean EOF
+    stream.seek(0)
+    decoded = list(iter_requests(stream))
+    if [r[0] for r in decoded] != list(range(len(cases))):
+        failures += 1
+        print(json.dumps({"case": "stream", "status": "FAIL"}), flush=True)
+
+    # Corrupted and truncated messages must be rejected
+    good = encode_request(7, *cases[1][1:])
+    for name, bad in (("bad_magic", good[:4] + b'XXXX' + good[8:]),
+                      ("short_block", good[:-4])):
+        try:
+            decode_request(bytearray(bad[LENGTH.size:]))
+            failures += 1
+            print(json.dumps({"case": name, "status": "FAIL"}), flush=True)
+        except ProtocolError:
+            pass
+    try:
+        read_request(io.BytesIO(good[:-1]))
+        failures += 1
+        print(json.dumps({"case": "truncated", "status": "FAIL"}), flush=True)
+    except ProtocolError:
+        pass
+
+    # An oversized message is rejected and the next one still decodes
+    oversized = LENGTH.pack(MAX_MESSAGE_BYTES + 1) + bytes(MAX_MESSAGE_BYTES + 1)
+    decoded = list(iter_requests(io.BytesIO(oversized + good)))
+    if len(decoded) != 2 or not isinstance(decoded[0], ProtocolError) or decoded[1][0] != 7:
+        failures += 1
+        print(json.dumps({"case": "oversized", "status": "FAIL"}), flush=True)
+
+    print(json.dumps({"self_test": "passed" if not failures else "failed",
+                      "cases": len(cases), "failures": failures}), flush=True)
+    return failures
+
+
+def benchmark(repeat=200):
+    """
+    Request throughput of JSONL vs binary up to the DTW feature matrix
+    (parse + normalize), using the sequences in gestures/
+    """
+    import glob
+    from dtw_gesture import sequence_to_features, landmarks_to_features
+
+    gestures_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gestures')
+    requests = []
+    for path in sorted(glob.glob(os.path.join(gestures_dir, '*', '*.json'))):
+        with open(path, 'r') as f:
+            frames = json.load(f).get('frames', [])
+        requests.append(frames)
+    if not requests:
+        print(json.dumps({"error": "No gesture sequences found"}), flush=True)
+        return
+
+    json_lines = [json.dumps({"frames": frames}).encode() for frames in requests]
+    binary = [encode_request(i, *frames_to_arrays(frames)) for i, frames in enumerate(requests)]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for line in json_lines:
+            sequence_to_features(json.loads(line)['frames'])
+    json_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in binary:
+            _, landmarks, present = decode_request(bytearray(message[LENGTH.size:]))
+            landmarks_to_features(landmarks, present)
+    binary_seconds = time.perf_counter() - start
+
+    count = repeat * len(requests)
+    print(json.dumps({
+        "requests": count,
+        "json_bytes_per_request": sum(map(len, json_lines)) / len(requests),
+        "binary_bytes_per_request": sum(map(len, binary)) / len(requests),
+        "json_requests_per_s": count / json_seconds,
+        "binary_requests_per_s": count / binary_seconds,
+        "speedup": json_seconds / binary_seconds
+    }, indent=2), flush=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Binary stream protocol tools')
+    parser.add_argument('--self-test', action='store_true', help='Run round-trip conformance checks')
+    parser.add_argument('--bench', action='store_true', help='Compare JSONL and binary decode throughput')
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark()
+    else:
+        sys.exit(1 if self_test() else 0)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Latency Breakdown and Live Stats for the --stream classifiers
+
+Shared by dtw_gesture.py and inference.py. Every request is timed in
+stages with a RequestTimer:
+
+  parse_ms     JSON / binary request decoding
+  features_ms  landmark normalization and feature extraction
+  model_ms     DTW or network
+  total_ms     from the complete request line to the response
+
+The stages go into the response when the process runs with --timing or
+the request carries "timing": true. StreamStats always keeps the last
+STATS_WINDOW samples of every stage (a few perf_counter calls and an
+array store per request), and {"cmd": "stats"} returns their histograms
+and percentiles with the request counts, queue depth and resident memory.
+Binary-protocol streams have no commands; SIGUSR1 writes the same
+snapshot to stderr.
+
+print_startup_profile backs the --profile-startup flag of inference.py
+and train_gesture.py: time from process start and peak memory when a
+CLI mode is ready, on stderr.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import numpy as np
+
+# Requests kept per stage for the rolling histograms
+STATS_WINDOW = 1024
+
+# Upper edges (ms) of the histogram buckets; the last bucket is open
+LATENCY_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+STAGES = ('parse', 'features', 'model', 'total')
+
+
+class RequestTimer:
+    """Stage durations of one request, in ms"""
+
+    __slots__ = ('start', 'last', 'timings')
+
+    def __init__(self, start=None):
+        self.start = self.last = time.perf_counter() if start is None else start
+        self.timings = {}
+
+    def mark(self, stage):
+        """Charge the time since the previous mark to `stage` (adds up over a batch)"""
+        now = time.perf_counter()
+        key = f"{stage}_ms"
+        self.timings[key] = self.timings.get(key, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+    def finish(self):
+        """Stamp total_ms; returns the timings"""
+        self.timings["total_ms"] = (time.perf_counter() - self.start) * 1000
+        return self.timings
+
+
+def resident_memory_mb():
+    """
+    (current, peak) resident set size in MB: VmRSS / VmHWM on Linux, the
+    ru_maxrss peak elsewhere; None where unavailable
+    """
+    status = {}
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'VmHWM'):
+                    status[key] = int(value.split()[0]) / 2 ** 10  # kB
+    except (OSError, ValueError, IndexError):
+        pass
+    current, peak = status.get('VmRSS'), status.get('VmHWM')
+    if peak is None:
+        try:
+            import resource
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak = maxrss / 2 ** 20 if sys.platform == 'darwin' else maxrss / 2 ** 10  # bytes / KB
+        except ImportError:
+            pass
+    return current, peak
+
+
+def process_age_s():
+    """Seconds since this process started, interpreter startup included; None off Linux"""
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])  # field 22, starttime
+        with open('/proc/uptime', 'r') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def print_startup_profile(mode, **extra):
+    """One {"startup_profile": ...} line on stderr: startup time, memory, heavy imports"""
+    rss, peak_rss = resident_memory_mb()
+    age = process_age_s()
+    profile = {
+        "mode": mode,
+        "startup_ms": None if age is None else age * 1000,
+        "rss_mb": rss,
+        "peak_rss_mb": peak_rss,
+        "tensorflow_imported": 'tensorflow' in sys.modules
+    }
+    profile.update(extra)
+    print(json.dumps({"startup_profile": profile}), file=sys.stderr, flush=True)
+
+
+def pending_input_bytes(stream):
+    """Bytes waiting in a pipe (requests not read yet), None if unknown"""
+    try:
+        import fcntl
+        import termios
+        import struct
+        buf = fcntl.ioctl(stream.fileno(), termios.FIONREAD, b'\0\0\0\0')
+        return struct.unpack('i', buf)[0]
+    except (ImportError, OSError, ValueError, AttributeError):
+        return None
+
+
+class StreamStats:
+    """
+    Rolling per-stage latencies and request counters of one stream process.
+    Thread safe: worker pool callbacks record from their own threads.
+
+    queue_depth:  callable returning the requests accepted but not answered
+    input_stream: stdin of the process, to report bytes not read yet
+    extra:        {name: callable} of further snapshot sections (e.g. batching)
+    """
+
+    def __init__(self, window=STATS_WINDOW, queue_depth=None, input_stream=None, extra=None):
+        self.window = window
+        self.queue_depth = queue_depth
+        self.input_stream = input_stream
+        self.extra = extra or {}
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.samples = {stage: np.zeros(window) for stage in STAGES}
+        self.filled = {stage: 0 for stage in STAGES}  # samples written per stage
+        self.lock = threading.RLock()  # snapshot() may interrupt record() (signal)
+
+    def record(self, timings, error=False):
+        """Count one answered request and keep its stage timings"""
+        with self.lock:
+            self.requests += 1
+            self.errors += bool(error)
+            for stage in STAGES:
+                value = timings.get(f"{stage}_ms")
+                if value is not None:
+                    self.samples[stage][self.filled[stage] % self.window] = value
+                    self.filled[stage] += 1
+
+    def snapshot(self):
+        """The {"cmd": "stats"} response"""
+        with self.lock:
+            latency = {}
+            for stage in STAGES:
+                values = self.samples[stage][:min(self.filled[stage], self.window)].copy()
+                latency[f"{stage}_ms"] = summarize_latency(values)
+            requests, errors = self.requests, self.errors
+
+        rss, peak_rss = resident_memory_mb()
+        stats = {
+            "uptime_s": time.time() - self.started,
+            "requests": requests,
+            "errors": errors,
+            "queue_depth": self.queue_depth() if self.queue_depth else 0,
+            "rss_mb": rss,
+            "peak_rss_mb": peak_rss,
+            "window": self.window,
+            "latency": latency
+        }
+        if self.input_stream is not None:
+            stats["pending_input_bytes"] = pending_input_bytes(self.input_stream)
+        for name, section in self.extra.items():
+            stats[name] = section()
+        return stats
+
+
+def summarize_latency(values):
+    """Histogram and percentiles of one stage's recent samples"""
+    edges = LATENCY_BUCKETS_MS
+    counts = np.bincount(np.searchsorted(edges, values), minlength=len(edges) + 1)
+    summary = {
+        "count": len(values),
+        "buckets_ms": edges,
+        "histogram": counts.tolist()
+    }
+    if len(values):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        summary.update({"p50": float(p50), "p95": float(p95), "p99": float(p99),
+                        "max": float(values.max())})
+    return summary
+
+
+def wants_timing(data, default):
+    """Per-request "timing" overrides the process-wide --timing default"""
+    if isinstance(data, dict) and 'timing' in data:
+        return bool(data['timing'])
+    return default
+
+
+def install_stats_signal(stats):
+    """Write a stats snapshot line to stderr on SIGUSR1 (where it exists)"""
+    if not hasattr(signal, 'SIGUSR1'):
+        return
+
+    def dump(signum, frame):
+        print(json.dumps({"stats": stats.snapshot()}), file=sys.stderr, flush=True)
+    signal.signal(signal.SIGUSR1, dump)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+TFLite Interpreter Backend for the GRU Gesture Model
+
+train_gesture.py exports post-training quantized TFLite copies of the
+Keras model (int8 calibrated on recorded gestures, and float16) and
+measures them with TFLiteModel; inference.py runs them with it when the
+"tflite" backend is picked (--backend or model_info.json).
+
+The interpreter comes from tflite_runtime / ai_edge_litert when one is
+installed, a few MB instead of a full TensorFlow import; otherwise from
+tf.lite.
+"""
+
+import numpy as np
+
+
+def interpreter_class():
+    """The lightest TFLite Interpreter available"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteModel:
+    """
+    A converted model with one input and one output.
+    path / content: .tflite file, or the flatbuffer bytes
+    """
+
+    def __init__(self, path=None, content=None, num_threads=None):
+        Interpreter = interpreter_class()
+        self.interpreter = Interpreter(model_path=path, model_content=content, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch = int(self.input['shape'][0])  # windows per invoke, fixed at export
+
+    def invoke(self, X):
+        """One invoke on exactly self.batch windows"""
+        dtype = self.input['dtype']
+        if dtype != np.float32:  # integer input: quantize with the exported scale
+            scale, zero_point = self.input['quantization']
+            limits = np.iinfo(dtype)
+            X = np.clip(np.round(X / scale + zero_point), limits.min, limits.max)
+        self.interpreter.set_tensor(self.input['index'], X.astype(dtype))
+        self.interpreter.invoke()
+        Y = self.interpreter.get_tensor(self.output['index'])
+        if Y.dtype != np.float32:
+            scale, zero_point = self.output['quantization']
+            Y = (Y.astype(np.float32) - zero_point) * scale
+        return Y
+
+    def predict(self, X):
+        """
+        Outputs for X (n, ...) float32, self.batch windows per invoke
+        (the last group zero-padded). Returns: (n, outputs) float32
+        """
+        outputs = []
+        for start in range(0, len(X), self.batch):
+            chunk = X[start:start + self.batch]
+            if len(chunk) < self.batch:
+                chunk = np.concatenate([chunk, np.zeros((self.batch - len(chunk),) + chunk.shape[1:], chunk.dtype)])
+            outputs.append(self.invoke(chunk)[:len(X) - start])
+        return np.concatenate(outputs).astype(np.float32)
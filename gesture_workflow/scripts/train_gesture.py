@@ -7,19 +7,27 @@ This script trains a GRU model for gesture sequence classification.
 - Uses relative coordinates (wrist as origin)
 - Handles variable-length sequences with padding and masking
 - Outputs model to gesture_workflow/models/gesture_model.h5
+- Exports post-training quantized TFLite models (int8 calibrated on the
+  recorded windows, float16) and reports their size, latency and
+  accuracy against the Keras model
+
+TensorFlow and scikit-learn are imported once there is data to train on,
+so runs that stop early ("no classes") exit in well under a second.
+--profile-startup reports the startup time and peak RSS on stderr.
 """
 
 import os
 import json
 import numpy as np
 import sys
+import time
 from datetime import datetime
 
-# TensorFlow imports
+# TensorFlow is imported where a model is built
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Suppress TF warnings
-import tensorflow as tf
-from tensorflow.keras import layers, models, callbacks
-from sklearn.model_selection import train_test_split
+
+from tflite_backend import TFLiteModel
+from stream_stats import print_startup_profile
 
 # Configuration
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -44,6 +52,15 @@ PATIENCE = 15  # Early stopping patience
 # Mask value for padded frames
 MASK_VALUE = 0.0
 
+# Post-training quantized TFLite exports (gesture_model_<quantization>.tflite);
+# int8 is full-integer and is skipped, with an error logged, when an op of
+# the model has no int8 kernel
+TFLITE_QUANTIZATIONS = ('int8', 'float16')
+CALIBRATION_WINDOWS = 100  # training windows that calibrate the int8 activation ranges
+# Validation accuracy an export may lose and still become the inference default
+TFLITE_MAX_ACCURACY_DROP = 0.02
+LATENCY_CALLS = 50  # single-window calls timed per model
+
 
 def log_progress(message, data=None):
     """Print progress in JSON format for frontend parsing"""
@@ -185,6 +202,9 @@ def create_gru_model(num_classes, seq_length=MAX_SEQ_LEN, features=TOTAL_FEATURE
     - Similar accuracy for short sequences (<2 seconds)
     - Simpler gating mechanism
     """
+    import tensorflow as tf
+    from tensorflow.keras import layers, models
+    
     model = models.Sequential([
         # Masking layer to ignore padded frames
         layers.Masking(mask_value=MASK_VALUE, input_shape=(seq_length, features)),
@@ -217,6 +237,9 @@ def create_lstm_model(num_classes, seq_length=MAX_SEQ_LEN, features=TOTAL_FEATUR
     Alternative LSTM model for comparison.
     Better for very long sequences but slower to train.
     """
+    import tensorflow as tf
+    from tensorflow.keras import layers, models
+    
     model = models.Sequential([
         layers.Masking(mask_value=MASK_VALUE, input_shape=(seq_length, features)),
         
@@ -240,26 +263,160 @@ def create_lstm_model(num_classes, seq_length=MAX_SEQ_LEN, features=TOTAL_FEATUR
     return model
 
 
-class TrainingProgressCallback(callbacks.Callback):
-    """Custom callback to report training progress"""
-    
-    def on_epoch_end(self, epoch, logs=None):
-        logs = logs or {}
-        log_progress("epoch_complete", {
-            "epoch": epoch + 1,
-            "total_epochs": EPOCHS,
-            "loss": float(logs.get('loss', 0)),
-            "accuracy": float(logs.get('accuracy', 0)),
-            "val_loss": float(logs.get('val_loss', 0)),
-            "val_accuracy": float(logs.get('val_accuracy', 0)),
-            "progress": (epoch + 1) / EPOCHS * 100
-        })
+def progress_callback():
+    """Custom callback to report training progress (the class needs TensorFlow)"""
+    from tensorflow.keras import callbacks
+    
+    class TrainingProgressCallback(callbacks.Callback):
+        def on_epoch_end(self, epoch, logs=None):
+            logs = logs or {}
+            log_progress("epoch_complete", {
+                "epoch": epoch + 1,
+                "total_epochs": EPOCHS,
+                "loss": float(logs.get('loss', 0)),
+                "accuracy": float(logs.get('accuracy', 0)),
+                "val_loss": float(logs.get('val_loss', 0)),
+                "val_accuracy": float(logs.get('val_accuracy', 0)),
+                "progress": (epoch + 1) / EPOCHS * 100
+            })
+    
+    return TrainingProgressCallback()
+
+
+def latency_ms(predict, X, calls=LATENCY_CALLS):
+    """Mean ms of predict on one window, cycling over X (after one warm-up call)"""
+    predict(X[:1])
+    start = time.perf_counter()
+    for i in range(calls):
+        predict(X[i % len(X)][None])
+    return (time.perf_counter() - start) * 1000 / calls
 
 
-def train():
-    """Main training function"""
+def unrolled_copy(model):
+    """
+    Inference copy of the model for TFLite export: recurrent layers
+    unrolled over the fixed MAX_SEQ_LEN window and dropout removed, same
+    weights. A rolled GRU converts to a while loop over TensorList ops,
+    which has no builtin (let alone int8) kernel.
+    """
+    import tensorflow as tf
+    
+    config = model.get_config()
+    for layer in config['layers']:
+        if layer['class_name'] in ('GRU', 'LSTM'):
+            layer['config'].update(unroll=True, dropout=0.0, recurrent_dropout=0.0)
+    copy = tf.keras.Sequential.from_config(config)
+    copy.set_weights(model.get_weights())
+    return copy
+
+
+def convert_tflite(model, quantization, calibration):
+    """
+    Post-training quantized TFLite flatbuffer of the model, for one
+    (MAX_SEQ_LEN, TOTAL_FEATURES) window per invoke.
+    model:   an unrolled_copy of the trained model
+    int8:    full-integer model (int8 weights, activations, input and
+             output), activation ranges calibrated on `calibration`
+             windows; raises ValueError when an op has no int8 kernel
+    float16: float16 weights
+    Returns: (flatbuffer bytes, whether it needs TF select ops)
+    """
+    import tensorflow as tf
+    
+    def make_converter():
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantization == 'int8':
+            converter.representative_dataset = lambda: ([window[None]] for window in calibration)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+        else:
+            converter.target_spec.supported_types = [tf.float16]
+        return converter
+    
+    try:
+        return make_converter().convert(), False
+    except Exception as e:
+        if quantization == 'int8':
+            # Select ops run in float: there is no full-integer fallback
+            raise ValueError(f"Model has ops without int8 kernels, no full-integer export: {e}") from e
+        # Recurrent ops without a builtin kernel: fall back to TF select ops
+        # (needs the full TF interpreter, so never the default backend)
+        fallback = make_converter()
+        fallback.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+        fallback._experimental_lower_tensor_list_ops = False
+        return fallback.convert(), True
+
+
+def export_tflite(model, X_train, X_val, y_val, keras_accuracy):
+    """
+    Write the quantized TFLite models next to the Keras one and compare
+    each with it on the validation windows.
+    Returns: ({quantization: report}, file name of the default TFLite model or None)
+    """
+    import tensorflow as tf
+    
+    rng = np.random.default_rng(42)
+    calibration = X_train[rng.permutation(len(X_train))[:CALIBRATION_WINDOWS]]
+    
+    forward = tf.function(lambda X: model(X, training=False))
+    keras_ms = latency_ms(lambda X: forward(tf.constant(X)).numpy(), X_val)
+    keras_size = os.path.getsize(os.path.join(MODELS_DIR, 'gesture_model.h5'))
+    export_model = unrolled_copy(model)
+    
+    reports = {}
+    for quantization in TFLITE_QUANTIZATIONS:
+        filename = f'gesture_model_{quantization}.tflite'
+        try:
+            content, select_ops = convert_tflite(export_model, quantization, calibration)
+            tflite = TFLiteModel(content=content)
+            accuracy = float(np.mean(np.argmax(tflite.predict(X_val), axis=1) == y_val))
+            tflite_ms = latency_ms(tflite.predict, X_val)
+        except Exception as e:
+            log_progress(f"TFLite {quantization} export failed: {e}", {"error": "tflite_export"})
+            continue
+        
+        with open(os.path.join(MODELS_DIR, filename), 'wb') as f:
+            f.write(content)
+        reports[quantization] = {
+            "path": filename,
+            "size_bytes": len(content),
+            "keras_size_bytes": keras_size,
+            "size_ratio": len(content) / keras_size,
+            "accuracy": accuracy,
+            "accuracy_delta": accuracy - keras_accuracy,
+            "latency_ms": tflite_ms,
+            "keras_latency_ms": keras_ms,
+            "latency_delta_ms": tflite_ms - keras_ms,
+            "select_ops": select_ops,
+            # What the interpreter actually exchanges: int8 for full-integer models
+            "input_dtype": np.dtype(tflite.input['dtype']).name,
+            "output_dtype": np.dtype(tflite.output['dtype']).name
+        }
+        log_progress(f"TFLite {quantization} model saved", reports[quantization])
+    
+    # The smallest export that keeps the accuracy and runs on the plain interpreter
+    qualified = [report for report in reports.values()
+                 if not report["select_ops"] and -report["accuracy_delta"] <= TFLITE_MAX_ACCURACY_DROP]
+    if not qualified:
+        return reports, None
+    return reports, min(qualified, key=lambda report: report["size_bytes"])["path"]
+
+
+def train(profile=False):
+    """
+    Main training function
+    profile: print the startup profile when training starts (or stops early)
+    """
     log_progress("Starting gesture model training...")
     
+    def stop(message, data):
+        log_progress(message, data)
+        if profile:
+            print_startup_profile("train", exit=data["error"])
+        return False
+    
     # Ensure models directory exists
     os.makedirs(MODELS_DIR, exist_ok=True)
     
@@ -267,12 +424,13 @@ def train():
     sequences, labels, class_names, class_sample_counts = load_sequences()
     
     if sequences is None or len(sequences) == 0:
-        log_progress("ERROR: No training data available", {"error": "no_data"})
-        return False
+        return stop("ERROR: No training data available", {"error": "no_data"})
     
     if len(class_names) < 2:
-        log_progress("ERROR: Need at least 2 classes for training", {"error": "insufficient_classes"})
-        return False
+        return stop("ERROR: Need at least 2 classes for training", {"error": "insufficient_classes"})
+    
+    from tensorflow.keras import callbacks
+    from sklearn.model_selection import train_test_split
     
     # Check minimum samples per class
     unique, counts = np.unique(labels, return_counts=True)
@@ -321,13 +479,15 @@ def train():
     )
     
     # Train
+    if profile:
+        print_startup_profile("train", samples=len(sequences))
     log_progress("Starting training...")
     history = model.fit(
         X_train, y_train,
         validation_data=(X_val, y_val),
         epochs=EPOCHS,
         batch_size=BATCH_SIZE,
-        callbacks=[TrainingProgressCallback(), early_stop, reduce_lr],
+        callbacks=[progress_callback(), early_stop, reduce_lr],
         verbose=0  # We use our custom callback for progress
     )
     
@@ -349,6 +509,10 @@ def train():
     model.save(keras_model_path)
     log_progress(f"Keras format saved to {keras_model_path}")
     
+    # Quantized TFLite exports for the lightweight interpreter backend
+    log_progress("Exporting TFLite models...")
+    tflite_reports, tflite_default = export_tflite(model, X_train, X_val, y_val, float(val_acc))
+    
     # Save model info
     model_info = {
         "trained_at": datetime.now().isoformat(),
@@ -362,7 +526,12 @@ def train():
         "final_accuracy": float(val_acc),
         "final_loss": float(val_loss),
         "epochs_trained": len(history.history['loss']),
-        "model_type": "GRU"
+        "model_type": "GRU",
+        "tflite": tflite_reports,
+        # --backend tflite loads tflite_model: an export without select ops that
+        # kept the accuracy, or None; inference_backend is the default
+        "tflite_model": tflite_default,
+        "inference_backend": "tflite" if tflite_default else "keras"
     }
     
     with open(os.path.join(MODELS_DIR, 'model_info.json'), 'w') as f:
@@ -374,5 +543,5 @@ def train():
 
 
 if __name__ == '__main__':
-    success = train()
+    success = train(profile='--profile-startup' in sys.argv[1:])
     sys.exit(0 if success else 1)
@@ -714,9 +714,14 @@ app.post('/api/gestures/sequences', (req, res) => {
             fs.mkdirSync(classDir, { recursive: true });
         }
 
-        // Generate sequence ID
-        const existingFiles = fs.readdirSync(classDir).filter(f => f.endsWith('.json'));
-        const sequenceNum = existingFiles.length + 1;
+        // Generate sequence ID: one past the highest existing number, so an
+        // id freed by a delete is never reused (the running model would
+        // reject it as a duplicate of the template it still holds)
+        const existingNums = fs.readdirSync(classDir)
+            .map(f => /^sequence_(\d+)\.json$/.exec(f))
+            .filter(Boolean)
+            .map(match => parseInt(match[1], 10));
+        const sequenceNum = Math.max(0, ...existingNums) + 1;
         const sequenceId = `sequence_${String(sequenceNum).padStart(3, '0')}`;
 
         // Create sequence data
@@ -739,6 +744,9 @@ app.post('/api/gestures/sequences', (req, res) => {
 
         console.log(`Saved gesture sequence: ${safeName}/${sequenceId} (${frames.length} frames)`);
 
+        // Fold the recording into the running model without retraining
+        updateGestureModel({ cmd: 'add_sequence', file: filePath });
+
         res.json({
             success: true,
             sequenceId,
@@ -787,6 +795,7 @@ app.delete('/api/gestures/sequences/:className/:sequenceId', (req, res) => {
 
         if (fs.existsSync(filePath)) {
             fs.unlinkSync(filePath);
+            updateGestureModel({ cmd: 'remove_sequence', template_id: `${className}/${sequenceId}` });
         }
 
         res.json({ success: true });
@@ -826,9 +835,9 @@ app.post('/api/gestures/train', (req, res) => {
         console.log(`Gesture training process exited with code ${code}`);
         if (code === 0) {
             fs.appendFileSync(TRAINING_LOG_FILE, '\n[TRAINING_COMPLETE]\n');
-            // Reload gesture inference process with new model
-            console.log('[Gesture] Reloading inference process after training...');
-            startGestureProcess();
+            // Swap the new model into the running inference process
+            console.log('[Gesture] Reloading gesture model after training...');
+            reloadGestureModel();
         } else {
             fs.appendFileSync(TRAINING_LOG_FILE, `\n[TRAINING_FAILED] Code: ${code}\n`);
         }
@@ -852,10 +861,9 @@ app.post('/api/gestures/train/cancel', (req, res) => {
 // Get gesture model info
 app.get('/api/gestures/model', (req, res) => {
     try {
-        const modelPath = path.join(GESTURE_WORKFLOW_DIR, 'models', 'gesture_model.pkl');
         const modelInfoPath = path.join(GESTURE_WORKFLOW_DIR, 'models', 'model_info.json');
 
-        if (!fs.existsSync(modelPath)) {
+        if (!gestureModelExists()) {
             return res.json({ exists: false });
         }
 
@@ -881,7 +889,9 @@ const GESTURE_INFERENCE_SCRIPT = path.join(__dirname, 'gesture_workflow', 'scrip
 let gestureInferenceProcess = null;
 let gestureProcessReady = false;
 let gestureProcessClasses = [];
-let pendingClassifications = [];
+// Requests in flight, keyed by the id echoed back by dtw_gesture.py
+let pendingClassifications = new Map();
+let nextClassificationId = 1;
 
 function startGestureProcess() {
     if (gestureInferenceProcess) {
@@ -904,21 +914,21 @@ function startGestureProcess() {
             if (!line.trim()) continue;
             try {
                 const parsed = JSON.parse(line);
-                if (parsed.status === 'loaded') {
+                if (parsed.status === 'loaded' || parsed.status === 'reloaded') {
                     gestureProcessReady = true;
                     gestureProcessClasses = parsed.classes || [];
-                    console.log('[Gesture] Process ready with classes:', gestureProcessClasses);
-                } else if (parsed.predicted_class !== undefined) {
-                    // Classification result - resolve pending promise
-                    if (pendingClassifications.length > 0) {
-                        const { resolve } = pendingClassifications.shift();
+                    console.log(`[Gesture] Model ${parsed.model_version} ${parsed.status} with classes:`, gestureProcessClasses);
+                } else if (pendingClassifications.has(parsed.id)) {
+                    // Classification result - settle the matching promise
+                    const { resolve, reject } = pendingClassifications.get(parsed.id);
+                    pendingClassifications.delete(parsed.id);
+                    if (parsed.error) {
+                        reject(new Error(parsed.error));
+                    } else {
                         resolve(parsed);
                     }
                 } else if (parsed.error) {
-                    if (pendingClassifications.length > 0) {
-                        const { reject } = pendingClassifications.shift();
-                        reject(new Error(parsed.error));
-                    }
+                    console.error('[Gesture] Unmatched error:', parsed.error);
                 }
             } catch (e) {
                 // Not JSON, ignore
@@ -936,10 +946,10 @@ function startGestureProcess() {
         gestureInferenceProcess = null;
 
         // Reject any pending classifications
-        while (pendingClassifications.length > 0) {
-            const { reject } = pendingClassifications.shift();
+        for (const { reject } of pendingClassifications.values()) {
             reject(new Error('Gesture process closed'));
         }
+        pendingClassifications.clear();
     });
 
     gestureInferenceProcess.on('error', (err) => {
@@ -948,22 +958,69 @@ function startGestureProcess() {
     });
 }
 
+// Send an add_sequence / remove_sequence / reload command to the running
+// process, which updates the model in place
+function updateGestureModel(command) {
+    if (!gestureInferenceProcess || !gestureProcessReady) return;
+
+    const id = nextClassificationId++;
+    pendingClassifications.set(id, {
+        resolve: (result) => console.log(`[Gesture] Model ${result.status}`, result.template_id || ''),
+        reject: (err) => console.error('[Gesture] Model update failed:', err.message)
+    });
+    gestureInferenceProcess.stdin.write(JSON.stringify({ id, ...command }) + '\n');
+}
+
+// The inference process only opens the binary model; a model pickled by
+// older versions is converted once, explicitly, at server start
+const gestureModelPath = path.join(__dirname, 'gesture_workflow', 'models', 'gesture_model.gdtw');
+const legacyGestureModelPath = path.join(__dirname, 'gesture_workflow', 'models', 'gesture_model.pkl');
+
+function gestureModelExists() {
+    return fs.existsSync(gestureModelPath);
+}
+
+function convertLegacyGestureModel(done) {
+    const convertProcess = spawn(PYTHON_PATH, [GESTURE_TRAIN_SCRIPT, '--convert-model']);
+    convertProcess.stdout.on('data', (data) => console.log('[Gesture] Convert:', data.toString().trim()));
+    convertProcess.stderr.on('data', (data) => console.error('[Gesture] Convert:', data.toString().trim()));
+    convertProcess.on('error', (err) => console.error('[Gesture] Failed to start model conversion:', err));
+    convertProcess.on('close', (code) => done(code === 0));
+}
+
+// Load a retrained model without restarting: requests in flight are
+// answered by the old model, later ones by the new one
+function reloadGestureModel() {
+    if (gestureInferenceProcess && gestureProcessReady) {
+        updateGestureModel({ cmd: 'reload' });
+    } else {
+        startGestureProcess();
+    }
+}
+
 // Start gesture process on server start (if model exists)
-const gestureModelPath = path.join(__dirname, 'gesture_workflow', 'models', 'gesture_model.pkl');
-if (fs.existsSync(gestureModelPath)) {
+if (gestureModelExists()) {
     console.log('[Gesture] Starting persistent inference process...');
     startGestureProcess();
+} else if (fs.existsSync(legacyGestureModelPath)) {
+    console.log('[Gesture] Converting pickled model to the binary model format...');
+    convertLegacyGestureModel((converted) => {
+        if (converted) {
+            console.log('[Gesture] Starting persistent inference process...');
+            startGestureProcess();
+        }
+    });
 }
 
-// Endpoint to restart gesture process (after training)
+// Endpoint to reload the gesture model (after training)
 app.post('/api/gestures/reload', (req, res) => {
-    console.log('[Gesture] Reloading inference process...');
-    startGestureProcess();
+    console.log('[Gesture] Reloading gesture model...');
+    reloadGestureModel();
     res.json({ status: 'reloading' });
 });
 
 app.post('/api/gestures/classify', async (req, res) => {
-    const { frames, threshold } = req.body;
+    const { frames, threshold, early, expected_frames } = req.body;
 
     if (!frames || !Array.isArray(frames)) {
         return res.status(400).json({ error: 'frames array required' });
@@ -971,7 +1028,7 @@ app.post('/api/gestures/classify', async (req, res) => {
 
     // Start process if not running
     if (!gestureInferenceProcess) {
-        if (fs.existsSync(gestureModelPath)) {
+        if (gestureModelExists()) {
             startGestureProcess();
             // Wait for process to be ready (max 5 seconds)
             const startTime = Date.now();
@@ -1008,17 +1065,19 @@ app.post('/api/gestures/classify', async (req, res) => {
     try {
         // Use persistent process - send request and wait for response
         const result = await new Promise((resolve, reject) => {
-            // Add to pending queue
-            pendingClassifications.push({ resolve, reject });
+            // Register under a fresh id; answers may arrive in any order
+            const id = nextClassificationId++;
+            pendingClassifications.set(id, { resolve, reject });
 
             // Send classification request
-            gestureInferenceProcess.stdin.write(JSON.stringify({ frames, threshold: threshold || 0.5 }) + '\n');
+            // early: decide on a gesture still in progress (result carries "early": true)
+            const request = { id, frames, threshold: threshold || 0.5 };
+            if (early) Object.assign(request, { early: true, expected_frames });
+            gestureInferenceProcess.stdin.write(JSON.stringify(request) + '\n');
 
             // Timeout after 5 seconds
             setTimeout(() => {
-                const idx = pendingClassifications.findIndex(p => p.resolve === resolve);
-                if (idx !== -1) {
-                    pendingClassifications.splice(idx, 1);
+                if (pendingClassifications.delete(id)) {
                     reject(new Error('Classification timeout'));
                 }
             }, 5000);